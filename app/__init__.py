@@ -1,33 +1,112 @@
 from flask import Flask
-from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 from flask_socketio import SocketIO
+from app.assets import Assets
+from app.attachments import AttachmentStore
+from app.config import Config
+from app.database import configure_database, init_migrations, install_sqlite_pragmas, setup_db_command
+from app.fanout import FanoutPipeline
+from app.groups import GroupDirectory
+from app.log import setup_logging
+from app.message_log import MessageLog
+from app.message_store import MessageStore
+from app.metrics import Metrics
+from app.password_hasher import PasswordHasher
+from app.prekeys import PrekeyStore
+from app.presence import PresenceRegistry
+from app.rate_limit import RateLimiter
+from app.rooms import RoomRegistry
+from app.shared_state import SharedState, socketio_queue_options
+from app.startup import StartupTimer
+from app.tls import ServerTLS
+from app.token_cache import TokenCache
+from app.transport import install_transport, socketio_transport_options
+from app.user_directory import UserDirectory
 
 db = SQLAlchemy()
-migrate = Migrate()
 socketio = SocketIO(cors_allowed_origins="*")
+message_store = MessageStore()
+shared_state = SharedState(message_store)
+password_hasher = PasswordHasher()
+token_cache = TokenCache()
+user_directory = UserDirectory()
+rate_limiter = RateLimiter()
+presence = PresenceRegistry()
+room_registry = RoomRegistry()
+groups = GroupDirectory()
+prekeys = PrekeyStore()
+fanout = FanoutPipeline()
+message_log = MessageLog()
+metrics = Metrics()
+assets = Assets()
+attachments = AttachmentStore()
+tls = ServerTLS()
 
-def create_app():
+def create_app(config_class=Config, timer=None):
+    # `timer`: fases da subida para o relatório dos pontos de entrada (ver app/startup.py)
+    timer = timer or StartupTimer()
     app = Flask(__name__)
 
-    # Configurações
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///database.db"
-    app.config["SECRET_KEY"] = "chave_secreta"
+    with timer.phase("config"):
+        # Configurações (ver app/config.py)
+        app.config.from_object(config_class)
 
-    # Inicializar extensões
-    db.init_app(app)
-    migrate.init_app(app, db)
-    socketio.init_app(app)
+        # Logging antes de tudo: o app.logger do Flask passa a usar a fila (ver app/log.py)
+        setup_logging(app)
 
-    # Registrar rotas (blueprints)
-    from app.routes.default import default_bp
-    from app.routes.auth_routes import auth
-    from app.routes.user_routes import users
-    app.register_blueprint(default_bp, url_prefix="/")
-    app.register_blueprint(auth, url_prefix="/auth")
-    app.register_blueprint(users, url_prefix="/users")
+    with timer.phase("database"):
+        configure_database(app)
+        db.init_app(app)
+        install_sqlite_pragmas(app, db)
+        # Flask-Migrate só no CLI (`flask db ...`, `flask setup-db`)
+        init_migrations(app, db)
+        app.cli.add_command(setup_db_command)
 
-    # Registrar eventos do Socket.IO
-    from app import socket_events  # noqa: F401
+    with timer.phase("socketio"):
+        socketio.init_app(app, async_mode=app.config["SOCKETIO_ASYNC_MODE"],
+                          **socketio_transport_options(app), **socketio_queue_options(app))
+        install_transport(app, socketio)
+
+    with timer.phase("extensions"):
+        _init_extensions(app)
+
+    with timer.phase("blueprints"):
+        # Registrar rotas (blueprints)
+        from app.routes.default import default_bp
+        from app.routes.auth_routes import auth
+        from app.routes.user_routes import users
+        app.register_blueprint(default_bp, url_prefix="/")
+        app.register_blueprint(auth, url_prefix="/auth")
+        app.register_blueprint(users, url_prefix="/users")
+
+        # Modelos sem rota própria (para o db.create_all)
+        from app.models.attachment import Attachment  # noqa: F401
+        from app.models.group import Group, GroupMember  # noqa: F401
+        from app.models.message import Message  # noqa: F401
+        from app.models.prekey import PrekeyBundle  # noqa: F401
+
+    with timer.phase("socket_events"):
+        # Registrar eventos do Socket.IO
+        from app import socket_events  # noqa: F401
+        metrics.instrument_socketio()
 
     return app
+
+
+def _init_extensions(app):
+    message_store.init_app(app)
+    shared_state.init_app(app)
+    password_hasher.init_app(app)
+    token_cache.init_app(app, shared_state)
+    user_directory.init_app(app)
+    rate_limiter.init_app(app)
+    presence.init_app(app, socketio)
+    room_registry.init_app(app, socketio, shared_state)
+    groups.init_app(app)
+    prekeys.init_app(app)
+    fanout.init_app(app, socketio, room_registry)
+    message_log.init_app(app, socketio)
+    metrics.init_app(app, socketio, db)
+    assets.init_app(app)
+    attachments.init_app(app, socketio)
+    tls.init_app(app)
@@ -0,0 +1,313 @@
+"""
+Pipeline dos assets estáticos: um bundle de CSS e um de JS por página.
+
+- `build` concatena e minifica os arquivos de cada bundle (BUNDLES), grava em
+  ``static/dist/<bundle>.<hash>.<css|js>`` com as variantes ``.gz`` e ``.br``
+  pré-comprimidas e registra os nomes no ``manifest.json``;
+- os templates usam ``{{ asset_tags("chat", "js") }}``: com o manifest, uma tag com o
+  arquivo do bundle; sem ele (desenvolvimento), uma tag por arquivo original;
+- a rota ``/assets/<arquivo>`` serve a variante comprimida aceita pelo navegador, sem
+  comprimir nada em tempo de requisição, com ``Cache-Control: immutable`` (o hash no
+  nome muda a URL quando o conteúdo muda).
+
+O bundle é refeito na subida quando algum arquivo original é mais novo que o manifest
+(ASSETS_AUTO_BUILD), ou manualmente com ``flask assets build``. Brotli é opcional
+(pacote ``brotli``); sem ele só a variante gzip é gerada.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+
+import click
+from flask import abort, request, send_file, url_for
+from flask.cli import AppGroup
+from markupsafe import Markup, escape
+from werkzeug.security import safe_join
+
+logger = logging.getLogger(__name__)
+
+BUNDLES = {
+    "base": {"css": ["css/style.css"]},
+    "login": {"css": ["css/style.css", "css/login.css"], "js": ["js/login.js"]},
+    "register": {"css": ["css/style.css", "css/register.css"], "js": ["js/register.js"]},
+    "home": {"css": ["css/style.css", "css/home.css"], "js": ["js/socket.js", "js/home.js"]},
+    "chat": {"css": ["css/style.css", "css/chat.css"], "js": ["js/socket.js", "js/chat_style.js", "js/crypto.js", "js/attachments.js", "js/chat.js"]},
+    "group": {"css": ["css/style.css", "css/chat.css"], "js": ["js/socket.js", "js/chat_style.js", "js/crypto.js", "js/attachments.js", "js/group.js"]},
+}
+
+MANIFEST = "manifest.json"
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+# ---------------------------------------------------------------------------
+# Minificação conservadora: comentários e espaços; strings, template literals e
+# regex passam intactos e as quebras de linha do JS são mantidas (ASI)
+# ---------------------------------------------------------------------------
+
+def _skip_quoted(source, i):
+    quote = source[i]
+    i += 1
+    while i < len(source) and source[i] != quote:
+        i += 2 if source[i] == "\\" else 1
+    return i + 1
+
+
+def _skip_template(source, i):
+    i += 1
+    depth = 0
+    while i < len(source):
+        c = source[i]
+        if c == "\\":
+            i += 2
+            continue
+        if depth == 0 and c == "`":
+            return i + 1
+        if depth == 0 and source.startswith("${", i):
+            depth, i = 1, i + 2
+            continue
+        if depth:
+            if c in "'\"":
+                i = _skip_quoted(source, i)
+                continue
+            if c == "`":
+                i = _skip_template(source, i)
+                continue
+            depth += {"{": 1, "}": -1}.get(c, 0)
+        i += 1
+    return i
+
+
+def _skip_regex(source, i):
+    i += 1
+    in_class = False
+    while i < len(source) and source[i] != "\n":
+        c = source[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "[":
+            in_class = True
+        elif c == "]":
+            in_class = False
+        elif c == "/" and not in_class:
+            i += 1
+            while i < len(source) and source[i].isalpha():
+                i += 1
+            return i
+        i += 1
+    return i
+
+
+def _regex_allowed(code):
+    stripped = code.rstrip()
+    if not stripped or stripped[-1] in "(,=:[!&|?{};+-*%<>~^":
+        return True
+    return re.search(r"\b(return|typeof|case|in|of)$", stripped) is not None
+
+
+def _squeeze_js(code):
+    code = re.sub(r"[ \t]*\n[ \t\n]*", "\n", code)
+    return re.sub(r"[ \t]+", " ", code)
+
+
+def minify_js(source):
+    out, code = [], []
+    i = 0
+    while i < len(source):
+        c = source[i]
+        nxt = source[i + 1] if i + 1 < len(source) else ""
+        if c in "'\"`":
+            j = _skip_quoted(source, i) if c != "`" else _skip_template(source, i)
+        elif c == "/" and nxt == "/":
+            end = source.find("\n", i)
+            i = len(source) if end == -1 else end
+            continue
+        elif c == "/" and nxt == "*":
+            end = source.find("*/", i + 2)
+            i = len(source) if end == -1 else end + 2
+            code.append(" ")
+            continue
+        elif c == "/" and _regex_allowed("".join(out[-1:]) + "".join(code[-64:])):
+            j = _skip_regex(source, i)
+        else:
+            code.append(c)
+            i += 1
+            continue
+        out.append(_squeeze_js("".join(code)))
+        out.append(source[i:j])
+        code = []
+        i = j
+    out.append(_squeeze_js("".join(code)))
+    return "".join(out).strip() + "\n"
+
+
+def minify_css(source):
+    out = []
+    for part in re.split(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')", source):
+        if part[:1] in ("'", '"'):
+            out.append(part)
+            continue
+        part = re.sub(r"/\*.*?\*/", "", part, flags=re.S)
+        part = re.sub(r"\s+", " ", part)
+        part = re.sub(r"\s*([{};,>])\s*", r"\1", part)
+        part = re.sub(r":\s+", ":", part)
+        out.append(part.replace(";}", "}"))
+    return "".join(out).strip() + "\n"
+
+
+MINIFIERS = {"css": minify_css, "js": minify_js}
+
+
+# ---------------------------------------------------------------------------
+# Build
+# ---------------------------------------------------------------------------
+
+def _write(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _compress(path, data):
+    _write(path + ".gz", gzip.compress(data, 9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        return
+    _write(path + ".br", brotli.compress(data, quality=11))
+
+
+def bundle_sources(bundles=BUNDLES):
+    return sorted({src for kinds in bundles.values() for sources in kinds.values() for src in sources})
+
+
+def build(static_folder, output_dir, bundles=BUNDLES):
+    """Gera os bundles e o manifest; devolve o manifest novo."""
+    os.makedirs(output_dir, exist_ok=True)
+    previous = load_manifest(output_dir) or {}
+    manifest = {}
+
+    for name, kinds in bundles.items():
+        for kind, sources in kinds.items():
+            parts = []
+            for src in sources:
+                with open(os.path.join(static_folder, src), encoding="utf-8") as f:
+                    parts.append(MINIFIERS[kind](f.read()))
+            # ";" entre arquivos JS: um arquivo sem ";" final não pode emendar no próximo
+            data = (";\n" if kind == "js" else "").join(parts).encode()
+
+            filename = f"{name}.{hashlib.sha256(data).hexdigest()[:12]}.{kind}"
+            path = os.path.join(output_dir, filename)
+            if not os.path.exists(path):
+                _write(path, data)
+                _compress(path, data)
+            manifest.setdefault(name, {})[kind] = filename
+
+    _write(os.path.join(output_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    # Mantém a geração anterior: páginas já renderizadas ainda podem pedi-la
+    keep = {f for m in (manifest, previous) for kinds in m.values() for f in kinds.values()}
+    for entry in os.listdir(output_dir):
+        base = re.sub(r"\.(gz|br)$", "", entry)
+        if entry != MANIFEST and base not in keep:
+            os.remove(os.path.join(output_dir, entry))
+
+    return manifest
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_stale(static_folder, output_dir, bundles=BUNDLES):
+    try:
+        built = os.path.getmtime(os.path.join(output_dir, MANIFEST))
+    except OSError:
+        return True
+    return any(os.path.getmtime(os.path.join(static_folder, src)) > built for src in bundle_sources(bundles))
+
+
+# ---------------------------------------------------------------------------
+# Extensão
+# ---------------------------------------------------------------------------
+
+assets_cli = AppGroup("assets", help="Bundles de CSS/JS (app/assets.py).")
+
+
+@assets_cli.command("build")
+def build_command():
+    """Gera os bundles minificados e comprimidos em static/dist."""
+    from app import assets
+
+    manifest = assets.build()
+    for name, kinds in sorted(manifest.items()):
+        click.echo(f"{name}: {', '.join(kinds[k] for k in sorted(kinds))}")
+
+
+class Assets:
+    def __init__(self):
+        self.enabled = True
+        self.max_age = 365 * 24 * 3600
+        self.static_folder = None
+        self.output_dir = None
+        self.manifest = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get("ASSETS_ENABLED", self.enabled)
+        self.max_age = app.config.get("ASSETS_MAX_AGE", self.max_age)
+        self.static_folder = app.static_folder
+        self.output_dir = os.path.join(app.static_folder, "dist")
+
+        if self.enabled:
+            if app.config.get("ASSETS_AUTO_BUILD") and is_stale(self.static_folder, self.output_dir):
+                try:
+                    build(self.static_folder, self.output_dir)
+                except OSError as exc:
+                    # static/ somente leitura: segue com os arquivos originais
+                    logger.warning("falha ao gerar os bundles", extra={"error": str(exc)})
+            self.manifest = load_manifest(self.output_dir)
+
+        app.add_url_rule(f"{app.config.get('ASSETS_URL_PREFIX', '/assets')}/<path:filename>", "assets", self.serve)
+        app.context_processor(lambda: {"asset_tags": self.tags})
+        app.cli.add_command(assets_cli)
+
+    def build(self):
+        self.manifest = build(self.static_folder, self.output_dir)
+        return self.manifest
+
+    def urls(self, bundle, kind):
+        if self.manifest and kind in self.manifest.get(bundle, {}):
+            return [url_for("assets", filename=self.manifest[bundle][kind])]
+        return [url_for("static", filename=src) for src in BUNDLES[bundle].get(kind, ())]
+
+    def tags(self, bundle, kind):
+        template = '<link rel="stylesheet" href="{}">' if kind == "css" else '<script src="{}"></script>'
+        return Markup("\n".join(template.format(escape(url)) for url in self.urls(bundle, kind)))
+
+    def serve(self, filename):
+        path = safe_join(self.output_dir, filename)
+        if path is None or filename == MANIFEST or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        encoding = None
+        for name, suffix in ENCODINGS:
+            if name in request.accept_encodings and os.path.isfile(path + suffix):
+                encoding, path = name, path + suffix
+                break
+
+        resp = send_file(path, mimetype=mimetype, conditional=True, max_age=self.max_age)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        resp.headers["Cache-Control"] = f"public, max-age={self.max_age}, immutable"
+        resp.vary.add("Accept-Encoding")
+        return resp
@@ -0,0 +1,287 @@
+"""
+Anexos: arquivos cifrados no navegador, enviados em blocos e guardados em disco.
+
+O cliente (static/js/attachments.js) cifra o arquivo em blocos de tamanho fixo, cada
+um com AES-GCM e uma chave própria do arquivo, e os envia um a um pelo Socket.IO:
+
+- ``create_attachment`` reserva o anexo para uma conversa (ou grupo) e devolve o id,
+  o tamanho do bloco cifrado (ATTACHMENT_CHUNK_SIZE) e o total de blocos;
+- ``upload_attachment_chunk`` grava cada bloco direto na sua posição do arquivo, sem
+  montar o arquivo em memória. Os blocos vão em ordem; o próximo esperado sai do
+  tamanho do arquivo em disco, então um envio interrompido (queda da conexão, restart
+  do servidor) continua de ``attachment_status``;
+- ``GET /attachments/<id>`` devolve o arquivo cifrado para quem participa da conversa,
+  com `send_file` (Range e cache condicional). Com ATTACHMENT_ACCEL_PREFIX o corpo fica
+  a cargo do nginx (``X-Accel-Redirect``), que usa sendfile sem passar pelo Python.
+
+A mensagem do chat leva só a referência (id, nome, chave do arquivo), cifrada como
+qualquer outra mensagem. O servidor nunca vê a chave nem o conteúdo.
+
+Cada usuário tem no máximo ATTACHMENT_MAX_PENDING envios incompletos abertos, e os
+abandonados são apagados a cada ATTACHMENT_PURGE_INTERVAL por uma tarefa em segundo
+plano (ou à mão, com ``flask attachments purge``).
+
+Com vários workers, ATTACHMENT_DIR precisa ser o mesmo diretório para todos.
+"""
+import logging
+import os
+import re
+import secrets
+import threading
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import abort, current_app, g, send_file
+from flask.cli import AppGroup
+
+logger = logging.getLogger(__name__)
+
+GCM_TAG_SIZE = 16
+DIRECT_ROOM = re.compile(r"^room_(\d+)_(\d+)$")
+
+
+class AttachmentError(Exception):
+    """Operação recusada; `code` vai no ack do evento ("not_found", "too_large"...)."""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+def chunk_count(size, chunk_size):
+    return max(1, -(-size // chunk_size))
+
+
+def can_read(user_id, room):
+    """Quem participa da conversa: os dois da sala a dois ou os membros do grupo."""
+    from app import groups
+    from app.groups import GroupError
+
+    if room.startswith("group_"):
+        try:
+            return groups.role(int(room[len("group_"):]), user_id) is not None
+        except GroupError:
+            return False
+    match = DIRECT_ROOM.match(room)
+    return bool(match) and str(user_id) in match.groups()
+
+
+attachments_cli = AppGroup("attachments", help="Anexos em disco (app/attachments.py).")
+
+
+@attachments_cli.command("purge")
+def purge_command():
+    """Apaga os envios incompletos mais velhos que ATTACHMENT_INCOMPLETE_TTL."""
+    from app import attachments
+
+    click.echo(f"{attachments.purge_incomplete()} anexo(s) incompleto(s) removido(s).")
+
+
+class AttachmentStore:
+    def __init__(self, chunk_size=64 * 1024, max_size=50 * 1024 * 1024, incomplete_ttl=24 * 3600,
+                 max_pending=4, purge_interval=3600):
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.incomplete_ttl = incomplete_ttl
+        self.max_pending = max_pending
+        self.purge_interval = purge_interval
+        self.directory = None
+        self.accel_prefix = ""
+        self._uploads = {}      # id -> envio em andamento (dict; sem consultar o banco a cada bloco)
+        self._lock = threading.Lock()
+        self._app = None
+        self._socketio = None
+        self._task = None
+
+    def init_app(self, app, socketio):
+        self.chunk_size = app.config.get("ATTACHMENT_CHUNK_SIZE", self.chunk_size)
+        self.max_size = app.config.get("ATTACHMENT_MAX_SIZE", self.max_size)
+        self.incomplete_ttl = app.config.get("ATTACHMENT_INCOMPLETE_TTL", self.incomplete_ttl)
+        self.max_pending = app.config.get("ATTACHMENT_MAX_PENDING", self.max_pending)
+        self.purge_interval = app.config.get("ATTACHMENT_PURGE_INTERVAL", self.purge_interval)
+        self._app = app
+        self._socketio = socketio
+        self.accel_prefix = app.config.get("ATTACHMENT_ACCEL_PREFIX", "").rstrip("/")
+        self.directory = app.config.get("ATTACHMENT_DIR") or os.path.join(app.instance_path, "attachments")
+        os.makedirs(self.directory, exist_ok=True)
+
+        from app.auth import login_required
+
+        app.add_url_rule("/attachments/<attachment_id>", "attachment", login_required(self.serve))
+        app.cli.add_command(attachments_cli)
+
+    def path(self, attachment_id):
+        return os.path.join(self.directory, attachment_id)
+
+    # ------------------------------------------------------------------
+    # Envio
+    # ------------------------------------------------------------------
+
+    def create(self, owner_id, room, plain_size):
+        """Reserva o anexo; `plain_size` é o tamanho do arquivo antes de cifrar."""
+        from app import db
+        from app.models.attachment import Attachment
+
+        if plain_size < 0:
+            raise AttachmentError("invalid_size")
+        # Cada bloco cifrado leva a tag do GCM: o arquivo em claro anda em blocos menores
+        plain_chunk = self.chunk_size - GCM_TAG_SIZE
+        total_chunks = chunk_count(plain_size, plain_chunk)
+        size = plain_size + total_chunks * GCM_TAG_SIZE
+        if size > self.max_size:
+            raise AttachmentError("too_large")
+        # Envios abertos do usuário (os vencidos ficam para a limpeza e não contam)
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.incomplete_ttl)
+        pending = Attachment.query.filter(Attachment.owner_id == owner_id, Attachment.complete.is_(False),
+                                          Attachment.created_at >= cutoff).count()
+        if pending >= self.max_pending:
+            raise AttachmentError("too_many_pending")
+
+        self._ensure_started()
+        upload = {"id": secrets.token_hex(16), "owner_id": owner_id, "size": size,
+                  "chunk_size": self.chunk_size, "complete": False}
+        open(self.path(upload["id"]), "wb").close()
+        db.session.add(Attachment(room=room, **upload))
+        db.session.commit()
+
+        with self._lock:
+            self._uploads[upload["id"]] = upload
+        return self.describe(upload, next_index=0)
+
+    def status(self, attachment_id, owner_id):
+        return self.describe(self._upload(attachment_id, owner_id))
+
+    def write_chunk(self, attachment_id, owner_id, index, data):
+        """Grava o bloco `index`; blocos já recebidos são ignorados (reenvio após queda)."""
+        upload = self._upload(attachment_id, owner_id)
+        if upload["complete"]:
+            return self.describe(upload)
+
+        expected = self.next_index(upload)
+        if index < expected:
+            return self.describe(upload, next_index=expected)
+        if index > expected:
+            raise AttachmentError("out_of_order")
+
+        chunk_size = upload["chunk_size"]
+        last = index == chunk_count(upload["size"], chunk_size) - 1
+        if len(data) != (upload["size"] - index * chunk_size if last else chunk_size):
+            raise AttachmentError("invalid_chunk")
+
+        # Direto na posição do bloco; um resto parcial de uma escrita interrompida é sobrescrito
+        with open(self.path(attachment_id), "r+b") as f:
+            f.seek(index * chunk_size)
+            f.write(data)
+            f.truncate()
+
+        if last:
+            self._finish(upload)
+        return self.describe(upload, next_index=index + 1)
+
+    def next_index(self, upload):
+        total = chunk_count(upload["size"], upload["chunk_size"])
+        if upload["complete"]:
+            return total
+        try:
+            written = os.path.getsize(self.path(upload["id"]))
+        except OSError:
+            raise AttachmentError("not_found")
+        # O último bloco só conta depois de marcado como completo no banco
+        return min(written // upload["chunk_size"], total - 1)
+
+    def describe(self, upload, next_index=None):
+        return {
+            "id": upload["id"],
+            "size": upload["size"],
+            "chunk_size": upload["chunk_size"],
+            "total_chunks": chunk_count(upload["size"], upload["chunk_size"]),
+            "next": self.next_index(upload) if next_index is None else next_index,
+            "complete": upload["complete"],
+        }
+
+    def _upload(self, attachment_id, owner_id):
+        from app import db
+        from app.models.attachment import Attachment
+
+        with self._lock:
+            upload = self._uploads.get(attachment_id)
+        if upload is None:
+            row = db.session.get(Attachment, str(attachment_id))
+            if row is None:
+                raise AttachmentError("not_found")
+            upload = {"id": row.id, "owner_id": row.owner_id, "size": row.size,
+                      "chunk_size": row.chunk_size, "complete": row.complete}
+            if not row.complete:
+                with self._lock:
+                    self._uploads[row.id] = upload
+        if upload["owner_id"] != owner_id:
+            raise AttachmentError("forbidden")
+        return upload
+
+    def _finish(self, upload):
+        from app import db
+        from app.models.attachment import Attachment
+
+        Attachment.query.filter_by(id=upload["id"]).update({"complete": True})
+        db.session.commit()
+        upload["complete"] = True
+        with self._lock:
+            self._uploads.pop(upload["id"], None)
+        logger.info("anexo recebido", extra={"attachment_id": upload["id"], "size": upload["size"]})
+
+    # ------------------------------------------------------------------
+    # Download e limpeza
+    # ------------------------------------------------------------------
+
+    def serve(self, attachment_id):
+        from app import db
+        from app.models.attachment import Attachment
+
+        attachment = db.session.get(Attachment, attachment_id)
+        if attachment is None or not attachment.complete or not can_read(g.user_id, attachment.room):
+            abort(404)
+
+        if self.accel_prefix:
+            # nginx entrega o arquivo (location interna apontando para ATTACHMENT_DIR)
+            resp = current_app.response_class(mimetype="application/octet-stream")
+            resp.headers["X-Accel-Redirect"] = f"{self.accel_prefix}/{attachment_id}"
+        else:
+            resp = send_file(self.path(attachment_id), mimetype="application/octet-stream",
+                             conditional=True, etag=attachment_id)
+        # Conteúdo imutável (cifrado, id aleatório), mas só para quem está logado
+        resp.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+        return resp
+
+    def _ensure_started(self):
+        if self._task is None and self._socketio is not None:
+            self._task = self._socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self._socketio.sleep(self.purge_interval)
+            try:
+                with self._app.app_context():
+                    removed = self.purge_incomplete()
+                if removed:
+                    logger.info("anexos incompletos removidos", extra={"attachments": removed})
+            except Exception:
+                logger.exception("erro na limpeza dos anexos incompletos")
+
+    def purge_incomplete(self):
+        from app import db
+        from app.models.attachment import Attachment
+
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.incomplete_ttl)
+        stale = [a.id for a in Attachment.query.filter(Attachment.complete.is_(False),
+                                                        Attachment.created_at < cutoff)]
+        for attachment_id in stale:
+            try:
+                os.remove(self.path(attachment_id))
+            except FileNotFoundError:
+                pass
+            with self._lock:
+                self._uploads.pop(attachment_id, None)
+        if stale:
+            Attachment.query.filter(Attachment.id.in_(stale)).delete(synchronize_session=False)
+            db.session.commit()
+        return len(stale)
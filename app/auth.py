@@ -0,0 +1,85 @@
+"""
+Camada única de autenticação para rotas HTTP e eventos do Socket.IO.
+
+- `verify_token` decodifica o JWT uma única vez e guarda o payload no TokenCache;
+- `login_required` protege rotas e expõe a identidade em `g.user_id`/`g.username`;
+- `authenticate_socket` roda no `connect` e guarda a identidade na sessão do socket;
+  `socket_authenticated` protege os handlers, que passam a ler `session["user_id"]`
+  em vez de confiar no `sender` enviado pelo cliente.
+"""
+from functools import wraps
+
+import jwt
+from flask import current_app, g, jsonify, request, session
+from flask_socketio import disconnect
+from jwt import ExpiredSignatureError, InvalidTokenError
+
+from app import token_cache
+
+
+def get_token_from_request():
+    # conforme definido em auth_routes.py
+    return request.cookies.get("token") or None
+
+
+def verify_token(token):
+    """Payload do token se for válido (e não revogado); None caso contrário."""
+    if not token:
+        return None
+
+    # O cache confere a revogação (logout em outro worker) a cada TOKEN_REVOCATION_CHECK
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+    if token_cache.is_revoked(token):
+        return None
+
+    try:
+        payload = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
+    except (ExpiredSignatureError, InvalidTokenError):
+        return None
+
+    token_cache.put(token, payload)
+    return payload
+
+
+def revoke_token(token):
+    """Invalida o token no logout (o JWT continuaria válido até o `exp`)."""
+    payload = verify_token(token)
+    if payload is not None:
+        token_cache.revoke(token, payload.get("exp", 0))
+    return payload
+
+
+def login_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        payload = verify_token(get_token_from_request())
+        if not payload:
+            return jsonify({"message": "Unauthorized"}), 401
+
+        g.user_id = payload.get("user_id")
+        g.username = payload.get("username")
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def authenticate_socket():
+    """Autentica a conexão Socket.IO pelo cookie; chamada uma vez no `connect`."""
+    payload = verify_token(get_token_from_request())
+    if not payload:
+        return False
+
+    session["user_id"] = payload.get("user_id")
+    session["username"] = payload.get("username")
+    return True
+
+
+def socket_authenticated(handler):
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if session.get("user_id") is None:
+            disconnect()
+            return None
+        return handler(*args, **kwargs)
+    return wrapper
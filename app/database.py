@@ -0,0 +1,206 @@
+"""
+Configuração do engine do SQLAlchemy a partir de app/config.py.
+
+- PostgreSQL (DATABASE_URL=postgresql://...) e SQLite são suportados; URLs no formato
+  ``postgres://`` (Heroku, Render...) são normalizadas para ``postgresql://``.
+- Pool de conexões (tamanho, overflow, timeout, reciclagem e pre-ping) para os bancos
+  em arquivo/servidor. SQLite em memória mantém o pool padrão do SQLAlchemy.
+- No SQLite, cada conexão nova recebe os PRAGMAs de concorrência: WAL (leitores não
+  bloqueiam o escritor), `synchronous`, `busy_timeout` (espera o lock em vez de falhar
+  com "database is locked") e `mmap_size`.
+
+As opções explícitas em SQLALCHEMY_ENGINE_OPTIONS têm precedência sobre as calculadas aqui.
+
+O schema não é criado na subida: ``flask setup-db`` cria as tabelas num banco novo (e
+marca a última migração) ou aplica as migrações pendentes. A subida só confere o
+estado (`schema_status`) e avisa; DB_AUTO_CREATE=1 mantém a criação automática.
+O Flask-Migrate (alembic, o import mais pesado do app) só é carregado pelo CLI.
+"""
+import logging
+import os
+import re
+
+import click
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_database_url(url):
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def is_sqlite_memory(url):
+    return url.drivername.startswith("sqlite") and url.database in (None, "", ":memory:")
+
+
+def engine_options(config):
+    """Opções de create_engine para a URL configurada."""
+    url = make_url(normalize_database_url(config["SQLALCHEMY_DATABASE_URI"]))
+    options = {}
+
+    if url.drivername.startswith("postgresql"):
+        _require_postgres_driver(url)
+
+    if not is_sqlite_memory(url):
+        options.update(
+            pool_size=config["DB_POOL_SIZE"],
+            max_overflow=config["DB_MAX_OVERFLOW"],
+            pool_timeout=config["DB_POOL_TIMEOUT"],
+            pool_recycle=config["DB_POOL_RECYCLE"],
+            pool_pre_ping=config["DB_POOL_PRE_PING"],
+        )
+
+    if url.drivername.startswith("sqlite"):
+        options["connect_args"] = {
+            # Timeout do próprio driver (segundos); o PRAGMA busy_timeout abaixo é o mesmo limite
+            "timeout": config["SQLITE_BUSY_TIMEOUT_MS"] / 1000,
+            # Conexões do pool circulam entre threads/greenlets
+            "check_same_thread": False,
+        }
+
+    options.update(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    return options
+
+
+def sqlite_pragmas(config):
+    pragmas = [
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+    if config["SQLITE_WAL"]:
+        pragmas.insert(0, "PRAGMA journal_mode=WAL")
+    return pragmas
+
+
+def configure_database(app):
+    """Ajusta URL e opções do engine; chamar antes de `db.init_app`."""
+    app.config["SQLALCHEMY_DATABASE_URI"] = normalize_database_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+
+
+def install_sqlite_pragmas(app, db):
+    """Aplica os PRAGMAs a cada conexão nova do SQLite; chamar depois de `db.init_app`."""
+    with app.app_context():
+        engine = db.engine
+
+    if engine.dialect.name != "sqlite" or is_sqlite_memory(engine.url):
+        return
+
+    pragmas = sqlite_pragmas(app.config)
+
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def init_migrations(app, db):
+    """Registra o Flask-Migrate (`flask db ...`) só quando o app sobe pelo CLI do Flask."""
+    if click.get_current_context(silent=True) is None:
+        return
+    _migrate(app, db)
+
+
+def _migrate(app, db):
+    if "migrate" not in app.extensions:
+        from flask_migrate import Migrate
+
+        Migrate(app, db, directory=app.config["MIGRATIONS_DIR"]).configure(_keep_app_logging)
+    return app.extensions["migrate"].migrate
+
+
+def _keep_app_logging(config):
+    # Lido pelo migrations/env.py: não aplica o logging do alembic.ini por cima do app/log.py
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def migration_heads(directory):
+    """Revisões finais das migrações, lidas dos arquivos sem importar o alembic."""
+    revisions, parents = set(), set()
+    versions = os.path.join(directory, "versions")
+    for filename in os.listdir(versions):
+        if not filename.endswith(".py"):
+            continue
+        with open(os.path.join(versions, filename), encoding="utf-8") as f:
+            source = f.read()
+        revision = re.search(r"^revision\s*=\s*['\"](\w+)['\"]", source, re.M)
+        down = re.search(r"^down_revision\s*=\s*(.+)$", source, re.M)
+        if revision:
+            revisions.add(revision.group(1))
+        if down:
+            parents.update(re.findall(r"['\"](\w+)['\"]", down.group(1)))
+    return revisions - parents
+
+
+def schema_status(app, db):
+    """"current", "outdated", "unversioned" (criado pelo create_all, sem alembic) ou "empty"."""
+    with app.app_context():
+        tables = set(inspect(db.engine).get_table_names())
+        if not tables - {"alembic_version"}:
+            return "empty"
+        if "alembic_version" not in tables:
+            return "unversioned"
+        with db.engine.connect() as conn:
+            current = set(conn.execute(text("SELECT version_num FROM alembic_version")).scalars())
+    return "current" if current == migration_heads(app.config["MIGRATIONS_DIR"]) else "outdated"
+
+
+def setup_schema(app, db):
+    """Deixa o banco na última migração; devolve o estado encontrado antes."""
+    import flask_migrate
+
+    _migrate(app, db)
+    status = schema_status(app, db)
+    with app.app_context():
+        if status in ("empty", "unversioned"):
+            # As migrações partem de uma tabela users que nunca foi migração: o banco
+            # novo (ou criado pelo create_all antigo) nasce dos modelos e é marcado
+            db.create_all()
+            flask_migrate.stamp()
+        elif status == "outdated":
+            flask_migrate.upgrade()
+    return status
+
+
+@click.command("setup-db")
+def setup_db_command():
+    """Cria as tabelas num banco novo ou aplica as migrações pendentes."""
+    from flask import current_app
+    from app import db
+
+    status = setup_schema(current_app, db)
+    click.echo({
+        "empty": "Banco criado.",
+        "unversioned": "Tabelas que faltavam criadas; banco marcado na última migração.",
+        "outdated": "Migrações aplicadas.",
+        "current": "Banco já está na última migração.",
+    }[status])
+
+
+def check_schema(app, db):
+    """Na subida: cria o schema com DB_AUTO_CREATE, senão só avisa se falta migração."""
+    if app.config["DB_AUTO_CREATE"]:
+        setup_schema(app, db)
+        return
+    status = schema_status(app, db)
+    if status != "current":
+        logger.warning("schema do banco desatualizado: execute `flask setup-db`", extra={"status": status})
+
+
+def _require_postgres_driver(url):
+    driver = url.get_dialect().driver
+    try:
+        __import__(driver)
+    except ImportError:
+        package = "psycopg2-binary" if driver == "psycopg2" else driver
+        raise RuntimeError(f"DATABASE_URL={url.drivername}:// requer o driver '{driver}' (pip install {package})")
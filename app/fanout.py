@@ -0,0 +1,206 @@
+"""
+Pipeline de saída das mensagens do chat.
+
+Em vez de um `emit` (um frame de websocket) por mensagem, as mensagens de cada sala
+são acumuladas em micro-lotes e enviadas num único evento `receive_messages`:
+
+- o lote sai quando atinge `max_batch` mensagens ou quando a mais antiga espera
+  `max_delay_ms` milissegundos, o que vier primeiro;
+- um único flusher em segundo plano faz todos os envios, preservando a ordem;
+- cada sala aceita no máximo `max_pending` mensagens aguardando envio; acima disso
+  `reserve` recusa a mensagem e o remetente é avisado para reenviar mais tarde. A
+  vaga é reservada (verificação e contagem sob o mesmo lock) antes de a mensagem ir
+  para o histórico e ocupada pelo `publish`;
+- depois dos envios, conexões deste worker com mais de `max_conn_queue` pacotes na
+  fila de saída do Engine.IO (cliente que não lê, rede lenta) são derrubadas, com a
+  fila descartada: o cliente reconecta e retoma pelo cursor do histórico, em vez de o
+  servidor acumular memória por ele. A verificação roda no máximo uma vez por segundo.
+
+Com FANOUT_ENABLED desligado cada mensagem sai na hora como `receive_message`.
+
+As entregas saem uma vez por codificação (app/wire.py), só para as sub-salas que têm
+alguém conectado (segundo o app/rooms.py). Cada emit monta o pacote uma única vez e o
+mesmo pacote vai para todos da sala: o custo de uma mensagem de grupo grande é o envio
+em si, sem cópias do payload por membro (e anexos binários não passam pelo deflate,
+ver app/transport.py).
+"""
+import logging
+import threading
+import time
+
+from app.rooms import user_room
+from app.wire import ENCODINGS, delivery_room, encode, encode_page
+
+logger = logging.getLogger(__name__)
+
+
+class FanoutPipeline:
+    def __init__(self, enabled=True, max_batch=32, max_delay_ms=5, max_pending=1024, max_conn_queue=1000):
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.max_pending = max_pending
+        self.max_conn_queue = max_conn_queue
+
+        # Métricas
+        self.batches_sent = 0
+        self.messages_sent = 0
+        self.rejected = 0
+        self.dropped_connections = 0
+
+        self._buffers = {}      # room -> [mensagem, ...]
+        self._oldest = {}       # room -> instante da mensagem mais antiga no buffer
+        self._reserved = {}     # room -> vagas reservadas ainda não publicadas
+        self._next_laggard_check = 0
+        self._lock = threading.Lock()
+        self._socketio = None
+        self._rooms = None
+        self._shared_queue = False
+        self._wakeup = None
+        self._task = None
+
+    def init_app(self, app, socketio, room_registry):
+        self.enabled = app.config.get("FANOUT_ENABLED", self.enabled)
+        self.max_batch = app.config.get("FANOUT_MAX_BATCH", self.max_batch)
+        self.max_delay = app.config.get("FANOUT_MAX_DELAY_MS", self.max_delay * 1000) / 1000
+        self.max_pending = app.config.get("FANOUT_MAX_PENDING", self.max_pending)
+        self.max_conn_queue = app.config.get("FANOUT_MAX_CONN_QUEUE", self.max_conn_queue)
+        self._socketio = socketio
+        self._rooms = room_registry
+        # Com fila de mensagens entre workers, os participantes podem estar em outro processo
+        self._shared_queue = bool(app.config.get("SOCKETIO_MESSAGE_QUEUE"))
+
+    def reserve(self, room):
+        """Reserva a vaga de uma mensagem; False se a sala já tem `max_pending` esperando envio."""
+        if not self.enabled:
+            return True
+        with self._lock:
+            reserved = self._reserved.get(room, 0)
+            if len(self._buffers.get(room, ())) + reserved >= self.max_pending:
+                self.rejected += 1
+                return False
+            self._reserved[room] = reserved + 1
+            return True
+
+    def release(self, room):
+        """Devolve a vaga de uma mensagem que não chegou ao `publish`."""
+        with self._lock:
+            self._release(room)
+
+    def publish(self, room, message):
+        if not self.enabled:
+            self.deliver("receive_message", room, message)
+            self.batches_sent += 1
+            self.messages_sent += 1
+            return
+
+        self._ensure_started()
+        with self._lock:
+            self._release(room)
+            was_idle = not self._buffers
+            buffer = self._buffers.get(room)
+            if buffer is None:
+                buffer = self._buffers[room] = []
+                self._oldest[room] = time.monotonic()
+            buffer.append(message)
+            full = len(buffer) >= self.max_batch
+
+        # Acorda o flusher se o lote encheu ou se ele estava parado sem nada pendente
+        if full or was_idle:
+            self._wakeup.set()
+
+    def deliver(self, event, room, data, skip_sid=None):
+        """Emite `data` para a sala, codificado para cada modo (binário/base64) presente."""
+        encoder = encode_page if "messages" in data else encode
+        for encoding in ENCODINGS:
+            if self._shared_queue or self._rooms.has_listeners(room, encoding):
+                self._socketio.emit(event, encoder(data, encoding), to=delivery_room(room, encoding),
+                                    skip_sid=skip_sid)
+
+    def deliver_to_user(self, event, user_id, data):
+        """Emite `data` para as conexões de um usuário (todas as abas, qualquer worker)."""
+        room = user_room(user_id)
+        for encoding in ENCODINGS:
+            # Sem registro dessa sala: emitir para uma sala vazia não envia nada
+            self._socketio.emit(event, encode(data, encoding), to=delivery_room(room, encoding))
+
+    def _release(self, room):
+        # Chamado com o lock
+        reserved = self._reserved.pop(room, 0) - 1
+        if reserved > 0:
+            self._reserved[room] = reserved
+
+    def pending(self):
+        with self._lock:
+            return sum(len(b) for b in self._buffers.values())
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "pending": self.pending(),
+            "batches_sent": self.batches_sent,
+            "messages_sent": self.messages_sent,
+            "rejected": self.rejected,
+            "dropped_connections": self.dropped_connections,
+        }
+
+    def _ensure_started(self):
+        if self._task is None:
+            with self._lock:
+                if self._task is None:
+                    self._wakeup = self._socketio.server.eio.create_event()
+                    self._task = self._socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            # Com lotes pendentes acorda na metade do prazo (nenhuma mensagem espera mais
+            # que 1,5x max_delay); sem nada pendente dorme até o próximo publish
+            self._wakeup.wait(self.max_delay / 2 if self._buffers else None)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                now = time.monotonic()
+                if self.max_conn_queue and now >= self._next_laggard_check:
+                    self._next_laggard_check = now + 1
+                    self.drop_laggards()
+            except Exception:
+                logger.exception("Erro no envio de lotes de mensagens")
+
+    def flush(self, force=False):
+        """Envia os lotes cheios ou vencidos (todos, com `force`)."""
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for room in list(self._buffers):
+                buffer = self._buffers[room]
+                if force or len(buffer) >= self.max_batch or now - self._oldest[room] >= self.max_delay:
+                    ready.append((room, buffer))
+                    del self._buffers[room]
+                    del self._oldest[room]
+
+        for room, buffer in ready:
+            # Lotes grandes (sala acumulou mais que max_batch) saem em fatias de max_batch
+            for start in range(0, len(buffer), self.max_batch):
+                batch = buffer[start:start + self.max_batch]
+                self.deliver("receive_messages", room, {"room": room, "messages": batch})
+                self.batches_sent += 1
+                self.messages_sent += len(batch)
+
+    def drop_laggards(self):
+        """Derruba as conexões com mais de `max_conn_queue` pacotes esperando envio."""
+        eio = self._socketio.server.eio
+        empty = eio.get_queue_empty_exception()
+        for eio_sid, sock in list(eio.sockets.items()):
+            if sock.closed or sock.queue.qsize() <= self.max_conn_queue:
+                continue
+            # Descarta o atraso: nada dele chega, o cliente recupera pelo histórico
+            try:
+                while True:
+                    sock.queue.get_nowait()
+                    sock.queue.task_done()
+            except empty:
+                pass
+            sock.close(wait=False, abort=True, reason=eio.reason.SERVER_DISCONNECT)
+            eio.sockets.pop(eio_sid, None)
+            self.dropped_connections += 1
+            logger.warning("conexão lenta derrubada", extra={"sid": eio_sid})
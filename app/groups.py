@@ -0,0 +1,174 @@
+"""
+Grupos: membros no banco (app/models/group.py) e um cache LRU/TTL dos membros.
+
+As mensagens de um grupo são cifradas uma única vez pelo remetente com a sua sender
+key (crypto.js) e o servidor as repassa como qualquer mensagem de sala: um emit por
+codificação para a sala ``group_<id>`` (app/fanout.py), com o pacote montado uma vez
+para todos os membros. A sender key de cada membro é distribuída aos demais por
+canais par a par (ECDH), uma vez por rotação, nunca por mensagem.
+
+Toda verificação de membro passa pelo cache (``members``); mudanças feitas neste
+processo o invalidam na hora e as de outros workers valem depois de GROUP_CACHE_TTL.
+A distribuição de chaves não espera esse prazo: consulta o banco (``fresh=True``),
+para que um membro removido em outro worker não receba a sender key nova.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+ROLES = ("admin", "member")
+
+
+class GroupError(Exception):
+    """Operação recusada; `code` vai no ack do evento ("not_found", "forbidden"...)."""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+def group_room(group_id):
+    return f"group_{group_id}"
+
+
+class GroupDirectory:
+    def __init__(self, max_members=1024, max_groups=10000, ttl=30):
+        self.max_members = max_members
+        self.max_groups = max_groups
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._members = OrderedDict()   # group_id -> ({user_id: papel}, válido até)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_members = app.config.get("GROUP_MAX_MEMBERS", self.max_members)
+        self.max_groups = app.config.get("GROUP_CACHE_SIZE", self.max_groups)
+        self.ttl = app.config.get("GROUP_CACHE_TTL", self.ttl)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def members(self, group_id, fresh=False):
+        """{user_id: papel} do grupo; GroupError("not_found") se não existe.
+
+        Com `fresh` lê do banco mesmo havendo entrada válida (e a renova no cache).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._members.get(group_id)
+            if not fresh and entry is not None and entry[1] > now:
+                self._members.move_to_end(group_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        members = self._load(group_id)
+        with self._lock:
+            self._members[group_id] = (members, now + self.ttl)
+            self._members.move_to_end(group_id)
+            while len(self._members) > self.max_groups:
+                self._members.popitem(last=False)
+        return members
+
+    def role(self, group_id, user_id, fresh=False):
+        return self.members(group_id, fresh).get(user_id)
+
+    def user_groups(self, user_id):
+        """[{id, name, role}] dos grupos do usuário (consulta pelo índice de user_id)."""
+        from app import db
+        from app.models.group import Group, GroupMember
+
+        rows = (
+            db.session.query(Group.id, Group.name, GroupMember.role)
+            .join(GroupMember, GroupMember.group_id == Group.id)
+            .filter(GroupMember.user_id == user_id)
+            .order_by(Group.name)
+            .all()
+        )
+        return [{"id": gid, "name": name, "role": role} for gid, name, role in rows]
+
+    def invalidate(self, group_id):
+        with self._lock:
+            self._members.pop(group_id, None)
+
+    def stats(self):
+        return {"cached": len(self._members), "hits": self.hits, "misses": self.misses}
+
+    # ------------------------------------------------------------------
+    # Alterações (quem cria é admin; admins adicionam e removem, qualquer um sai)
+    # ------------------------------------------------------------------
+
+    def create(self, owner_id, name, member_ids=()):
+        from app import db
+        from app.models.group import Group, GroupMember
+
+        name = (name or "").strip()
+        if not name or len(name) > 80:
+            raise GroupError("invalid_name")
+        member_ids = set(member_ids) - {owner_id}
+        if len(member_ids) + 1 > self.max_members:
+            raise GroupError("too_many_members")
+        self._require_users(member_ids)
+
+        group = Group(name=name, owner_id=owner_id)
+        db.session.add(group)
+        db.session.flush()
+        db.session.add(GroupMember(group_id=group.id, user_id=owner_id, role="admin"))
+        db.session.add_all(GroupMember(group_id=group.id, user_id=uid, role="member") for uid in member_ids)
+        db.session.commit()
+        return group.id
+
+    def add_members(self, group_id, actor_id, user_ids):
+        """Adiciona quem ainda não é membro; devolve os ids adicionados."""
+        from app import db
+        from app.models.group import GroupMember
+
+        members = self.members(group_id)
+        if members.get(actor_id) != "admin":
+            raise GroupError("forbidden")
+        new = set(user_ids) - set(members)
+        if not new:
+            return []
+        if len(members) + len(new) > self.max_members:
+            raise GroupError("too_many_members")
+        self._require_users(new)
+
+        db.session.add_all(GroupMember(group_id=group_id, user_id=uid, role="member") for uid in new)
+        db.session.commit()
+        self.invalidate(group_id)
+        return sorted(new)
+
+    def remove_member(self, group_id, actor_id, user_id):
+        """Remove `user_id` (ou o próprio `actor_id` saindo); devolve True se removeu."""
+        from app import db
+        from app.models.group import GroupMember
+
+        members = self.members(group_id)
+        if actor_id != user_id and members.get(actor_id) != "admin":
+            raise GroupError("forbidden")
+        if user_id not in members:
+            return False
+
+        GroupMember.query.filter_by(group_id=group_id, user_id=user_id).delete()
+        db.session.commit()
+        self.invalidate(group_id)
+        return True
+
+    def _load(self, group_id):
+        from app import db
+        from app.models.group import Group, GroupMember
+
+        rows = db.session.query(GroupMember.user_id, GroupMember.role).filter(GroupMember.group_id == group_id).all()
+        if not rows and db.session.get(Group, group_id) is None:
+            raise GroupError("not_found")
+        return {user_id: role for user_id, role in rows}
+
+    def _require_users(self, user_ids):
+        from app import user_directory
+
+        if not user_ids:
+            return
+        if len(user_directory.get_many(user_ids)) != len(set(user_ids)):
+            raise GroupError("unknown_user")
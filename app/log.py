@@ -0,0 +1,148 @@
+"""
+Logging estruturado e sem bloqueio.
+
+- Todos os registros passam por um `QueueHandler`: quem loga (handlers do Socket.IO,
+  rotas) só coloca o registro numa fila limitada; a escrita no stream é feita por um
+  `QueueListener` em segundo plano. Com a fila cheia o registro é descartado e contado,
+  em vez de segurar o handler.
+- Formato compacto em JSON (uma linha por evento), com os campos passados em `extra`;
+  LOG_FORMAT=text dá uma saída legível para desenvolvimento.
+- Nível global em LOG_LEVEL e por módulo em LOG_LEVELS ("app.socket_events=DEBUG,engineio=WARNING").
+- Eventos por mensagem usam um logger próprio com amostragem (LOG_MESSAGE_SAMPLE_RATE).
+- O conteúdo das mensagens não é logado por padrão (ver `payload`).
+"""
+import atexit
+import json
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# Atributos padrão de um LogRecord; o resto veio de `extra` e vira campo do JSON
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener = None
+_payload_chars = 0
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(",", ":"), ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        text = super().format(record)
+        extra = " ".join(f"{k}={v}" for k, v in record.__dict__.items() if k not in _RECORD_ATTRS)
+        return f"{text} {extra}" if extra else text
+
+
+class SampleFilter(logging.Filter):
+    """Deixa passar 1 a cada round(1/rate) registros (rate 0 descarta todos)."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.every = round(1 / rate) if rate > 0 else 0
+        self._count = 0
+
+    def filter(self, record):
+        if self.every == 0:
+            return False
+        self._count += 1
+        return (self._count - 1) % self.every == 0
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler que descarta (e conta) em vez de bloquear com a fila cheia."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(spec):
+    """'app=DEBUG,engineio=WARNING' -> {'app': 'DEBUG', 'engineio': 'WARNING'}"""
+    levels = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(app):
+    global _listener, _payload_chars
+
+    if _listener is not None:
+        _listener.stop()
+
+    formatter = TextFormatter() if app.config.get("LOG_FORMAT") == "text" else JsonFormatter()
+    formatter.converter = time.gmtime
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=app.config.get("LOG_QUEUE_SIZE", 10000))
+    handler = DroppingQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for old in [h for h in root.handlers if isinstance(h, DroppingQueueHandler)]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(app.config.get("LOG_LEVEL", "INFO").upper())
+
+    for name, level in parse_levels(app.config.get("LOG_LEVELS")).items():
+        logging.getLogger(name).setLevel(level)
+
+    messages = message_logger()
+    for old in [f for f in messages.filters if isinstance(f, SampleFilter)]:
+        messages.removeFilter(old)
+    messages.addFilter(SampleFilter(app.config.get("LOG_MESSAGE_SAMPLE_RATE", 0.01)))
+
+    _payload_chars = app.config.get("LOG_PAYLOAD_CHARS", 0)
+    return handler
+
+
+def message_logger():
+    """Logger dos eventos por mensagem (amostrado)."""
+    return logging.getLogger("app.messages")
+
+
+def payload(value):
+    """
+    Conteúdo de mensagem para incluir num log: omitido por padrão, ou truncado em
+    LOG_PAYLOAD_CHARS caracteres.
+    """
+    if not _payload_chars or value is None:
+        return None
+    value = str(value)
+    return value if len(value) <= _payload_chars else value[:_payload_chars] + "..."
+
+
+@atexit.register
+def _stop_listener():
+    # Esvazia a fila ao encerrar o processo
+    if _listener is not None:
+        _listener.stop()
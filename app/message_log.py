@@ -0,0 +1,221 @@
+"""
+Log persistente das mensagens cifradas (tabela `messages`), com escrita em segundo plano.
+
+`send_message` só coloca a mensagem numa fila em memória (`record`); um flusher em
+segundo plano grava a fila em lotes de até `batch_size` linhas, num único commit, a
+cada `flush_ms` milissegundos ou assim que o lote enche.
+
+A leitura (`page`, `last_seq`) usa o índice (room, seq) e junta as mensagens que ainda
+estão na fila deste processo. Com vários workers, o que está na fila de outro worker
+aparece no máximo `flush_ms` depois.
+
+Os campos binários chegam como bytes e são gravados em base64 (colunas de texto);
+a conversão acontece no flusher, fora do `send_message`.
+
+Desligado por padrão (MESSAGE_LOG_ENABLED): sem ele o histórico fica só em memória.
+"""
+import atexit
+import base64
+import logging
+import threading
+
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+
+class MessageLog:
+    def __init__(self, enabled=False, batch_size=200, flush_ms=100, max_pending=10000):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.max_pending = max_pending
+
+        # Métricas
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+        self._pending = []              # [dict da linha, ...] em ordem de chegada
+        self._inflight = []             # lote retirado da fila e ainda sem commit
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._app = None
+        self._socketio = None
+        self._wakeup = None
+        self._task = None
+
+    def init_app(self, app, socketio):
+        self.enabled = app.config.get("MESSAGE_LOG_ENABLED", self.enabled)
+        self.batch_size = app.config.get("MESSAGE_LOG_BATCH_SIZE", self.batch_size)
+        self.flush_interval = app.config.get("MESSAGE_LOG_FLUSH_MS", self.flush_interval * 1000) / 1000
+        self.max_pending = app.config.get("MESSAGE_LOG_MAX_PENDING", self.max_pending)
+        self._app = app
+        self._socketio = socketio
+        if self.enabled:
+            atexit.register(self.flush)
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def record(self, room, seq, sender, ciphertext, iv, mac):
+        """Enfileira a mensagem para gravação; nunca espera pelo banco."""
+        if not self.enabled:
+            return
+
+        self._ensure_started()
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                # Banco não está dando conta: a mensagem segue só no histórico em memória
+                self.dropped += 1
+                logger.warning("fila do log de mensagens cheia, mensagem descartada", extra={"room": room, "seq": seq})
+                return
+            self._pending.append({
+                "room": room, "seq": seq, "sender": sender,
+                "ciphertext": ciphertext, "iv": iv, "mac": mac,
+            })
+            full = len(self._pending) >= self.batch_size
+
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Grava tudo o que está na fila, em lotes de `batch_size`."""
+        from app import db
+        from app.models.message import Message
+
+        # Um flush por vez: mantém a ordem dos lotes (flusher x atexit)
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+                self._inflight = rows
+            if not rows:
+                return
+
+            try:
+                with self._app.app_context():
+                    for start in range(0, len(rows), self.batch_size):
+                        batch = [_to_columns(r) for r in rows[start:start + self.batch_size]]
+                        try:
+                            db.session.execute(insert(Message), batch)
+                            db.session.commit()
+                            self.written += len(batch)
+                        except IntegrityError:
+                            # (room, seq) repetido, p.ex. sequência reiniciada: grava o que der
+                            db.session.rollback()
+                            self._write_one_by_one(db, Message, batch)
+                        except Exception:
+                            # Banco indisponível: devolve o que falta para a próxima tentativa
+                            db.session.rollback()
+                            with self._lock:
+                                self._pending = rows[start:] + self._pending
+                            raise
+                        self.batches += 1
+            finally:
+                with self._lock:
+                    self._inflight = []
+
+    def _write_one_by_one(self, db, Message, batch):
+        for row in batch:
+            try:
+                db.session.execute(insert(Message), [row])
+                db.session.commit()
+                self.written += 1
+            except IntegrityError:
+                db.session.rollback()
+                self.dropped += 1
+                logger.warning("mensagem duplicada no log", extra={"room": row["room"], "seq": row["seq"]})
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def page(self, room, since_seq=0, limit=50):
+        """Mesma forma de `MessageStore.page`, lida do banco (índice room, seq) + fila local."""
+        from app.models.message import Message
+
+        last_seq = self.last_seq(room)
+        if since_seq > last_seq:
+            since_seq = 0
+
+        rows = (
+            Message.query
+            .filter(Message.room == room, Message.seq > since_seq)
+            .order_by(Message.seq)
+            .limit(limit + 1)
+            .all()
+        )
+        messages = [_from_columns(m.to_dict()) for m in rows]
+
+        # Mensagens ainda não gravadas deste processo (sem repetir as já gravadas)
+        stored_last = messages[-1]["seq"] if messages else since_seq
+        messages += [self._public(r) for r in self._pending_for(room) if r["seq"] > stored_last]
+
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        return {
+            "room": room,
+            "messages": messages,
+            "last_seq": last_seq,
+            "has_more": has_more,
+        }
+
+    def last_seq(self, room):
+        from app import db
+        from app.models.message import Message
+
+        stored = db.session.query(func.max(Message.seq)).filter(Message.room == room).scalar() or 0
+        pending = [r["seq"] for r in self._pending_for(room)]
+        return max([stored] + pending)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+        }
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+
+    def _pending_for(self, room):
+        with self._lock:
+            return [r for r in self._inflight + self._pending if r["room"] == room]
+
+    @staticmethod
+    def _public(row):
+        return {k: row[k] for k in ("seq", "sender", "ciphertext", "iv", "mac")}
+
+    def _ensure_started(self):
+        if self._task is None:
+            with self._lock:
+                if self._task is None:
+                    self._wakeup = self._socketio.server.eio.create_event()
+                    self._task = self._socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Erro ao gravar o log de mensagens")
+
+
+_BINARY_COLUMNS = ("ciphertext", "iv", "mac")
+
+
+def _to_columns(row):
+    return {k: base64.b64encode(v).decode("ascii") if k in _BINARY_COLUMNS else v for k, v in row.items()}
+
+
+def _from_columns(message):
+    for field in _BINARY_COLUMNS:
+        message[field] = base64.b64decode(message[field])
+    return message
@@ -0,0 +1,257 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+class StoredMessage:
+    """Registro compacto de uma mensagem cifrada guardada em memória."""
+
+    __slots__ = ("seq", "sender", "ciphertext", "iv", "mac", "size")
+
+    def __init__(self, sender, ciphertext, iv, mac):
+        self.seq = 0
+        self.sender = sender
+        self.ciphertext = ciphertext
+        self.iv = iv
+        self.mac = mac
+        # Bytes efetivamente retidos pelo registro (strings + o próprio objeto)
+        self.size = (
+            _RECORD_OVERHEAD
+            + sys.getsizeof(ciphertext)
+            + sys.getsizeof(iv)
+            + sys.getsizeof(mac)
+        )
+
+    def to_dict(self):
+        return {
+            "seq": self.seq,
+            "sender": self.sender,
+            "ciphertext": self.ciphertext,
+            "iv": self.iv,
+            "mac": self.mac,
+        }
+
+
+_RECORD_OVERHEAD = sys.getsizeof(StoredMessage.__new__(StoredMessage))
+
+
+class RoomBuffer:
+    """
+    Buffer circular com as últimas `capacity` mensagens de uma sala.
+
+    Cada mensagem recebe um número de sequência crescente (a partir de 1); como o
+    buffer guarda sempre um intervalo contíguo de sequências, localizar um cursor
+    é O(1).
+
+    A lista de slots cresce conforme as mensagens chegam, até `capacity`, e daí em
+    diante é reaproveitada em círculo: sala ociosa ou só com a sequência (`seed`) não
+    reserva espaço para mensagens. `bytes` inclui o próprio buffer e a lista.
+    """
+
+    __slots__ = ("slots", "capacity", "start", "count", "bytes", "next_seq")
+
+    def __init__(self, capacity):
+        self.slots = []
+        self.capacity = capacity
+        self.start = 0
+        self.count = 0
+        self.next_seq = 1
+        self.bytes = _BUFFER_OVERHEAD + sys.getsizeof(self.slots)
+
+    @property
+    def first_seq(self):
+        return self.next_seq - self.count
+
+    @property
+    def last_seq(self):
+        return self.next_seq - 1
+
+    def append(self, message):
+        """Adiciona a mensagem; devolve a mensagem sobrescrita, se o buffer estava cheio."""
+        evicted = None
+        if self.count == self.capacity:
+            evicted = self.pop_oldest()
+
+        message.seq = self.next_seq
+        self.next_seq += 1
+
+        # Enquanto a lista não chega à capacidade, a próxima posição é sempre o fim dela
+        index = (self.start + self.count) % self.capacity
+        if index == len(self.slots):
+            slots_size = sys.getsizeof(self.slots)
+            self.slots.append(message)
+            self.bytes += sys.getsizeof(self.slots) - slots_size
+        else:
+            self.slots[index] = message
+        self.count += 1
+        self.bytes += message.size
+        return evicted
+
+    def pop_oldest(self):
+        if self.count == 0:
+            return None
+
+        message = self.slots[self.start]
+        self.slots[self.start] = None
+        self.start = (self.start + 1) % self.capacity
+        self.count -= 1
+        self.bytes -= message.size
+        return message
+
+    def slice(self, since_seq, limit):
+        """Mensagens com seq > since_seq, no máximo `limit`, em ordem."""
+        offset = max(since_seq + 1 - self.first_seq, 0)
+        end = min(offset + limit, self.count)
+        return [self.slots[(self.start + i) % self.capacity] for i in range(offset, end)]
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.slots[(self.start + i) % self.capacity]
+
+    def __len__(self):
+        return self.count
+
+
+_BUFFER_OVERHEAD = sys.getsizeof(RoomBuffer.__new__(RoomBuffer))
+
+
+class MessageStore:
+    """
+    Histórico efêmero das salas com limites de memória.
+
+    - cada sala guarda no máximo `room_capacity` mensagens (buffer circular);
+    - o total de bytes retidos por todas as salas (mensagens e buffers) não passa de
+      `max_bytes`; ao estourar o orçamento, as salas usadas há mais tempo (LRU) são
+      descartadas, menos as que têm membros conectados (`is_active`, ligado pelo
+      MemoryStateBackend). Se todas estão ativas, saem as mensagens mais antigas das
+      salas menos recentes, sem descartar a sala nem a sua sequência.
+    """
+
+    def __init__(self, room_capacity=500, max_bytes=32 * 1024 * 1024):
+        self.room_capacity = room_capacity
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.evicted_rooms = 0
+        self.trimmed_messages = 0
+        self.is_active = None           # callback(sala) -> True se há membros conectados
+        self._rooms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.room_capacity = app.config.get("MESSAGE_STORE_ROOM_CAPACITY", self.room_capacity)
+        self.max_bytes = app.config.get("MESSAGE_STORE_MAX_BYTES", self.max_bytes)
+
+    def append(self, room, sender, ciphertext, iv, mac):
+        message = StoredMessage(sender, ciphertext, iv, mac)
+
+        with self._lock:
+            buffer = self._rooms.get(room)
+            if buffer is None:
+                buffer = self._new_room(room)
+            else:
+                self._rooms.move_to_end(room)
+
+            before = buffer.bytes
+            buffer.append(message)
+            self.total_bytes += buffer.bytes - before
+
+            self._enforce_budget(room)
+
+        return message
+
+    def page(self, room, since_seq=0, limit=50):
+        """
+        Página do histórico a partir do cursor `since_seq` (exclusivo).
+
+        Se o cursor for maior que a última sequência conhecida, o histórico da sala
+        foi recriado desde a última leitura do cliente e a página recomeça do início.
+        """
+        with self._lock:
+            buffer = self._rooms.get(room)
+            if buffer is None:
+                return {"room": room, "messages": [], "last_seq": 0, "has_more": False}
+
+            self._rooms.move_to_end(room)
+            if since_seq > buffer.last_seq:
+                since_seq = 0
+
+            messages = buffer.slice(since_seq, limit)
+            cursor = messages[-1].seq if messages else since_seq
+            return {
+                "room": room,
+                "messages": [m.to_dict() for m in messages],
+                "last_seq": buffer.last_seq,
+                "has_more": cursor < buffer.last_seq,
+            }
+
+    def seed(self, room, last_seq):
+        """Faz a sequência de uma sala sem mensagens em memória continuar após `last_seq`."""
+        with self._lock:
+            buffer = self._rooms.get(room)
+            if buffer is None:
+                buffer = self._new_room(room)
+            if buffer.count == 0:
+                buffer.next_seq = max(buffer.next_seq, last_seq + 1)
+            self._enforce_budget(room)
+
+    def last_seq(self, room):
+        buffer = self._rooms.get(room)
+        return buffer.last_seq if buffer is not None else 0
+
+    def drop(self, room):
+        with self._lock:
+            buffer = self._rooms.pop(room, None)
+            if buffer is not None:
+                self.total_bytes -= buffer.bytes
+
+    def room_bytes(self, room):
+        buffer = self._rooms.get(room)
+        return buffer.bytes if buffer is not None else 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rooms": len(self._rooms),
+                "messages": sum(len(b) for b in self._rooms.values()),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "evicted_rooms": self.evicted_rooms,
+                "trimmed_messages": self.trimmed_messages,
+                "bytes_per_room": {room: b.bytes for room, b in self._rooms.items()},
+            }
+
+    def __contains__(self, room):
+        return room in self._rooms
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def _new_room(self, room):
+        # Chamado com o lock
+        buffer = self._rooms[room] = RoomBuffer(self.room_capacity)
+        self.total_bytes += buffer.bytes
+        return buffer
+
+    def _enforce_budget(self, current_room):
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        # Descarta salas ociosas (menos recentemente usadas e sem membros) até caber
+        for room in list(self._rooms):
+            if self.total_bytes <= self.max_bytes:
+                return
+            if room == current_room or (self.is_active is not None and self.is_active(room)):
+                continue
+            buffer = self._rooms.pop(room)
+            self.total_bytes -= buffer.bytes
+            self.evicted_rooms += 1
+
+        # Só restaram salas em uso: remove as mensagens mais antigas, da sala menos
+        # recente para a mais recente (a atual fica com pelo menos a última)
+        for room, buffer in self._rooms.items():
+            keep = 1 if room == current_room else 0
+            while self.total_bytes > self.max_bytes and len(buffer) > keep:
+                self.total_bytes -= buffer.pop_oldest().size
+                self.trimmed_messages += 1
+            if self.total_bytes <= self.max_bytes:
+                return
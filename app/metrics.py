@@ -0,0 +1,365 @@
+"""
+Métricas no formato texto do Prometheus (`GET /metrics`) e profiler por amostragem.
+
+Coletado:
+
+- latência e contagem por rota HTTP (endpoint, método, status) e por evento do
+  Socket.IO, com contagem de erros;
+- número e tempo das consultas ao banco (eventos do SQLAlchemy), por tipo de comando;
+- latência do bcrypt (PasswordHasher);
+- gauges lidos na hora da coleta: conexões, usuários online, salas e bytes do
+  histórico em memória, filas do fan-out e do log de mensagens, cache de tokens.
+
+Sem dependências: os tipos abaixo implementam só o necessário da exposição em texto.
+
+Com PROFILER_ENABLED o processo é amostrado a cada PROFILER_INTERVAL_MS (SIGPROF) e
+`GET /metrics/profile` devolve as pilhas no formato "folded" (uma pilha por linha,
+`frame;frame;frame contagem`), aceito por flamegraph.pl e speedscope.
+
+Os dois endpoints só existem com METRICS_TOKEN definido e exigem `Authorization: Bearer
+<token>`: o run.py publica o app pelo ngrok, e pelo túnel as requisições chegam de
+localhost, então a origem não serve para liberar o acesso.
+"""
+import atexit
+import hmac
+import os
+import signal
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from functools import wraps
+
+from flask import Response, g, request
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {total}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}       # valores dos labels -> [contagem por bucket..., soma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for values, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(names, values + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(names, values + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Valor lido na hora da coleta; `fn` devolve um número (ou counter, com kind="counter")."""
+
+    def __init__(self, name, help, fn, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+
+    def expose(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", f"{self.name} {self.fn()}"]
+
+
+class SamplingProfiler:
+    """
+    Amostra as pilhas de todas as threads a cada `interval` segundos via SIGPROF.
+
+    Com eventlet/gevent todas as greenlets rodam na thread principal: a amostra
+    pega a greenlet que estava executando no momento do sinal. Só entram as pilhas
+    que passam pelo código da aplicação (handlers, rotas, extensões); threads ociosas
+    esperando I/O ficam de fora.
+    """
+
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.app_dir = os.path.dirname(os.path.abspath(__file__))
+        self.samples = 0
+        self._stacks = _Tally()
+
+    def start(self):
+        # signal.signal só pode ser chamado da thread principal (create_app)
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        # Sem isso um SIGPROF durante o encerramento do interpretador mata o processo
+        atexit.register(self.stop)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+
+    def _sample(self, signum, frame):
+        current = sys._getframe()
+        for thread_frame in sys._current_frames().values():
+            # Na thread principal o frame do topo é este handler: usa o frame interrompido
+            stack = self._fold(frame if thread_frame is current else thread_frame)
+            if stack is not None:
+                self._stacks[stack] += 1
+        self.samples += 1
+
+    def _fold(self, frame):
+        names = []
+        in_app = False
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            in_app = in_app or code.co_filename.startswith(self.app_dir)
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names)) if in_app else None
+
+    def folded(self, reset=False):
+        stacks = self._stacks
+        if reset:
+            self._stacks = _Tally()
+        # O handler do SIGPROF roda entre dois bytecodes quaisquer e escreve no Counter:
+        # dict() copia numa única operação em C, e só a cópia é percorrida
+        snapshot = dict(stacks)
+        ordered = sorted(snapshot.items(), key=lambda item: item[1], reverse=True)
+        return "".join(f"{stack} {count}\n" for stack, count in ordered)
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = True
+        self.token = None
+        self.profiler = None
+        self._socketio = None
+        self._collectors = []
+
+        self.http_latency = self.register(Histogram(
+            "whatschat_http_request_seconds", "Latência das rotas HTTP.", ("endpoint", "method", "status")))
+        self.socket_latency = self.register(Histogram(
+            "whatschat_socketio_event_seconds", "Latência dos handlers de eventos do Socket.IO.", ("event",)))
+        self.socket_errors = self.register(Counter(
+            "whatschat_socketio_event_errors_total", "Exceções nos handlers do Socket.IO.", ("event",)))
+        self.db_latency = self.register(Histogram(
+            "whatschat_db_query_seconds", "Duração das consultas ao banco.", ("operation",)))
+        self.password_hash_latency = self.register(Histogram(
+            "whatschat_password_hash_seconds", "Duração de cada hash/verificação bcrypt.",
+            buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)))
+        self.rate_limited = self.register(Counter(
+            "whatschat_rate_limited_total", "Requisições e eventos recusados pelo limite de taxa.", ("limit",)))
+
+    def register(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def init_app(self, app, socketio, db):
+        self.enabled = app.config.get("METRICS_ENABLED", self.enabled)
+        self.token = app.config.get("METRICS_TOKEN") or None
+        if not self.enabled:
+            return
+
+        self._register_gauges()
+        self._instrument_flask(app)
+        self._instrument_db(app, db)
+        self._socketio = socketio
+
+        from app import password_hasher, rate_limiter
+        password_hasher.observer = self.password_hash_latency.observe
+        rate_limiter.observer = lambda name: self.rate_limited.inc(1, name)
+
+        # Sem token os endpoints não existem; as métricas continuam sendo coletadas
+        if self.token is not None:
+            app.add_url_rule("/metrics", "metrics", self.metrics_view)
+            app.add_url_rule("/metrics/profile", "metrics_profile", self.profile_view)
+
+        if app.config.get("PROFILER_ENABLED") and self.profiler is None:
+            self.profiler = SamplingProfiler(app.config.get("PROFILER_INTERVAL_MS", 10) / 1000)
+            self.profiler.start()
+
+    # ------------------------------------------------------------------
+    # Instrumentação
+    # ------------------------------------------------------------------
+
+    def _instrument_flask(self, app):
+        @app.before_request
+        def start_timer():
+            g.metrics_start = time.perf_counter()
+
+        @app.after_request
+        def observe_request(response):
+            start = g.pop("metrics_start", None)
+            if start is not None and request.endpoint not in ("metrics", "metrics_profile"):
+                # Rotas desconhecidas ficam agrupadas para não criar uma série por URL
+                endpoint = request.url_rule.rule if request.url_rule else "<unmatched>"
+                self.http_latency.observe(time.perf_counter() - start, endpoint, request.method, response.status_code)
+            return response
+
+    def instrument_socketio(self):
+        """Envolve os handlers já registrados; chamar depois de importar app.socket_events."""
+        if not self.enabled:
+            return
+        for handlers in self._socketio.server.handlers.values():
+            for name, handler in handlers.items():
+                if not getattr(handler, "_metrics_wrapped", False):
+                    handlers[name] = self._timed_event(name, handler)
+
+    def _timed_event(self, name, handler):
+        @wraps(handler)
+        def wrapper(*args):
+            start = time.perf_counter()
+            try:
+                return handler(*args)
+            except Exception:
+                self.socket_errors.inc(1, name)
+                raise
+            finally:
+                self.socket_latency.observe(time.perf_counter() - start, name)
+
+        wrapper._metrics_wrapped = True
+        return wrapper
+
+    def _instrument_db(self, app, db):
+        with app.app_context():
+            engine = db.engine
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_execute(conn, cursor, statement, parameters, context, executemany):
+            start = conn.info["metrics_start"].pop()
+            operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+            self.db_latency.observe(time.perf_counter() - start, operation)
+
+        @event.listens_for(engine, "handle_error")
+        def discard_timer(context):
+            # Consulta que falhou não passa pelo after_cursor_execute: sem isso o início
+            # ficaria na conexão, que volta para o pool
+            if context.statement is not None and context.connection is not None:
+                starts = context.connection.info.get("metrics_start")
+                if starts:
+                    starts.pop()
+
+    def _register_gauges(self):
+        if any(isinstance(c, Gauge) for c in self._collectors):
+            return
+
+        from app import (fanout, message_log, message_store, password_hasher, prekeys, presence, room_registry,
+                         token_cache, user_directory)
+
+        self.register(Gauge("whatschat_socketio_connections", "Conexões Socket.IO (sids) ativas.",
+                            lambda: presence.stats()["connections"]))
+        self.register(Gauge("whatschat_online_users", "Usuários com ao menos uma conexão.",
+                            lambda: presence.stats()["online_users"]))
+        self.register(Gauge("whatschat_rooms", "Salas com histórico em memória.",
+                            lambda: len(message_store)))
+        self.register(Gauge("whatschat_active_rooms", "Salas com ao menos uma conexão neste worker.",
+                            lambda: room_registry.stats()["rooms"]))
+        self.register(Gauge("whatschat_idle_rooms", "Salas vazias aguardando o GC do histórico.",
+                            lambda: room_registry.stats()["idle_rooms"]))
+        self.register(Gauge("whatschat_history_bytes", "Bytes retidos pelo histórico em memória.",
+                            lambda: message_store.total_bytes))
+        self.register(Gauge("whatschat_history_evicted_rooms_total", "Salas descartadas pelo orçamento de memória.",
+                            lambda: message_store.evicted_rooms, kind="counter"))
+        self.register(Gauge("whatschat_history_trimmed_messages_total",
+                            "Mensagens de salas ativas descartadas pelo orçamento de memória.",
+                            lambda: message_store.trimmed_messages, kind="counter"))
+        self.register(Gauge("whatschat_fanout_pending", "Mensagens aguardando envio em lote.",
+                            fanout.pending))
+        self.register(Gauge("whatschat_fanout_rejected_total", "Envios recusados por backpressure.",
+                            lambda: fanout.rejected, kind="counter"))
+        self.register(Gauge("whatschat_fanout_dropped_connections_total",
+                            "Conexões derrubadas por acumular pacotes sem ler.",
+                            lambda: fanout.dropped_connections, kind="counter"))
+        self.register(Gauge("whatschat_message_log_pending", "Mensagens aguardando gravação no banco.",
+                            lambda: message_log.stats()["pending"]))
+        self.register(Gauge("whatschat_password_hash_in_flight", "Hashes bcrypt em execução ou na fila.",
+                            lambda: password_hasher.in_flight))
+        self.register(Gauge("whatschat_password_hash_rejected_total", "Hashes recusados com o pool cheio.",
+                            lambda: password_hasher.rejected, kind="counter"))
+        self.register(Gauge("whatschat_token_cache_hits_total", "Acertos do cache de JWT.",
+                            lambda: token_cache.hits, kind="counter"))
+        self.register(Gauge("whatschat_token_cache_misses_total", "Faltas do cache de JWT.",
+                            lambda: token_cache.misses, kind="counter"))
+        self.register(Gauge("whatschat_user_cache_hits_total", "Acertos do cache do diretório de usuários.",
+                            lambda: user_directory.hits, kind="counter"))
+        self.register(Gauge("whatschat_user_cache_misses_total", "Faltas do cache do diretório de usuários.",
+                            lambda: user_directory.misses, kind="counter"))
+        self.register(Gauge("whatschat_prekey_cache_hits_total", "Acertos do cache de prekeys.",
+                            lambda: prekeys.hits, kind="counter"))
+        self.register(Gauge("whatschat_prekey_cache_misses_total", "Faltas do cache de prekeys.",
+                            lambda: prekeys.misses, kind="counter"))
+
+    # ------------------------------------------------------------------
+    # Endpoints
+    # ------------------------------------------------------------------
+
+    def _authorized(self):
+        supplied = request.headers.get("Authorization", "")
+        return hmac.compare_digest(supplied, f"Bearer {self.token}")
+
+    def expose(self):
+        lines = []
+        for collector in self._collectors:
+            lines.extend(collector.expose())
+        return "\n".join(lines) + "\n"
+
+    def metrics_view(self):
+        if not self._authorized():
+            return Response("Unauthorized\n", status=401)
+        return Response(self.expose(), mimetype="text/plain; version=0.0.4")
+
+    def profile_view(self):
+        if not self._authorized():
+            return Response("Unauthorized\n", status=401)
+        if self.profiler is None:
+            return Response("Profiler desligado (PROFILER_ENABLED=1)\n", status=404)
+        return Response(self.profiler.folded(reset=request.args.get("reset") == "1"), mimetype="text/plain")
@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+
+from app import db
+
+class Attachment(db.Model):
+    """Arquivo cifrado no cliente, guardado em disco em blocos de `chunk_size` (ver app/attachments.py)."""
+
+    __tablename__ = "attachments"
+    __table_args__ = (
+        # Limpeza dos envios incompletos antigos
+        db.Index("ix_attachments_complete_created_at", "complete", "created_at"),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)          # token aleatório (nome do arquivo em disco)
+    owner_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    room = db.Column(db.String(64), nullable=False)          # conversa onde pode ser baixado
+    size = db.Column(db.BigInteger, nullable=False)          # bytes cifrados (com as tags do GCM)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    complete = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<Attachment {self.id} {self.size}B>"
@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+
+from app import db
+
+class Group(db.Model):
+    """Sala com vários membros; as mensagens saem uma vez, cifradas com a sender key de quem envia."""
+
+    __tablename__ = "groups"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<Group {self.id} {self.name}>"
+
+
+class GroupMember(db.Model):
+    __tablename__ = "group_members"
+    __table_args__ = (
+        # Grupos de um usuário (a chave primária já cobre os membros de um grupo)
+        db.Index("ix_group_members_user_id", "user_id"),
+    )
+
+    group_id = db.Column(db.Integer, db.ForeignKey("groups.id", ondelete="CASCADE"), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    role = db.Column(db.String(16), nullable=False, default="member")   # "admin" ou "member"
+    joined_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<GroupMember {self.group_id}:{self.user_id}>"
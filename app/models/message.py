@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+
+from app import db
+
+class Message(db.Model):
+    """Mensagem já cifrada pelo cliente (o servidor nunca vê o texto claro)."""
+
+    __tablename__ = "messages"
+    __table_args__ = (
+        # Entrega no join/paginação: WHERE room = ? AND seq > ? ORDER BY seq
+        db.Index("ix_messages_room_seq", "room", "seq", unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    room = db.Column(db.String(64), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    sender = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    ciphertext = db.Column(db.Text, nullable=False)
+    iv = db.Column(db.String(64), nullable=False)
+    mac = db.Column(db.String(128), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        return {
+            "seq": self.seq,
+            "sender": self.sender,
+            "ciphertext": self.ciphertext,
+            "iv": self.iv,
+            "mac": self.mac,
+        }
+
+    def __repr__(self):
+        return f"<Message {self.room}#{self.seq}>"
@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+
+from app import db
+
+class PrekeyBundle(db.Model):
+    """Chaves públicas do usuário para derivar a sessão sem ele online (uma linha por usuário)."""
+
+    __tablename__ = "prekey_bundles"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    identity_key = db.Column(db.LargeBinary, nullable=False)    # ECDSA P-256 (raw), assina a prekey
+    signed_prekey = db.Column(db.LargeBinary, nullable=False)   # ECDH P-256 (raw)
+    signature = db.Column(db.LargeBinary, nullable=False)       # ECDSA(identity_key, signed_prekey)
+    prekey_id = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        return {
+            "user_id": self.user_id,
+            "identity_key": self.identity_key,
+            "signed_prekey": self.signed_prekey,
+            "signature": self.signature,
+            "prekey_id": self.prekey_id,
+        }
+
+    def __repr__(self):
+        return f"<PrekeyBundle {self.user_id}:{self.prekey_id}>"
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+
+class HasherBusy(Exception):
+    """A fila de hashing está cheia; a requisição deve ser recusada (503)."""
+
+
+class PasswordHasher:
+    """
+    Executa bcrypt fora da thread/greenlet da requisição, num pool de threads nativas.
+
+    - com eventlet usa o `tpool`, com gevent o threadpool do hub e, no modo threading,
+      um ThreadPoolExecutor: em todos os casos o bcrypt (que libera o GIL) não trava
+      os outros sockets do worker;
+    - no máximo `workers + max_queue` operações ficam pendentes; acima disso a chamada
+      falha na hora com HasherBusy, em vez de enfileirar sem limite;
+    - `rounds` define o custo dos hashes novos; `needs_rehash` detecta hashes antigos.
+    """
+
+    def __init__(self, rounds=12, workers=4, max_queue=64, latency_window=1024):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.async_mode = "threading"
+        self._executor = None
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self._latencies = deque(maxlen=latency_window)
+        self.observer = None            # callback(segundos) a cada operação (ver app/metrics.py)
+
+    def init_app(self, app):
+        self.rounds = app.config.get("BCRYPT_ROUNDS", self.rounds)
+        self.workers = app.config.get("PASSWORD_HASH_WORKERS", self.workers)
+        self.max_queue = app.config.get("PASSWORD_HASH_QUEUE", self.max_queue)
+        self.async_mode = app.extensions["socketio"].async_mode
+
+        if self.async_mode == "eventlet":
+            from eventlet import tpool
+            tpool.set_num_threads(self.workers)
+        elif self.async_mode == "gevent":
+            import gevent
+            gevent.get_hub().threadpool.maxsize = self.workers
+        else:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="bcrypt")
+
+    def hash(self, password):
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self._run(bcrypt.hashpw, password.encode(), salt)
+
+    def verify(self, password, hashed):
+        return self._run(bcrypt.checkpw, password.encode(), _as_bytes(hashed))
+
+    def needs_rehash(self, hashed):
+        # Formato: $2b$<custo>$<salt+hash>
+        try:
+            return int(_as_bytes(hashed).split(b"$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            in_flight = self.in_flight
+        return {
+            "in_flight": in_flight,
+            "queue_depth": max(in_flight - self.workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_avg_ms": (self.total_seconds / self.completed * 1000) if self.completed else 0.0,
+            "latency_p50_ms": _percentile(latencies, 0.50) * 1000,
+            "latency_p99_ms": _percentile(latencies, 0.99) * 1000,
+        }
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HasherBusy()
+            self.in_flight += 1
+
+        start = time.perf_counter()
+        try:
+            return self._call(fn, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.total_seconds += elapsed
+                self._latencies.append(elapsed)
+            if self.observer is not None:
+                self.observer(elapsed)
+
+    def _call(self, fn, *args):
+        if self.async_mode == "eventlet":
+            from eventlet import tpool
+            return tpool.execute(fn, *args)
+        if self.async_mode == "gevent":
+            import gevent
+            return gevent.get_hub().threadpool.apply(fn, args)
+        if self._executor is None:
+            return fn(*args)
+        return self._executor.submit(fn, *args).result()
+
+
+def _as_bytes(value):
+    return value.encode() if isinstance(value, str) else value
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
@@ -0,0 +1,116 @@
+"""
+Prekeys: chaves públicas que cada usuário publica uma vez para a conversa começar
+sem esperar o outro lado.
+
+O cliente guarda no navegador (IndexedDB) um par ECDH de longa duração, a *signed
+prekey*, e um par ECDSA de identidade que a assina; só as partes públicas vêm para o
+servidor (tabela ``prekey_bundles``, uma linha por usuário). Quem abre uma conversa
+busca o bundle do outro usuário (``fetch_prekey_bundle``), confere a assinatura e
+deriva as chaves da sessão na hora, com o outro lado offline.
+
+Os bundles lidos ficam num cache LRU/TTL limitado (PREKEY_CACHE_SIZE): abrir uma
+conversa não consulta o banco. Um upload neste processo atualiza o cache na hora; os
+feitos em outros workers valem depois de PREKEY_CACHE_TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# P-256 no formato do WebCrypto: ponto "raw" não comprimido e assinatura r||s
+PUBLIC_KEY_SIZE = 65
+SIGNATURE_SIZE = 64
+
+
+class PrekeyError(Exception):
+    """Bundle recusado ou ausente; `code` vai no ack do evento."""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class PrekeyStore:
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._bundles = OrderedDict()   # user_id -> (bundle ou None, válido até)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_entries = app.config.get("PREKEY_CACHE_SIZE", self.max_entries)
+        self.ttl = app.config.get("PREKEY_CACHE_TTL", self.ttl)
+
+    def get(self, user_id):
+        """Bundle do usuário (dict com campos em bytes); PrekeyError("not_found") se não publicou."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._bundles.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._bundles.move_to_end(user_id)
+                self.hits += 1
+                bundle = entry[0]
+            else:
+                self.misses += 1
+                entry = None
+
+        if entry is None:
+            bundle = self._load(user_id)
+            # Ausência também fica no cache: clientes antigos nunca publicam
+            self._remember(user_id, bundle, now)
+
+        if bundle is None:
+            raise PrekeyError("not_found")
+        return bundle
+
+    def put(self, user_id, identity_key, signed_prekey, signature, prekey_id):
+        """Grava (ou troca) o bundle do usuário; devolve True se mudou algo."""
+        from app import db
+        from app.models.prekey import PrekeyBundle
+
+        if len(identity_key) != PUBLIC_KEY_SIZE or len(signed_prekey) != PUBLIC_KEY_SIZE:
+            raise PrekeyError("invalid_key")
+        if len(signature) != SIGNATURE_SIZE:
+            raise PrekeyError("invalid_signature")
+
+        row = db.session.get(PrekeyBundle, user_id)
+        if row is not None and (row.identity_key, row.signed_prekey, row.signature, row.prekey_id) == \
+                (identity_key, signed_prekey, signature, prekey_id):
+            self._remember(user_id, row.to_dict(), time.monotonic())
+            return False
+
+        if row is None:
+            row = PrekeyBundle(user_id=user_id)
+            db.session.add(row)
+        row.identity_key = identity_key
+        row.signed_prekey = signed_prekey
+        row.signature = signature
+        row.prekey_id = prekey_id
+        row.updated_at = datetime.now(timezone.utc)
+        db.session.commit()
+
+        self._remember(user_id, row.to_dict(), time.monotonic())
+        return True
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._bundles.pop(user_id, None)
+
+    def stats(self):
+        return {"cached": len(self._bundles), "hits": self.hits, "misses": self.misses}
+
+    def _remember(self, user_id, bundle, now):
+        with self._lock:
+            self._bundles[user_id] = (bundle, now + self.ttl)
+            self._bundles.move_to_end(user_id)
+            while len(self._bundles) > self.max_entries:
+                self._bundles.popitem(last=False)
+
+    def _load(self, user_id):
+        from app import db
+        from app.models.prekey import PrekeyBundle
+
+        row = db.session.get(PrekeyBundle, user_id)
+        return row.to_dict() if row is not None else None
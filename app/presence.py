@@ -0,0 +1,217 @@
+"""
+Presença dos usuários em memória, alimentada pelos eventos do Socket.IO.
+
+Um usuário está online enquanto tiver ao menos uma conexão (aba) viva. Cada conexão
+renova seu `last_seen` no connect e a cada `heartbeat`; conexões sem heartbeat por
+mais de `heartbeat_timeout` segundos são descartadas pela varredura periódica. O socket
+continua aberto: uma aba em segundo plano (timers atrasados pelo navegador) volta a
+contar como online no próximo heartbeat.
+
+As mudanças (entrou/saiu) são acumuladas e enviadas aos clientes inscritos como
+diffs (`presence_diff`), em vez de cada cliente buscar a lista inteira. Opcionalmente
+as mesmas mudanças são gravadas em lote na coluna `User.isOnline`.
+
+Cada processo conhece apenas as suas conexões: com vários workers a lista de
+`/users/allusers` de um worker não inclui quem está conectado nos outros.
+
+Para a listagem paginada, os usuários online também ficam num índice ordenado por
+(username em minúsculas, id): a busca por prefixo e a paginação por cursor (keyset)
+são uma busca binária seguida de uma fatia do índice.
+"""
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right, insort
+
+PRESENCE_ROOM = "presence"
+
+
+class PresenceRegistry:
+    def __init__(self, heartbeat_timeout=60, sweep_interval=5, db_flush=False):
+        self.heartbeat_timeout = heartbeat_timeout
+        self.sweep_interval = sweep_interval
+        self.db_flush = db_flush
+        self.version = 0                # muda a cada entrada/saída (usado em ETags)
+        self.instance_id = uuid.uuid4().hex[:8]
+
+        self._users = {}                # user_id -> username
+        self._index = []                # [(username.lower(), user_id), ...] ordenado
+        self._user_sids = {}            # user_id -> {sid, ...}
+        self._sid_user = {}             # sid -> user_id
+        self._last_seen = {}            # sid -> timestamp
+        self._pending_online = {}       # user_id -> username (ainda não divulgados)
+        self._pending_offline = set()
+        self._db_pending = {}           # user_id -> bool (ainda não gravados)
+        self._lock = threading.Lock()
+        self._app = None
+        self._socketio = None
+        self._task = None
+
+    def init_app(self, app, socketio):
+        self.heartbeat_timeout = app.config.get("PRESENCE_HEARTBEAT_TIMEOUT", self.heartbeat_timeout)
+        self.sweep_interval = app.config.get("PRESENCE_SWEEP_INTERVAL", self.sweep_interval)
+        self.db_flush = app.config.get("PRESENCE_DB_FLUSH", self.db_flush)
+        self._app = app
+        self._socketio = socketio
+
+    # ------------------------------------------------------------------
+    # Conexões
+    # ------------------------------------------------------------------
+
+    def connect(self, user_id, username, sid):
+        self._ensure_started()
+        with self._lock:
+            self._sid_user[sid] = user_id
+            self._last_seen[sid] = time.time()
+            sids = self._user_sids.setdefault(user_id, set())
+            sids.add(sid)
+            self._users[user_id] = username
+            if len(sids) == 1:
+                insort(self._index, (username.lower(), user_id))
+                self._mark(user_id, username, online=True)
+
+    def disconnect(self, sid):
+        with self._lock:
+            self._remove_sid(sid)
+
+    def heartbeat(self, user_id, username, sid):
+        with self._lock:
+            if sid in self._sid_user:
+                self._last_seen[sid] = time.time()
+                return
+        # Descartada pela varredura (ou pelo logout) com o socket ainda vivo
+        self.connect(user_id, username, sid)
+
+    def remove_user(self, user_id):
+        """Tira o usuário da lista imediatamente (ex.: logout) e fecha as conexões dele."""
+        with self._lock:
+            sids = list(self._user_sids.get(user_id, ()))
+            for sid in sids:
+                self._remove_sid(sid)
+        # Fora do lock: o disconnect chama on_disconnect -> self.disconnect. As abas com o
+        # token revogado não passam na reconexão; as de outros dispositivos voltam online
+        if self._socketio is not None:
+            for sid in sids:
+                self._socketio.server.disconnect(sid, namespace="/")
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def is_online(self, user_id):
+        return user_id in self._user_sids
+
+    def online_users(self):
+        with self._lock:
+            return [{"id": uid, "username": self._users[uid]} for _, uid in self._index]
+
+    def search(self, prefix="", after=None, limit=20):
+        """
+        Página de usuários online cujo username começa com `prefix`, em ordem alfabética.
+
+        `after` é a chave (username.lower(), id) do último item da página anterior.
+        Devolve (usuários, chave do último item ou None se não houver mais páginas).
+        """
+        prefix = prefix.lower()
+        with self._lock:
+            start = bisect_left(self._index, (prefix,))
+            if after is not None:
+                start = max(start, bisect_right(self._index, tuple(after)))
+
+            page = []
+            for name, uid in self._index[start:start + limit + 1]:
+                if not name.startswith(prefix):
+                    break
+                page.append((name, uid))
+
+            has_more = len(page) > limit
+            page = page[:limit]
+            users = [{"id": uid, "username": self._users[uid]} for _, uid in page]
+            return users, (page[-1] if has_more else None)
+
+    def etag(self):
+        # Muda sempre que alguém entra/sai; o id da instância evita colisão entre workers
+        return f"{self.instance_id}-{self.version}"
+
+    def stats(self):
+        return {"online_users": len(self._user_sids), "connections": len(self._sid_user)}
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+
+    def _remove_sid(self, sid):
+        user_id = self._sid_user.pop(sid, None)
+        self._last_seen.pop(sid, None)
+        if user_id is None:
+            return
+
+        sids = self._user_sids.get(user_id)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self._user_sids[user_id]
+                username = self._users.pop(user_id, None)
+                if username is not None:
+                    key = (username.lower(), user_id)
+                    i = bisect_left(self._index, key)
+                    if i < len(self._index) and self._index[i] == key:
+                        del self._index[i]
+                self._mark(user_id, username, online=False)
+
+    def _mark(self, user_id, username, online):
+        self.version += 1
+        if online:
+            self._pending_offline.discard(user_id)
+            self._pending_online[user_id] = username
+        else:
+            self._pending_online.pop(user_id, None)
+            self._pending_offline.add(user_id)
+        if self.db_flush:
+            self._db_pending[user_id] = online
+
+    def _ensure_started(self):
+        if self._task is None and self._socketio is not None:
+            self._task = self._socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self._socketio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                self._app.logger.exception("Erro na varredura de presença")
+
+    def sweep(self):
+        """Descarta conexões sem heartbeat, divulga o diff e grava o lote no banco."""
+        deadline = time.time() - self.heartbeat_timeout
+        with self._lock:
+            for sid in [s for s, seen in self._last_seen.items() if seen < deadline]:
+                self._remove_sid(sid)
+
+            online = [{"id": uid, "username": name} for uid, name in self._pending_online.items()]
+            offline = list(self._pending_offline)
+            db_pending = self._db_pending
+            self._pending_online = {}
+            self._pending_offline = set()
+            self._db_pending = {}
+
+        if online or offline:
+            self._socketio.emit("presence_diff", {"online": online, "offline": offline}, to=PRESENCE_ROOM)
+
+        if db_pending:
+            self._flush_to_db(db_pending)
+
+    def _flush_to_db(self, pending):
+        from app import db
+        from app.models.user import User
+
+        went_online = [uid for uid, online in pending.items() if online]
+        went_offline = [uid for uid, online in pending.items() if not online]
+
+        with self._app.app_context():
+            if went_online:
+                User.query.filter(User.id.in_(went_online)).update({"isOnline": True}, synchronize_session=False)
+            if went_offline:
+                User.query.filter(User.id.in_(went_offline)).update({"isOnline": False}, synchronize_session=False)
+            db.session.commit()
@@ -0,0 +1,207 @@
+"""
+Limite de taxa (token bucket) para rotas HTTP e eventos do Socket.IO.
+
+Cada limite tem um nome e uma especificação ``N/período[:rajada]`` em RATE_LIMITS
+(``"10/m"``: 10 por minuto; ``"20/s:40"``: 20 por segundo com rajada de até 40).
+O balde é por chave: o IP do cliente nas rotas e o usuário da sessão nos eventos.
+
+Backends (RATE_LIMIT_BACKEND_URL):
+
+- ``memory://``            baldes no próprio processo, num dict LRU limitado a
+                           RATE_LIMIT_MAX_KEYS (O(1) por verificação);
+- ``redis://host:port/db`` baldes num Redis compartilhado pelos workers (script Lua atômico).
+
+Acima do limite nada é enfileirado: a rota responde 429 com Retry-After e o evento
+do Socket.IO é descartado, com o ack ``{"ok": False, "error": "rate_limited",
+"retry_after_ms": ...}`` para quem quiser reenviar.
+"""
+import ipaddress
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, request, session
+
+PERIODS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_rate(spec):
+    """``"20/s:40"`` -> (20.0 fichas/segundo, rajada 40)."""
+    count, _, rest = spec.partition("/")
+    period, _, burst = rest.partition(":")
+    period = period.strip() or "s"
+    seconds = PERIODS[period] if period in PERIODS else float(period)
+    count = float(count)
+    return count / seconds, float(burst) if burst else count
+
+
+class RateLimitBackend:
+    """Interface dos baldes."""
+
+    def take(self, key, rate, burst, cost=1):
+        """Consome `cost` fichas; devolve 0 se permitido ou os segundos até haver fichas."""
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()    # chave -> (fichas, instante da última verificação)
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is None:
+                tokens = burst
+            else:
+                tokens = min(burst, entry[0] + (now - entry[1]) * rate)
+                self._buckets.move_to_end(key)
+
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+
+            self._buckets[key] = (tokens, now)
+            # Chaves ociosas saem primeiro; um balde descartado volta cheio, como estaria
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+# Recarga + consumo atômicos; a chave expira quando o balde estaria cheio de novo
+_REDIS_TAKE = """
+local rate, burst, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    def __init__(self, url, prefix="whatschat:ratelimit"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND_URL=redis:// requer o pacote 'redis' (pip install redis)")
+
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.redis.register_script(_REDIS_TAKE)
+
+    def take(self, key, rate, burst, cost=1):
+        # Relógio de parede: os workers compartilham o balde
+        return float(self._take(keys=[f"{self.prefix}:{key}"], args=[rate, burst, cost, time.time()]))
+
+
+def is_loopback(addr):
+    try:
+        return ipaddress.ip_address(addr).is_loopback
+    except ValueError:
+        return False
+
+
+def client_ip(proxy_hops=0, loopback_only=False):
+    """IP do cliente; atrás de `proxy_hops` proxies confiáveis (ngrok...) lê o X-Forwarded-For.
+
+    Com `loopback_only` o cabeçalho só vale se a conexão vem da própria máquina (o agente
+    do ngrok): quem acessa a porta direto não escolhe o IP pelo qual é limitado.
+    """
+    if loopback_only and not is_loopback(request.remote_addr or ""):
+        proxy_hops = 0
+    route = request.access_route if proxy_hops else ()
+    if len(route) >= proxy_hops > 0:
+        return route[-proxy_hops]
+    return request.remote_addr or "-"
+
+
+class RateLimiter:
+    """Extensão com os decoradores `limit` (rotas) e `limit_event` (Socket.IO)."""
+
+    def __init__(self):
+        self.enabled = True
+        self.proxy_hops = 0
+        self.loopback_proxy = False     # proxy_hops só para conexões locais (túnel do run.py)
+        self.backend = MemoryRateLimitBackend()
+        self.limits = {}                # nome -> (fichas/segundo, rajada)
+        self.rejected = {}              # nome -> recusas
+        self.observer = None            # callback(nome) a cada recusa (ver app/metrics.py)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("RATE_LIMIT_ENABLED", self.enabled)
+        self.proxy_hops = app.config.get("RATE_LIMIT_PROXY_HOPS") or 0
+        self.limits = {name: parse_rate(spec) for name, spec in app.config.get("RATE_LIMITS", {}).items()}
+
+        url = app.config.get("RATE_LIMIT_BACKEND_URL") or "memory://"
+        if url.startswith("memory://"):
+            self.backend = MemoryRateLimitBackend(app.config.get("RATE_LIMIT_MAX_KEYS", 100000))
+        elif url.startswith(("redis://", "rediss://")):
+            self.backend = RedisRateLimitBackend(url)
+        else:
+            raise ValueError(f"RATE_LIMIT_BACKEND_URL não suportada: {url}")
+
+    def behind_tunnel(self, app):
+        """run.py com o ngrok: o túnel é um proxy à frente (salvo RATE_LIMIT_PROXY_HOPS explícito).
+
+        Sem isso todos os clientes chegam com o IP do túnel e dividem os mesmos baldes:
+        o limite de login de um bloquearia o login de todos. O agente do ngrok conecta
+        por localhost; quem chega na porta 5000 por fora não tem o X-Forwarded-For lido.
+        """
+        if app.config.get("RATE_LIMIT_PROXY_HOPS") is None:
+            self.proxy_hops = 1
+            self.loopback_proxy = True
+
+    def check(self, name, key, cost=1):
+        """Segundos até liberar (0 = permitido). Limites sem configuração não restringem."""
+        limit = self.limits.get(name)
+        if not self.enabled or limit is None:
+            return 0.0
+
+        wait = self.backend.take(f"{name}:{key}", limit[0], limit[1], cost)
+        if wait > 0:
+            self.rejected[name] = self.rejected.get(name, 0) + 1
+            if self.observer is not None:
+                self.observer(name)
+        return wait
+
+    def limit(self, name, key=None):
+        """Decorador de rotas: 429 + Retry-After acima do limite. `key()` padrão: IP do cliente."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                wait = self.check(name, key() if key else client_ip(self.proxy_hops, self.loopback_proxy))
+                if wait > 0:
+                    resp = jsonify({"message": "Muitas requisições, tente novamente mais tarde"})
+                    resp.status_code = 429
+                    resp.headers["Retry-After"] = str(math.ceil(wait))
+                    return resp
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def limit_event(self, name, key=None):
+        """Decorador de eventos: descarta o evento acima do limite. `key()` padrão: usuário da sessão."""
+        def decorator(handler):
+            @wraps(handler)
+            def wrapper(*args, **kwargs):
+                wait = self.check(name, key() if key else session.get("user_id", request.sid))
+                if wait > 0:
+                    return {"ok": False, "error": "rate_limited", "retry_after_ms": math.ceil(wait * 1000)}
+                return handler(*args, **kwargs)
+            return wrapper
+        return decorator
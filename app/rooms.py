@@ -0,0 +1,214 @@
+"""
+Registro das salas de chat deste processo, sem depender dos internos do Socket.IO.
+
+Índices mantidos juntos, sob um único lock:
+
+- sid -> user_id e user_id -> {sid} (várias abas do mesmo usuário);
+- sala -> {user_id: {sid}}: o usuário continua na sala enquanto tiver uma aba nela;
+- o reverso sid -> {sala}, para que o disconnect limpe só as salas daquela conexão
+  (O(salas da conexão), sem varrer todas as salas);
+- sala -> {codificação: nº de conexões} (app/wire.py), usado pelo fan-out para pular
+  as sub-salas sem ninguém.
+
+Além das salas de chat, cada conexão entra na sala do próprio usuário (`user_room`),
+usada para entregas endereçadas a uma pessoa; essa não passa pelo registro.
+
+O registro só fala das conexões deste worker. A lista de membros entre workers continua
+no estado compartilhado (app/shared_state.py), com uma entrada por worker: o registro
+avisa quando o *último* sid de um usuário sai da sala *neste worker*, que é quando a
+entrada dele sai de lá, e a tarefa periódica renova as entradas de quem continua.
+
+Salas que ficam vazias entram numa fila de ociosas; uma tarefa periódica apaga o
+histórico em memória das que continuam vazias (em todos os workers) por mais de
+`idle_ttl` segundos, o que preserva o histórico num simples recarregar da página.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def user_room(user_id):
+    """Sala de todas as conexões de um usuário, para entregas endereçadas a ele."""
+    return f"user_{user_id}"
+
+
+class RoomRegistry:
+    def __init__(self, idle_ttl=300, gc_interval=30):
+        self.idle_ttl = idle_ttl
+        self.gc_interval = gc_interval
+        self.collected = 0              # salas cujo histórico foi descartado pelo GC
+
+        self._sid_user = {}             # sid -> user_id
+        self._user_sids = {}            # user_id -> {sid}
+        self._sid_rooms = {}            # sid -> {sala}
+        self._room_users = {}           # sala -> {user_id: {sid}}
+        self._room_encodings = {}       # sala -> {codificação: conexões}
+        self._sid_encoding = {}         # sid -> codificação
+        self._idle = {}                 # sala -> instante em que ficou vazia
+        self._lock = threading.Lock()
+        self._socketio = None
+        self._state = None
+        self._task = None
+
+    def init_app(self, app, socketio, shared_state):
+        self.idle_ttl = app.config.get("ROOM_IDLE_TTL", self.idle_ttl)
+        self.gc_interval = app.config.get("ROOM_GC_INTERVAL", self.gc_interval)
+        self._socketio = socketio
+        self._state = shared_state
+
+    # ------------------------------------------------------------------
+    # Conexões
+    # ------------------------------------------------------------------
+
+    def join(self, sid, user_id, room, encoding):
+        """Registra o sid na sala; devolve True se é a primeira aba do usuário nela."""
+        self._ensure_started()
+        with self._lock:
+            rooms = self._sid_rooms.setdefault(sid, set())
+            if room in rooms:
+                return False
+
+            self._sid_user[sid] = user_id
+            self._user_sids.setdefault(user_id, set()).add(sid)
+            self._sid_encoding[sid] = encoding
+            rooms.add(room)
+
+            users = self._room_users.setdefault(room, {})
+            sids = users.setdefault(user_id, set())
+            sids.add(sid)
+            encodings = self._room_encodings.setdefault(room, {})
+            encodings[encoding] = encodings.get(encoding, 0) + 1
+            self._idle.pop(room, None)
+            return len(sids) == 1
+
+    def leave(self, sid, room):
+        """Tira o sid da sala; devolve o user_id se era a última aba dele na sala."""
+        with self._lock:
+            rooms = self._sid_rooms.get(sid)
+            if not rooms or room not in rooms:
+                return None
+            rooms.discard(room)
+            if not rooms:
+                del self._sid_rooms[sid]
+            return self._leave_room(sid, room)
+
+    def disconnect(self, sid):
+        """Limpa a conexão; devolve [(sala, user_id)] das salas que o usuário deixou de vez."""
+        with self._lock:
+            left = []
+            for room in self._sid_rooms.pop(sid, ()):
+                user_id = self._leave_room(sid, room)
+                if user_id is not None:
+                    left.append((room, user_id))
+
+            user_id = self._sid_user.pop(sid, None)
+            self._sid_encoding.pop(sid, None)
+            sids = self._user_sids.get(user_id)
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._user_sids[user_id]
+            return left
+
+    def _leave_room(self, sid, room):
+        # Chamado com o lock; o sid já saiu de _sid_rooms
+        left_user = None
+        user_id = self._sid_user.get(sid)
+        users = self._room_users.get(room, {})
+        sids = users.get(user_id)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del users[user_id]
+                left_user = user_id
+
+        encodings = self._room_encodings.get(room, {})
+        encoding = self._sid_encoding.get(sid)
+        if encoding in encodings:
+            encodings[encoding] -= 1
+            if not encodings[encoding]:
+                del encodings[encoding]
+
+        if not users:
+            self._room_users.pop(room, None)
+            self._room_encodings.pop(room, None)
+        return left_user
+
+    def mark_idle(self, room):
+        """A sala ficou vazia em todos os workers: o GC apaga o histórico depois do TTL."""
+        with self._lock:
+            if room not in self._room_users:
+                self._idle.setdefault(room, time.monotonic())
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def user_sids(self, user_id):
+        with self._lock:
+            return set(self._user_sids.get(user_id, ()))
+
+    def in_room(self, sid, room):
+        return room in self._sid_rooms.get(sid, ())
+
+    def local_members(self, room):
+        with self._lock:
+            return set(self._room_users.get(room, ()))
+
+    def memberships(self):
+        """{sala: [user_id]} das conexões deste worker (renovadas no estado compartilhado)."""
+        with self._lock:
+            return {room: list(users) for room, users in self._room_users.items()}
+
+    def has_listeners(self, room, encoding):
+        return self._room_encodings.get(room, {}).get(encoding, 0) > 0
+
+    def stats(self):
+        return {
+            "rooms": len(self._room_users),
+            "idle_rooms": len(self._idle),
+            "connections": len(self._sid_rooms),
+            "collected": self.collected,
+        }
+
+    # ------------------------------------------------------------------
+    # GC das salas ociosas
+    # ------------------------------------------------------------------
+
+    def _ensure_started(self):
+        if self._task is None and self._socketio is not None:
+            self._task = self._socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self._socketio.sleep(self.gc_interval)
+            try:
+                self._state.refresh_members(self.memberships())
+            except Exception:
+                logger.exception("erro ao renovar os membros das salas")
+            try:
+                self.collect()
+            except Exception:
+                logger.exception("erro no GC das salas")
+
+    def collect(self, now=None):
+        """Descarta as salas vazias há mais de `idle_ttl` segundos; devolve quantas."""
+        deadline = (now if now is not None else time.monotonic()) - self.idle_ttl
+        with self._lock:
+            expired = [room for room, since in self._idle.items() if since <= deadline]
+            for room in expired:
+                del self._idle[room]
+
+        collected = 0
+        for room in expired:
+            # Alguém pode ter entrado pela sala em outro worker nesse meio tempo
+            if self._state.members(room):
+                continue
+            self._state.drop_room(room)
+            collected += 1
+        self.collected += collected
+        if collected:
+            logger.info("salas ociosas descartadas", extra={"rooms": collected})
+        return collected
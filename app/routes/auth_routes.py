@@ -1,23 +1,35 @@
 from flask import Blueprint, request, jsonify, current_app, render_template
-from app import db
+from app import db, password_hasher, presence, rate_limiter
 from app.models.user import User
-import bcrypt
+from app.auth import revoke_token
+from app.password_hasher import HasherBusy
 import jwt
 from datetime import datetime, timedelta, timezone
 
 auth = Blueprint("auth", __name__)
 
+def hasher_busy_response():
+    # Pool de bcrypt saturado: recusa na hora em vez de enfileirar
+    resp = jsonify({"message": "Servidor ocupado, tente novamente"})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(current_app.config["PASSWORD_HASH_RETRY_AFTER"])
+    return resp
+
 @auth.route('/register', methods=['GET'])
 def register_get():
     return render_template('register.html')
 
 @auth.route('/register', methods=['POST'])
+@rate_limiter.limit("register")
 def register():
     data = request.json
     username = data["username"]
     password = data["password"]
 
-    hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    try:
+        hashed = password_hasher.hash(password)
+    except HasherBusy:
+        return hasher_busy_response()
 
     user = User(username=username, password=hashed, isOnline=False)
     db.session.add(user)
@@ -30,6 +42,7 @@ def login_get():
     return render_template('login.html')
 
 @auth.route('/login', methods=['POST'])
+@rate_limiter.limit("login")
 def login_post():
     data = request.json
     username = data["username"]
@@ -40,11 +53,20 @@ def login_post():
     if not user:
         return jsonify({"message": "Usuário não encontrado"}), 404
 
-    if not bcrypt.checkpw(password.encode(), user.password):
-        return jsonify({"message": "Senha incorreta"}), 401
-    
-    user.isOnline = True
-    db.session.commit()
+    try:
+        if not password_hasher.verify(password, user.password):
+            return jsonify({"message": "Senha incorreta"}), 401
+    except HasherBusy:
+        return hasher_busy_response()
+
+    # Custo do bcrypt mudou desde o cadastro: aproveita a senha em mãos para refazer o hash
+    # (a presença online agora vem das conexões Socket.IO, não de uma escrita no banco)
+    if password_hasher.needs_rehash(user.password):
+        try:
+            user.password = password_hasher.hash(password)
+            db.session.commit()
+        except HasherBusy:
+            pass  # tenta de novo no próximo login
 
     token = jwt.encode(
         {   
@@ -65,20 +87,10 @@ def login_post():
 def logout():
     token = request.cookies.get("token")
 
-    if token:
-        try:
-            decoded = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
-            user_id = decoded.get("user_id")
-            user = User.query.get(user_id)
-
-            if user:
-                user.isOnline = False
-                db.session.commit()
-
-        except jwt.ExpiredSignatureError:
-            pass
-        except jwt.InvalidTokenError:
-            pass
+    # Revoga o token: remove do cache de verificados e impede novo uso até o exp
+    decoded = revoke_token(token)
+    if decoded:
+        presence.remove_user(decoded.get("user_id"))
 
     resp = jsonify({"message": "Logout realizado com sucesso"})
     resp.set_cookie("token", "", expires=0, httponly=True, secure=True, samesite='Lax')
@@ -1,86 +1,164 @@
-from flask import Blueprint, jsonify, render_template, request
-from app import db
-from app.models.user import User
-from app.routes.default import get_token_from_request, is_token_valid
+import base64
+import hashlib
+import json
+from flask import Blueprint, current_app, g, jsonify, render_template, request
+from app import db, groups, presence, user_directory
+from app.groups import GroupError
+from app.auth import login_required
 
 users = Blueprint("users", __name__)
 
+def encode_cursor(key):
+    # Cursor opaco com a chave (username.lower(), id) do último item da página
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        name, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (str(name), int(user_id))
+    except (ValueError, TypeError):
+        return None
+
 @users.route('/home', methods=['GET'])
 def home():
     return render_template('home.html')
 
 @users.route('/allusers', methods=['GET'])
+@login_required
 def all_users():
-    token = get_token_from_request()
-    if is_token_valid(token):
-
-        # buscar somente usuários online
-        online_users = User.query.filter_by(isOnline=True).all()
+    """
+    Usuários online, paginados por cursor e filtrados por prefixo do username.
+
+    Parâmetros: `q` (prefixo), `limit` e `cursor` (next_cursor da página anterior).
+    A resposta leva ETag e no-cache: o navegador revalida sempre e, enquanto ninguém
+    entrar/sair, recebe 304 (um max-age esconderia os avisos de presence_diff).
+    """
+    query = request.args.get("q", "").strip()
+    cursor = request.args.get("cursor", "")
+    try:
+        limit = int(request.args.get("limit", current_app.config["USERS_PAGE_SIZE"]))
+    except ValueError:
+        limit = current_app.config["USERS_PAGE_SIZE"]
+    limit = max(1, min(limit, current_app.config["USERS_PAGE_MAX"]))
+
+    # A lista só muda quando alguém entra/sai: responde 304 sem montar a página
+    params = hashlib.sha1(f"{query}\0{cursor}\0{limit}".encode()).hexdigest()[:16]
+    etag = f"{presence.etag()}-{params}"
+    if request.if_none_match.contains_weak(etag):
+        resp = current_app.response_class(status=304)
+    else:
+        # usuários online vêm do índice em memória do registro de presença (sem consulta ao banco)
+        page, last_key = presence.search(query, decode_cursor(cursor), limit)
 
-        # transformar em JSON
         result = []
-        for u in online_users:
+        for u in page:
             result.append({
-                "id": u.id,
-                "username": u.username,
-                "isOnline": bool(u.isOnline)
+                "id": u["id"],
+                "username": u["username"],
+                "isOnline": True
             })
 
-        return jsonify(result)
+        resp = jsonify({
+            "users": result,
+            "next_cursor": encode_cursor(last_key) if last_key else None
+        })
 
-    else:
-        return jsonify({"message": "Unauthorized"}), 401
+    resp.set_etag(etag, weak=True)
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp
 
 @users.route('/chat', methods=['GET'])
+@login_required
 def chat_page():
-    # 1. Validar token
-    token = get_token_from_request()
-    payload = is_token_valid(token)
-    if not payload:
-        return jsonify({"message": "Unauthorized"}), 401
-    
-    # is_token_valid() retorna o payload se for válido
-    my_id = payload.get("user_id")
-    me = User.query.get(my_id)
+    # 1. Token já validado por login_required (identidade em g)
+    # 2. Pegar ID do outro usuário pela query string
+    try:
+        other_id = int(request.args.get("user", ""))
+    except ValueError:
+        return jsonify({"message": "ID do usuário não informado"}), 400
 
+    # 3. Os dois usuários de uma vez, pelo diretório (cache; falta = uma consulta)
+    found = user_directory.get_many([g.user_id, other_id])
+    me = found.get(g.user_id)
     if not me:
         return jsonify({"message": "Usuário não encontrado"}), 404
 
-    # 3. Pegar ID do outro usuário pela query string
-    other_id = request.args.get("user")
-    if not other_id:
-        return jsonify({"message": "ID do usuário não informado"}), 400
-
-    other_user = User.query.filter_by(id=other_id).first()
+    other_user = found.get(other_id)
     if not other_user:
         return jsonify({"message": "Usuário destino não existe"}), 404
 
     # 4. Renderizar o chat
     return render_template(
         "chat.html",
-        my_id=me.id,
-        my_username=me.username,
-        other_id=other_user.id,
-        other_username=other_user.username
+        my_id=me["id"],
+        my_username=me["username"],
+        other_id=other_user["id"],
+        other_username=other_user["username"]
     )
 
-@users.route('/me', methods=['GET'])
-def users_me():
-    token = request.cookies.get("token")
-    if not token:
-        return jsonify({"error": "Not authenticated"}), 401
+@users.route('/group', methods=['GET'])
+@login_required
+def group_page():
+    from app.models.group import Group
+
+    try:
+        group_id = int(request.args.get("id", ""))
+        members = groups.members(group_id)
+    except ValueError:
+        return jsonify({"message": "ID do grupo não informado"}), 400
+    except GroupError:
+        return jsonify({"message": "Grupo não existe"}), 404
+
+    if g.user_id not in members:
+        return jsonify({"message": "Você não faz parte deste grupo"}), 403
 
-    data = is_token_valid(token)  # sua função que faz jwt.decode e retorna o payload
-    if not data:
-        return jsonify({"error": "Invalid token"}), 401
+    group = db.session.get(Group, group_id)
+    names = user_directory.get_many(members)
 
-    user_id = data.get("user_id")
-    user = User.query.get(user_id)
+    return render_template(
+        "group.html",
+        group_id=group.id,
+        group_name=group.name,
+        members=sorted(names.values(), key=lambda u: u["username"].lower())
+    )
+
+@users.route('/batch', methods=['GET'])
+@login_required
+def users_batch():
+    """
+    Vários usuários numa chamada: `ids=1,2,3` (ou `ids` repetido).
+
+    Responde os encontrados, com o estado online, e os ids que não existem em `missing`.
+    """
+    try:
+        ids = [int(v) for raw in request.args.getlist("ids") for v in raw.split(",") if v.strip()]
+    except ValueError:
+        return jsonify({"message": "ids inválidos"}), 400
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > current_app.config["USERS_BATCH_MAX"]:
+        return jsonify({"message": f"No máximo {current_app.config['USERS_BATCH_MAX']} ids por chamada"}), 400
+
+    found = user_directory.get_many(ids)
+    resp = jsonify({
+        "users": [dict(found[i], isOnline=presence.is_online(i)) for i in ids if i in found],
+        "missing": [i for i in ids if i not in found]
+    })
+    resp.cache_control.private = True
+    resp.cache_control.max_age = current_app.config["USERS_CACHE_MAX_AGE"]
+    return resp
+
+@users.route('/me', methods=['GET'])
+@login_required
+def users_me():
+    user = user_directory.get(g.user_id)
 
     if not user:
         return jsonify({"error": "User not found"}), 404
 
     return jsonify({
-        "id": user.id,
-        "username": user.username
+        "id": user["id"],
+        "username": user["username"]
     })
\ No newline at end of file
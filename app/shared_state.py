@@ -0,0 +1,535 @@
+"""
+Estado compartilhado das salas (membros + histórico) atrás de uma interface única.
+
+Backends disponíveis, escolhidos pela URL em STATE_BACKEND_URL:
+
+- ``memory://``            estado no próprio processo (um único worker);
+- ``redis://host:port/db`` estado num Redis compartilhado por todos os workers;
+- ``manager://host:port``  broker local (multiprocessing) iniciado com
+                           ``python scripts/state_broker.py``, útil para testar
+                           vários workers sem Redis.
+
+O mesmo broker ``manager://`` também serve de fila de mensagens do Socket.IO
+(ver ``ManagerPubSubManager``), para que um ``emit`` feito num worker chegue aos
+clientes conectados nos outros. O broker fala pickle: quem conecta com a chave executa
+código nele, por isso STATE_BROKER_AUTHKEY não tem padrão e a subida falha sem ela.
+
+Tokens revogados no logout também ficam aqui (até o `exp` de cada um), para que o
+logout valha em todos os workers.
+
+Os membros de cada sala são guardados por worker (usuário, id do worker): a última aba
+do usuário fechando num worker não o tira da sala enquanto ele tiver abas em outro.
+Cada entrada expira em `member_ttl` segundos e é renovada periodicamente pelo worker
+que a criou (app/rooms.py); as de um worker que caiu somem sozinhas.
+"""
+import base64
+import heapq
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from multiprocessing.managers import BaseManager
+from urllib.parse import urlparse
+
+import socketio
+
+from app.message_store import MessageStore
+
+logger = logging.getLogger(__name__)
+
+
+class StateBackend:
+    """Interface do estado compartilhado das salas."""
+
+    def add_member(self, room, user_id, worker, ttl):
+        """Adiciona o usuário à sala (por `worker`) e devolve o conjunto atualizado de membros."""
+        raise NotImplementedError
+
+    def remove_member(self, room, user_id, worker):
+        """Remove a entrada do usuário neste `worker` e devolve o conjunto restante de membros."""
+        raise NotImplementedError
+
+    def members(self, room):
+        """Usuários com alguma entrada ainda válida na sala, em qualquer worker."""
+        raise NotImplementedError
+
+    def refresh_members(self, worker, memberships, ttl):
+        """Renova as entradas do `worker`: `memberships` é {sala: [user_id, ...]}."""
+        raise NotImplementedError
+
+    def append_message(self, room, sender, ciphertext, iv, mac):
+        """Guarda a mensagem e devolve o número de sequência atribuído."""
+        raise NotImplementedError
+
+    def history_page(self, room, since_seq, limit):
+        raise NotImplementedError
+
+    def last_seq(self, room):
+        raise NotImplementedError
+
+    def seed_room(self, room, last_seq):
+        """Sala sem histórico passa a numerar a partir de `last_seq` + 1 (log persistente)."""
+        raise NotImplementedError
+
+    def drop_room(self, room):
+        raise NotImplementedError
+
+    def revoke_token(self, digest, exp):
+        """Marca o token (SHA-256) como revogado até `exp` (timestamp do JWT)."""
+        raise NotImplementedError
+
+    def is_token_revoked(self, digest):
+        raise NotImplementedError
+
+
+class MemoryStateBackend(StateBackend):
+    """Estado no próprio processo: membros num dict e histórico no MessageStore."""
+
+    def __init__(self, message_store=None):
+        self.message_store = message_store if message_store is not None else MessageStore()
+        # Sala com membros conectados não é descartada pelo orçamento de memória
+        self.message_store.is_active = self.members
+        self._members = {}              # sala -> {(user_id, worker): expira em}
+        self._revoked = {}              # digest do token -> exp
+        self._revoked_expiry = []       # heap (exp, digest): poda sem varrer o dict
+        self._lock = threading.Lock()
+
+    def add_member(self, room, user_id, worker, ttl):
+        with self._lock:
+            self._members.setdefault(room, {})[(user_id, worker)] = time.time() + ttl
+            return self._live(room)
+
+    def remove_member(self, room, user_id, worker):
+        with self._lock:
+            self._members.get(room, {}).pop((user_id, worker), None)
+            return self._live(room)
+
+    def members(self, room):
+        with self._lock:
+            return self._live(room)
+
+    def refresh_members(self, worker, memberships, ttl):
+        expires = time.time() + ttl
+        with self._lock:
+            for room, user_ids in memberships.items():
+                entries = self._members.setdefault(room, {})
+                for user_id in user_ids:
+                    entries[(user_id, worker)] = expires
+
+    def _live(self, room):
+        # Chamado com o lock: descarta as entradas vencidas (worker que caiu)
+        entries = self._members.get(room)
+        if not entries:
+            self._members.pop(room, None)
+            return set()
+        now = time.time()
+        for key in [k for k, expires in entries.items() if expires <= now]:
+            del entries[key]
+        if not entries:
+            del self._members[room]
+        return {user_id for user_id, _ in entries}
+
+    def append_message(self, room, sender, ciphertext, iv, mac):
+        return self.message_store.append(room, sender, ciphertext, iv, mac).seq
+
+    def history_page(self, room, since_seq, limit):
+        return self.message_store.page(room, since_seq, limit)
+
+    def last_seq(self, room):
+        return self.message_store.last_seq(room)
+
+    def seed_room(self, room, last_seq):
+        self.message_store.seed(room, last_seq)
+
+    def drop_room(self, room):
+        self.message_store.drop(room)
+
+    def revoke_token(self, digest, exp):
+        now = time.time()
+        with self._lock:
+            # Revogações de tokens que já expiraram por conta própria saem pela frente do heap
+            while self._revoked_expiry and self._revoked_expiry[0][0] <= now:
+                _, old = heapq.heappop(self._revoked_expiry)
+                del self._revoked[old]
+            if exp > now and digest not in self._revoked:
+                self._revoked[digest] = exp
+                heapq.heappush(self._revoked_expiry, (exp, digest))
+
+    def is_token_revoked(self, digest):
+        exp = self._revoked.get(digest)
+        return exp is not None and exp > time.time()
+
+
+# Append atômico no Redis: sequência, mensagem e corte do histórico numa só operação
+_REDIS_APPEND = """
+local seq = redis.call('INCR', KEYS[1])
+local msg = cjson.encode({seq = seq, sender = tonumber(ARGV[1]), ciphertext = ARGV[2], iv = ARGV[3], mac = ARGV[4]})
+redis.call('RPUSH', KEYS[2], msg)
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[5]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+return seq
+"""
+
+# Só avança o contador de uma sala cujo histórico está vazio
+_REDIS_SEED = """
+if redis.call('LLEN', KEYS[2]) == 0 and tonumber(redis.call('GET', KEYS[1]) or '0') < tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+return 0
+"""
+
+
+class RedisStateBackend(StateBackend):
+    """
+    Estado num Redis compartilhado.
+
+    Cada sala usa três chaves: membros (ZSET de "user_id:worker" com a expiração como
+    score), contador de sequência (INCR) e histórico (LIST cortada em `room_capacity`).
+    Salas ociosas expiram após `room_ttl` segundos, o equivalente ao descarte LRU do
+    backend em memória.
+    """
+
+    def __init__(self, url, room_capacity=500, room_ttl=24 * 3600, prefix="whatschat"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("STATE_BACKEND_URL=redis:// requer o pacote 'redis' (pip install redis)")
+
+        self.redis = redis.Redis.from_url(url)
+        self.room_capacity = room_capacity
+        self.room_ttl = room_ttl
+        self.prefix = prefix
+        self._append = self.redis.register_script(_REDIS_APPEND)
+        self._seed = self.redis.register_script(_REDIS_SEED)
+
+    def _key(self, kind, room):
+        return f"{self.prefix}:{kind}:{room}"
+
+    def add_member(self, room, user_id, worker, ttl):
+        key = self._key("room_members", room)
+        now = time.time()
+        pipe = self.redis.pipeline()
+        pipe.zadd(key, {f"{user_id}:{worker}": now + ttl})
+        pipe.zremrangebyscore(key, "-inf", now)
+        pipe.expire(key, ttl)
+        pipe.zrangebyscore(key, now, "+inf")
+        return _member_ids(pipe.execute()[-1])
+
+    def remove_member(self, room, user_id, worker):
+        key = self._key("room_members", room)
+        pipe = self.redis.pipeline()
+        pipe.zrem(key, f"{user_id}:{worker}")
+        pipe.zrangebyscore(key, time.time(), "+inf")
+        return _member_ids(pipe.execute()[-1])
+
+    def members(self, room):
+        return _member_ids(self.redis.zrangebyscore(self._key("room_members", room), time.time(), "+inf"))
+
+    def refresh_members(self, worker, memberships, ttl):
+        expires = time.time() + ttl
+        pipe = self.redis.pipeline(transaction=False)
+        for room, user_ids in memberships.items():
+            key = self._key("room_members", room)
+            pipe.zadd(key, {f"{user_id}:{worker}": expires for user_id in user_ids})
+            pipe.expire(key, ttl)
+        pipe.execute()
+
+    def append_message(self, room, sender, ciphertext, iv, mac):
+        # O histórico é JSON (cjson): os campos binários ficam em base64
+        ciphertext, iv, mac = (base64.b64encode(v).decode("ascii") for v in (ciphertext, iv, mac))
+        return int(self._append(
+            keys=[self._key("seq", room), self._key("history", room)],
+            args=[sender, ciphertext, iv, mac, self.room_capacity, self.room_ttl],
+        ))
+
+    def history_page(self, room, since_seq, limit):
+        pipe = self.redis.pipeline()
+        pipe.get(self._key("seq", room))
+        pipe.llen(self._key("history", room))
+        last_seq, count = pipe.execute()
+        last_seq = int(last_seq or 0)
+
+        if since_seq > last_seq:
+            since_seq = 0
+
+        # O histórico guarda um intervalo contíguo de sequências terminando em last_seq
+        first_seq = last_seq - count + 1
+        offset = max(since_seq + 1 - first_seq, 0)
+        raw = self.redis.lrange(self._key("history", room), offset, offset + limit - 1) if count else []
+        messages = [_decode_fields(json.loads(m)) for m in raw]
+
+        cursor = messages[-1]["seq"] if messages else since_seq
+        return {
+            "room": room,
+            "messages": messages,
+            "last_seq": last_seq,
+            "has_more": cursor < last_seq,
+        }
+
+    def last_seq(self, room):
+        return int(self.redis.get(self._key("seq", room)) or 0)
+
+    def seed_room(self, room, last_seq):
+        self._seed(keys=[self._key("seq", room), self._key("history", room)], args=[last_seq, self.room_ttl])
+
+    def drop_room(self, room):
+        self.redis.delete(self._key("seq", room), self._key("history", room))
+
+    def revoke_token(self, digest, exp):
+        # A chave some sozinha quando o token expiraria de qualquer forma
+        ttl = int(exp - time.time()) + 1
+        if ttl > 0:
+            self.redis.set(self._key("revoked", digest.hex()), 1, ex=ttl)
+
+    def is_token_revoked(self, digest):
+        return bool(self.redis.exists(self._key("revoked", digest.hex())))
+
+
+def _member_ids(entries):
+    # "user_id:worker" -> user_id (o mesmo usuário pode estar em vários workers)
+    return {int(entry.split(b":", 1)[0]) for entry in entries}
+
+
+def _decode_fields(message):
+    for field in ("ciphertext", "iv", "mac"):
+        message[field] = base64.b64decode(message[field])
+    return message
+
+
+# ---------------------------------------------------------------------------
+# Broker local (multiprocessing): estado + pub/sub para vários workers sem Redis
+# ---------------------------------------------------------------------------
+
+class Subscription(queue.Queue):
+    """Fila de um assinante do broker; `close` cancela a assinatura."""
+
+    def __init__(self, broker, maxsize):
+        super().__init__(maxsize)
+        self._broker = broker
+
+    def close(self):
+        self._broker.unsubscribe(self)
+
+
+class PubSubBroker:
+    """Distribui cada mensagem publicada para a fila de todos os assinantes.
+
+    Fila cheia (worker lento) perde a mensagem mais antiga, não a assinatura: as
+    perdas são contadas em `dropped` e registradas no log. O assinante só sai com
+    `unsubscribe`/`Subscription.close` (o worker encerrando a escuta).
+    """
+
+    def __init__(self, max_pending=10000):
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        q = Subscription(self, self.max_pending)
+        with self._lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def publish(self, message):
+        with self._lock:
+            for q in self._subscribers:
+                while True:
+                    try:
+                        q.put_nowait(message)
+                        break
+                    except queue.Full:
+                        try:
+                            q.get_nowait()
+                        except queue.Empty:
+                            continue
+                        self.dropped += 1
+                        if self.dropped % 1000 == 1:
+                            logger.warning("fila de assinante cheia: descartando as mensagens mais antigas",
+                                           extra={"dropped": self.dropped})
+
+
+class StateBrokerManager(BaseManager):
+    pass
+
+
+StateBrokerManager.register("state")
+StateBrokerManager.register("pubsub")
+StateBrokerManager.register("subscribe")
+
+
+MIN_AUTHKEY_LENGTH = 16
+
+
+def broker_authkey(config):
+    """STATE_BROKER_AUTHKEY em bytes; ValueError se ausente ou curta demais."""
+    key = config.get("STATE_BROKER_AUTHKEY") or ""
+    if len(key) < MIN_AUTHKEY_LENGTH:
+        raise ValueError(
+            "STATE_BROKER_AUTHKEY obrigatória com manager:// (mínimo de "
+            f"{MIN_AUTHKEY_LENGTH} caracteres; ex.: python -c \"import secrets; print(secrets.token_hex(32))\")"
+        )
+    return key.encode()
+
+
+def parse_manager_url(url):
+    parsed = urlparse(url)
+    return (parsed.hostname or "127.0.0.1", parsed.port or 6500)
+
+
+def connect_broker(url, authkey):
+    manager = StateBrokerManager(address=parse_manager_url(url), authkey=authkey)
+    manager.connect()
+    return manager
+
+
+def serve_broker(url, authkey, room_capacity=500, max_bytes=32 * 1024 * 1024):
+    """Sobe o broker (bloqueia). Usado por scripts/state_broker.py."""
+    state = MemoryStateBackend(MessageStore(room_capacity, max_bytes))
+    pubsub = PubSubBroker()
+
+    class Server(BaseManager):
+        pass
+
+    Server.register("state", callable=lambda: state)
+    Server.register("pubsub", callable=lambda: pubsub)
+    Server.register("subscribe", callable=pubsub.subscribe)
+
+    manager = Server(address=parse_manager_url(url), authkey=authkey)
+    manager.get_server().serve_forever()
+
+
+class ManagerStateBackend(StateBackend):
+    """Estado guardado no broker local; cada chamada é um RPC para o processo do broker."""
+
+    def __init__(self, url, authkey):
+        self._manager = connect_broker(url, authkey)
+        self._state = self._manager.state()
+        self._lock = threading.Lock()
+
+    def _call(self, method, *args):
+        # Um proxy do multiprocessing não pode ser usado por duas threads ao mesmo tempo
+        with self._lock:
+            return getattr(self._state, method)(*args)
+
+    def add_member(self, room, user_id, worker, ttl):
+        return self._call("add_member", room, user_id, worker, ttl)
+
+    def remove_member(self, room, user_id, worker):
+        return self._call("remove_member", room, user_id, worker)
+
+    def members(self, room):
+        return self._call("members", room)
+
+    def refresh_members(self, worker, memberships, ttl):
+        return self._call("refresh_members", worker, memberships, ttl)
+
+    def append_message(self, room, sender, ciphertext, iv, mac):
+        return self._call("append_message", room, sender, ciphertext, iv, mac)
+
+    def history_page(self, room, since_seq, limit):
+        return self._call("history_page", room, since_seq, limit)
+
+    def last_seq(self, room):
+        return self._call("last_seq", room)
+
+    def seed_room(self, room, last_seq):
+        return self._call("seed_room", room, last_seq)
+
+    def drop_room(self, room):
+        return self._call("drop_room", room)
+
+    def revoke_token(self, digest, exp):
+        return self._call("revoke_token", digest, exp)
+
+    def is_token_revoked(self, digest):
+        return self._call("is_token_revoked", digest)
+
+
+class ManagerPubSubManager(socketio.PubSubManager):
+    """Fila de mensagens do Socket.IO sobre o broker local (equivalente ao RedisManager)."""
+
+    name = "manager"
+
+    def __init__(self, url, authkey, channel="flask-socketio", write_only=False):
+        super().__init__(channel=channel, write_only=write_only)
+        self.url = url
+        self.authkey = authkey
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+
+    def _publish(self, data):
+        with self._publish_lock:
+            if self._publisher is None:
+                self._publisher = connect_broker(self.url, self.authkey).pubsub()
+            self._publisher.publish(data)
+
+    def _listen(self):
+        # Conexão própria: o get() bloqueante não pode disputar o proxy do _publish
+        subscription = connect_broker(self.url, self.authkey).subscribe()
+        try:
+            while True:
+                yield subscription.get()
+        finally:
+            subscription.close()
+
+
+class SharedState:
+    """Extensão que escolhe o backend de estado a partir da configuração."""
+
+    def __init__(self, message_store=None, member_ttl=120):
+        self.message_store = message_store
+        self.member_ttl = member_ttl
+        self.worker_id = uuid.uuid4().hex[:8]
+        self.backend = MemoryStateBackend(message_store)
+
+    def init_app(self, app):
+        url = app.config.get("STATE_BACKEND_URL") or "memory://"
+        self.member_ttl = app.config.get("STATE_MEMBER_TTL", self.member_ttl)
+
+        if url.startswith("memory://"):
+            self.backend = MemoryStateBackend(self.message_store)
+        elif url.startswith(("redis://", "rediss://")):
+            self.backend = RedisStateBackend(
+                url,
+                room_capacity=app.config["MESSAGE_STORE_ROOM_CAPACITY"],
+                room_ttl=app.config["STATE_ROOM_TTL"],
+            )
+        elif url.startswith("manager://"):
+            self.backend = ManagerStateBackend(url, broker_authkey(app.config))
+        else:
+            raise ValueError(f"STATE_BACKEND_URL não suportada: {url}")
+
+    # Membros: as entradas levam o id deste worker e a expiração configurada
+    def add_member(self, room, user_id):
+        return self.backend.add_member(room, user_id, self.worker_id, self.member_ttl)
+
+    def remove_member(self, room, user_id):
+        return self.backend.remove_member(room, user_id, self.worker_id)
+
+    def refresh_members(self, memberships):
+        if memberships:
+            self.backend.refresh_members(self.worker_id, memberships, self.member_ttl)
+
+    def __getattr__(self, name):
+        # Delegação dos métodos da interface StateBackend
+        return getattr(self.backend, name)
+
+
+def socketio_queue_options(app):
+    """Argumentos de SocketIO.init_app para a fila de mensagens configurada."""
+    url = app.config.get("SOCKETIO_MESSAGE_QUEUE")
+    if not url:
+        return {}
+    if url.startswith("manager://"):
+        return {"client_manager": ManagerPubSubManager(url, broker_authkey(app.config))}
+    # redis://, kafka://, zmq, amqp:// ... são tratados pelo próprio Flask-SocketIO
+    return {"message_queue": url}
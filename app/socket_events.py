@@ -1,122 +1,535 @@
-from flask_socketio import emit, join_room, leave_room, rooms
-from flask import request
-from app import socketio
+import logging
 
-active_users_in_room = {}
+from flask_socketio import emit, join_room, leave_room
+from flask import request, current_app, session
+from app import (socketio, shared_state, presence, room_registry, fanout, message_log, rate_limiter, groups, prekeys,
+                 attachments)
+from app.attachments import AttachmentError
+from app.auth import authenticate_socket, socket_authenticated
+from app.groups import GroupError, group_room
+from app.log import message_logger, payload
+from app.prekeys import PrekeyError
+from app.presence import PRESENCE_ROOM
+from app.rooms import user_room
+from app.wire import BASE64, ENCODINGS, InvalidPayload, delivery_room, encode, encode_page, negotiate, to_bytes
 
-# rooms_messages["room_1_5"] = [(1, "Oi"), (5, "Olá"), ...]
-rooms_messages = {}
+logger = logging.getLogger(__name__)
+message_events = message_logger()   # eventos por mensagem: amostrados e em DEBUG
 
 def build_room_name(id1, id2):
     return f"room_{min(id1, id2)}_{max(id1, id2)}"
 
+def history_page_limit(requested):
+    # Tamanho da página de histórico, limitado pelo máximo configurado
+    default = current_app.config["HISTORY_PAGE_SIZE"]
+    maximum = current_app.config["HISTORY_PAGE_MAX"]
+    try:
+        limit = int(requested) if requested is not None else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+def room_history_page(room, since_seq, limit):
+    # Com o log persistente, o histórico vem do banco (índice room, seq)
+    if message_log.enabled:
+        return message_log.page(room, since_seq, limit)
+    return shared_state.history_page(room, since_seq, limit)
+
+def session_encoding():
+    return session.get("encoding", BASE64)
+
+def member_left(room, user_id):
+    # Última aba do usuário neste worker saiu da sala: sai a entrada deste worker da lista
+    # compartilhada (com abas em outro worker ele continua membro)
+    remaining = shared_state.remove_member(room, user_id)
+    socketio.emit("user_left", {"room": room, "user_id": user_id}, to=room)
+
+    # Sala vazia em todos os workers → o histórico em memória é descartado pelo GC
+    # depois de ROOM_IDLE_TTL (com MESSAGE_LOG_ENABLED as mensagens continuam no banco)
+    if not remaining:
+        room_registry.mark_idle(room)
+
+def ensure_room_seq(room):
+    # Sala sem histórico em memória (nova, reinício, descartada): a sequência continua
+    # de onde o log persistente parou, para não repetir (room, seq)
+    if message_log.enabled and shared_state.last_seq(room) == 0:
+        shared_state.seed_room(room, message_log.last_seq(room))
+
 @socketio.on("connect")
-def on_connect():
-    print("Cliente conectado:", request.sid)
-    emit("connected", {"message": "Bem-vindo!"})
+def on_connect(auth=None):
+    # Autentica uma única vez pelo cookie; a identidade fica na sessão do socket
+    if not authenticate_socket():
+        return False
+
+    # Formato dos campos binários: anexos binários ou base64 (clientes antigos)
+    session["encoding"] = negotiate(auth)
+
+    # Entregas endereçadas ao usuário (chaves dos grupos, avisos de grupo)
+    join_room(delivery_room(user_room(session["user_id"]), session["encoding"]))
+
+    logger.info("cliente conectado", extra={"sid": request.sid, "user_id": session["user_id"],
+                                            "encoding": session["encoding"]})
+    presence.connect(session["user_id"], session["username"], request.sid)
+    emit("connected", {"message": "Bem-vindo!", "encoding": session["encoding"]})
 
 @socketio.on("disconnect")
 def on_disconnect():
-    print("Cliente saiu:", request.sid)
+    logger.info("cliente saiu", extra={"sid": request.sid, "user_id": session.get("user_id")})
+    presence.disconnect(request.sid)
+
+    # Salas que o usuário deixou de vez ao fechar esta aba
+    for room, user_id in room_registry.disconnect(request.sid):
+        member_left(room, user_id)
+
+@socketio.on("heartbeat")
+@socket_authenticated
+def on_heartbeat():
+    presence.heartbeat(session["user_id"], session["username"], request.sid)
+
+@socketio.on("subscribe_presence")
+@socket_authenticated
+def on_subscribe_presence():
+    # Passa a receber os diffs de presença (presence_diff)
+    join_room(PRESENCE_ROOM)
 
 @socketio.on("join")
+@socket_authenticated
+@rate_limiter.limit_event("room_events")
 def join_room_event(data):
-    user1_id = int(data["user1_id"])   # quem está entrando
-    user2_id = int(data["user2_id"])   # interlocutor
+    user1_id = session["user_id"]      # quem está entrando (autenticado no connect)
+    # Payload validado antes de entrar na sala: nada muda se um campo vier inválido
+    try:
+        user2_id = int(data["user2_id"])   # interlocutor
+        since_seq = int(data.get("since_seq", 0))
+    except (TypeError, ValueError, KeyError):
+        return {"ok": False, "error": "invalid_payload"}
+    limit = history_page_limit(data.get("limit"))
 
     room = build_room_name(user1_id, user2_id)
 
-    # Cria histórico da sala se não existir
-    if room not in rooms_messages:
-        rooms_messages[room] = []
+    # Entra na sala (membros ficam no estado compartilhado entre workers)
+    join_room(room)
+    join_room(delivery_room(room, session_encoding()))
+    room_registry.join(request.sid, user1_id, room, session_encoding())
+    members = shared_state.add_member(room, user1_id)
+    ensure_room_seq(room)
 
-    # Garante que exista o registro de usuários ativos
-    if room not in active_users_in_room:
-        active_users_in_room[room] = set()
+    logger.info("entrou na sala", extra={"room": room, "user_id": user1_id})
 
-    # Entra na sala
-    join_room(room)
-    active_users_in_room[room].add(user1_id)
+    both_present = user2_id in members
+
+    # Só quando AMBOS estiverem na sala enviamos load_history; com o log persistente
+    # quem entra recebe o que chegou enquanto estava offline mesmo sem o outro na sala
+    if both_present or message_log.enabled:
+        # Quem entrou recebe só a primeira página a partir do seu cursor;
+        # o restante é pedido página a página pelo cliente.
+        page = room_history_page(room, since_seq, limit)
+        emit("load_history", encode_page(page, session_encoding()))
+
+    if both_present:
+        logger.debug("ambos presentes, enviando cabeçalho do histórico", extra={"room": room})
 
-    print(f"Usuário {user1_id} entrou na sala {room}")
+        # Quem já estava na sala recebe apenas o cabeçalho (última sequência) e quem entrou:
+        # se ainda não tem as chaves, busca o bundle dele ou reenvia a chave DH
+        emit(
+            "load_history",
+            {"room": room, "messages": [], "last_seq": shared_state.last_seq(room), "has_more": False,
+             "joined": user1_id},
+            room=room,
+            include_self=False
+        )
+    return {"ok": True}
 
-    # Só quando AMBOS estiverem na sala enviamos load_history
-    if active_users_in_room[room] == {user1_id, user2_id} or \
-       active_users_in_room[room] == {user2_id, user1_id}:
 
-        print(f"Ambos os usuários estão presentes em {room}. Enviando load_history.")
-        emit("load_history", rooms_messages.get(room, []), room=room)
+@socketio.on("load_history")
+@socket_authenticated
+@rate_limiter.limit_event("room_events")
+def load_history_event(data):
+    user_id = session["user_id"]
+
+    # Conversa a dois (other_id) ou grupo (group_id)
+    try:
+        if "group_id" in data:
+            room = group_room(int(data["group_id"]))
+        else:
+            room = build_room_name(user_id, int(data["other_id"]))
+        since_seq = int(data.get("since_seq", 0))
+    except (TypeError, ValueError, KeyError):
+        return {"ok": False, "error": "invalid_payload"}
+
+    # Só quem está na sala pode paginar o histórico dela
+    if not room_registry.in_room(request.sid, room):
+        return {"ok": False, "error": "not_joined"}
+
+    page = room_history_page(room, since_seq, history_page_limit(data.get("limit")))
+    emit("load_history", encode_page(page, session_encoding()))
+    return {"ok": True}
 
 
 @socketio.on("leave")
+@socket_authenticated
 def on_leave(data):
-    user_id = data["user_id"]
-    other_id = data["other_id"]
+    user_id = session["user_id"]
+    try:
+        other_id = int(data["other_id"])
+    except (TypeError, ValueError, KeyError):
+        return {"ok": False, "error": "invalid_payload"}
 
     room = build_room_name(user_id, other_id)
 
     leave_room(room)
-    print(f"Usuário {user_id} saiu da sala {room}")
-
-    emit("user_left", {"room": room, "user_id": user_id}, room=room)
+    leave_room(delivery_room(room, session_encoding()))
+    logger.info("saiu da sala", extra={"room": room, "user_id": user_id})
 
-    # Checa se a sala está vazia
-    # rooms(sid) não ajuda pois não há SID aqui
-    # Usamos socketio.server.manager.rooms
-    room_members = socketio.server.manager.rooms["/"].get(room, set())
-
-    if len(room_members) == 0:
-        print(f"Sala {room} vazia → apagando histórico.")
-        if room in rooms_messages:
-            del rooms_messages[room]
+    # Com outra aba ainda na sala o usuário continua membro
+    if room_registry.leave(request.sid, room) is not None:
+        member_left(room, user_id)
 
 @socketio.on("send_message")
+@socket_authenticated
+@rate_limiter.limit_event("send_message")
 def send_message(data):
-    sender = int(data["sender"])
-    receiver = int(data["receiver"])
+    sender = session["user_id"]
+    try:
+        receiver = int(data["receiver"])
+    except (TypeError, ValueError, KeyError):
+        return {"ok": False, "error": "invalid_payload"}
 
-    ciphertext = data["ciphertext"]  # mensagem criptografada pela chave do DH
-    iv = data["iv"]                  # Initialization Vector
-    mac = data["mac"]                # HMAC da mensagem
+    return publish_message(build_room_name(sender, receiver), sender, data)
 
-    room = build_room_name(sender, receiver)
+def publish_message(room, sender, data):
+    # Campos binários: bytes (anexo binário) ou base64, guardados sempre como bytes
+    try:
+        ciphertext = to_bytes(data["ciphertext"])  # cifrada pela chave do DH (nos grupos, pela sender key)
+        iv = to_bytes(data["iv"])                  # Initialization Vector
+        mac = to_bytes(data["mac"])                # HMAC da mensagem
+    except InvalidPayload:
+        return {"ok": False, "error": "invalid_payload"}
+
+    # Sala com envios acumulados além do limite: o cliente deve reenviar depois
+    if not fanout.reserve(room):
+        return {"ok": False, "error": "backpressure", "retry_after_ms": current_app.config["FANOUT_MAX_DELAY_MS"] * 4}
 
-    # Salvar mensagem na memória efêmera
-    if room not in rooms_messages:
-        rooms_messages[room] = []
+    # Salvar mensagem no histórico compartilhado (buffer circular limitado)
+    try:
+        ensure_room_seq(room)
+        seq = shared_state.append_message(room, sender, ciphertext, iv, mac)
+    except Exception:
+        fanout.release(room)
+        raise
 
-    rooms_messages[room].append((sender, ciphertext))
+    # Gravação no banco em segundo plano (não espera o commit)
+    message_log.record(room, seq, sender, ciphertext, iv, mac)
 
-    print(f"[{room}] (encrypted) {sender}: {ciphertext}")
+    # Conteúdo omitido por padrão (LOG_PAYLOAD_CHARS)
+    message_events.debug("mensagem", extra={"room": room, "sender": sender, "seq": seq,
+                                            "size": len(ciphertext), "ciphertext": payload(ciphertext)})
 
-    # Emitir a mensagem para os usuários da sala
-    emit(
-        "receive_message",
+    # Enfileirar para os usuários da sala (sai em lote: receive_messages)
+    fanout.publish(
+        room,
         {
+            "seq": seq,
             "sender": sender,
             "ciphertext": ciphertext,
             "iv": iv,
             "mac": mac
-        },
-        room=room
+        }
     )
 
+    return {"ok": True, "seq": seq}
+
 #========== EVENTO PARA CONFIDENCIALIDADE E INTEGRIDADE DAS MENSAGENS ==================
 
 @socketio.on("send_dh_public_key")
+@socket_authenticated
+@rate_limiter.limit_event("room_events")
 def send_dh_public_key(data):
-    sender = int(data["sender"])
+    sender = session["user_id"]
     receiver = int(data["receiver"])
-    dh_public_key = data["dh_public_key"]
+    try:
+        dh_public_key = to_bytes(data["dh_public_key"])
+    except InvalidPayload:
+        return {"ok": False, "error": "invalid_payload"}
 
     room = build_room_name(sender, receiver)
 
-    emit(
-        "receive_dh_public_key", 
-        {   
+    # Repassa para o outro lado no formato de cada conexão
+    fanout.deliver(
+        "receive_dh_public_key",
+        room,
+        {
             "sender": sender,
             "dh_public_key": dh_public_key,
         },
-        room=room,
-        include_self=False
-    )
\ No newline at end of file
+        skip_sid=request.sid
+    )
+
+#========== PREKEYS (ver app/prekeys.py) ==================
+# Com o bundle do outro usuário em mãos o cliente deriva as chaves sem esperar a
+# resposta dele: abrir a conversa custa um único pedido (fetch_prekey_bundle).
+
+@socketio.on("upload_prekey_bundle")
+@socket_authenticated
+@rate_limiter.limit_event("room_events")
+def upload_prekey_bundle(data):
+    try:
+        changed = prekeys.put(
+            session["user_id"],
+            to_bytes(data["identity_key"]),
+            to_bytes(data["signed_prekey"]),
+            to_bytes(data["signature"]),
+            int(data.get("prekey_id", 0)),
+        )
+    except (PrekeyError, InvalidPayload, TypeError, ValueError, KeyError) as exc:
+        return {"ok": False, "error": getattr(exc, "code", "invalid_payload")}
+
+    if changed:
+        logger.info("prekey publicada", extra={"user_id": session["user_id"]})
+    return {"ok": True, "changed": changed}
+
+@socketio.on("fetch_prekey_bundle")
+@socket_authenticated
+@rate_limiter.limit_event("room_events")
+def fetch_prekey_bundle(data):
+    try:
+        bundle = prekeys.get(int(data["user_id"]))
+    except (PrekeyError, TypeError, ValueError, KeyError) as exc:
+        return {"ok": False, "error": getattr(exc, "code", "invalid_payload")}
+    return {"ok": True, "bundle": encode(bundle, session_encoding())}
+
+#========== GRUPOS (ver app/groups.py) ==================
+# Cada mensagem sai uma vez, cifrada com a sender key do remetente; as sender keys
+# circulam par a par (ECDH) entre os membros só quando são criadas ou trocadas.
+
+def group_ids(values):
+    return {int(v) for v in values or ()}
+
+def notify_group_members(event, group_id, user_ids):
+    # Avisos de criação/remoção: para cada usuário, em todas as abas (lista da home)
+    for uid in user_ids:
+        fanout.deliver_to_user(event, uid, {"group_id": group_id})
+
+def current_group(data, fresh=False):
+    """(group_id, sala) se quem chama é membro e está com a sala aberta nesta aba.
+
+    `fresh` confere a participação no banco (eventos de chave, ver app/groups.py).
+    """
+    group_id = int(data["group_id"])
+    room = group_room(group_id)
+    if not room_registry.in_room(request.sid, room):
+        raise GroupError("not_joined")
+    if groups.role(group_id, session["user_id"], fresh) is None:
+        raise GroupError("forbidden")
+    return group_id, room
+
+@socketio.on("create_group")
+@socket_authenticated
+@rate_limiter.limit_event("room_events")
+def create_group_event(data):
+    try:
+        group_id = groups.create(session["user_id"], data.get("name"), group_ids(data.get("members")))
+    except (GroupError, TypeError, ValueError) as exc:
+        return {"ok": False, "error": getattr(exc, "code", "invalid_payload")}
+
+    logger.info("grupo criado", extra={"group_id": group_id, "user_id": session["user_id"]})
+    notify_group_members("group_added", group_id, groups.members(group_id))
+    return {"ok": True, "group_id": group_id}
+
+@socketio.on("my_groups")
+@socket_authenticated
+def my_groups_event():
+    return {"ok": True, "groups": groups.user_groups(session["user_id"])}
+
+@socketio.on("add_group_members")
+@socket_authenticated
+@rate_limiter.limit_event("room_events")
+def add_group_members_event(data):
+    try:
+        group_id = int(data["group_id"])
+        added = groups.add_members(group_id, session["user_id"], group_ids(data.get("members")))
+    except (GroupError, TypeError, ValueError, KeyError) as exc:
+        return {"ok": False, "error": getattr(exc, "code", "invalid_payload")}
+
+    if added:
+        socketio.emit("group_members_changed", {"group_id": group_id, "added": added, "removed": []},
+                      to=group_room(group_id))
+        notify_group_members("group_added", group_id, added)
+    return {"ok": True, "added": added}
+
+@socketio.on("remove_group_member")
+@socket_authenticated
+@rate_limiter.limit_event("room_events")
+def remove_group_member_event(data):
+    # Sem user_id: o próprio usuário sai do grupo
+    actor_id = session["user_id"]
+    try:
+        group_id = int(data["group_id"])
+        user_id = int(data.get("user_id", actor_id))
+        removed = groups.remove_member(group_id, actor_id, user_id)
+    except (GroupError, TypeError, ValueError, KeyError) as exc:
+        return {"ok": False, "error": getattr(exc, "code", "invalid_payload")}
+    if not removed:
+        return {"ok": True, "removed": False}
+
+    # Tira as abas do removido da sala (as deste worker; nas outras as chaves
+    # já são recusadas, e as mensagens assim que o cache de membros expira)
+    room = group_room(group_id)
+    for sid in room_registry.user_sids(user_id):
+        if room_registry.in_room(sid, room):
+            leave_room(room, sid=sid)
+            for encoding in ENCODINGS:
+                leave_room(delivery_room(room, encoding), sid=sid)
+            if room_registry.leave(sid, room) is not None:
+                member_left(room, user_id)
+
+    # Quem fica troca a sender key: o removido não lê as próximas mensagens
+    socketio.emit("group_members_changed", {"group_id": group_id, "added": [], "removed": [user_id]}, to=room)
+    notify_group_members("group_removed", group_id, [user_id])
+    logger.info("membro removido do grupo", extra={"group_id": group_id, "user_id": user_id, "by": actor_id})
+    return {"ok": True, "removed": True}
+
+@socketio.on("join_group")
+@socket_authenticated
+@rate_limiter.limit_event("room_events")
+def join_group_event(data):
+    user_id = session["user_id"]
+    try:
+        group_id = int(data["group_id"])
+        since_seq = int(data.get("since_seq", 0))
+        members = groups.members(group_id)
+    except (GroupError, TypeError, ValueError, KeyError) as exc:
+        return {"ok": False, "error": getattr(exc, "code", "invalid_payload")}
+    if user_id not in members:
+        return {"ok": False, "error": "forbidden"}
+
+    room = group_room(group_id)
+    join_room(room)
+    join_room(delivery_room(room, session_encoding()))
+    room_registry.join(request.sid, user_id, room, session_encoding())
+    online = shared_state.add_member(room, user_id)
+    ensure_room_seq(room)
+
+    logger.info("entrou no grupo", extra={"room": room, "user_id": user_id})
+
+    # Histórico sempre (os outros membros podem estar offline); o cliente só decifra
+    # o que foi cifrado com sender keys que recebeu
+    page = room_history_page(room, since_seq, history_page_limit(data.get("limit")))
+    emit("load_history", encode_page(page, session_encoding()))
+
+    return {"ok": True, "group_id": group_id, "members": sorted(members), "online": sorted(online)}
+
+@socketio.on("leave_group")
+@socket_authenticated
+def leave_group_event(data):
+    # Fecha o grupo nesta aba; continua membro (para sair do grupo: remove_group_member)
+    user_id = session["user_id"]
+    try:
+        room = group_room(int(data["group_id"]))
+    except (TypeError, ValueError, KeyError):
+        return {"ok": False, "error": "invalid_payload"}
+
+    leave_room(room)
+    leave_room(delivery_room(room, session_encoding()))
+    if room_registry.leave(request.sid, room) is not None:
+        member_left(room, user_id)
+
+@socketio.on("send_group_message")
+@socket_authenticated
+@rate_limiter.limit_event("send_message")
+def send_group_message(data):
+    try:
+        _, room = current_group(data)
+    except (GroupError, TypeError, ValueError, KeyError) as exc:
+        return {"ok": False, "error": getattr(exc, "code", "invalid_payload")}
+    return publish_message(room, session["user_id"], data)
+
+@socketio.on("send_group_public_key")
+@socket_authenticated
+@rate_limiter.limit_event("room_events")
+def send_group_public_key(data):
+    # Chave ECDH desta aba: para a sala toda ao entrar, ou só para `to` em resposta
+    sender = session["user_id"]
+    try:
+        group_id, room = current_group(data, fresh=True)
+        dh_public_key = to_bytes(data["dh_public_key"])
+        to = int(data["to"]) if data.get("to") is not None else None
+    except (GroupError, InvalidPayload, TypeError, ValueError, KeyError) as exc:
+        return {"ok": False, "error": getattr(exc, "code", "invalid_payload")}
+
+    message = {"group_id": group_id, "sender": sender, "dh_public_key": dh_public_key, "reply": to is not None}
+    if to is None:
+        fanout.deliver("receive_group_public_key", room, message, skip_sid=request.sid)
+    elif to in groups.members(group_id):
+        fanout.deliver_to_user("receive_group_public_key", to, message)
+    return {"ok": True}
+
+@socketio.on("send_sender_key")
+@socket_authenticated
+@rate_limiter.limit_event("room_events")
+def send_sender_key(data):
+    # Sender key do remetente, cifrada par a par para cada destinatário:
+    # {group_id, keys: [{to, ciphertext, iv, mac}, ...]}
+    sender = session["user_id"]
+    try:
+        group_id, _ = current_group(data, fresh=True)
+        members = groups.members(group_id)
+        keys = [
+            (int(k["to"]), to_bytes(k["ciphertext"]), to_bytes(k["iv"]), to_bytes(k["mac"]))
+            for k in data["keys"][:len(members)]
+        ]
+    except (GroupError, InvalidPayload, TypeError, ValueError, KeyError) as exc:
+        return {"ok": False, "error": getattr(exc, "code", "invalid_payload")}
+
+    delivered = 0
+    for to, ciphertext, iv, mac in keys:
+        if to != sender and to in members:
+            fanout.deliver_to_user("receive_sender_key", to, {
+                "group_id": group_id, "sender": sender, "ciphertext": ciphertext, "iv": iv, "mac": mac,
+            })
+            delivered += 1
+    return {"ok": True, "delivered": delivered}
+
+#========== ANEXOS (ver app/attachments.py) ==================
+# O arquivo sobe cifrado, em blocos; a mensagem do chat leva só a referência.
+
+@socketio.on("create_attachment")
+@socket_authenticated
+@rate_limiter.limit_event("attachments")
+def create_attachment(data):
+    # Conversa a dois (receiver) ou grupo (group_id): só quem participa baixa o arquivo
+    user_id = session["user_id"]
+    try:
+        if data.get("group_id") is not None:
+            group_id = int(data["group_id"])
+            if groups.role(group_id, user_id) is None:
+                raise GroupError("forbidden")
+            room = group_room(group_id)
+        else:
+            room = build_room_name(user_id, int(data["receiver"]))
+        upload = attachments.create(user_id, room, int(data["size"]))
+    except (AttachmentError, GroupError, TypeError, ValueError, KeyError) as exc:
+        return {"ok": False, "error": getattr(exc, "code", "invalid_payload")}
+    return dict(upload, ok=True)
+
+@socketio.on("upload_attachment_chunk")
+@socket_authenticated
+@rate_limiter.limit_event("attachment_chunks")
+def upload_attachment_chunk(data):
+    # {id, index, data}: `data` em binário (ou base64); o ack traz o próximo bloco esperado
+    try:
+        upload = attachments.write_chunk(str(data["id"]), session["user_id"], int(data["index"]),
+                                         to_bytes(data["data"]))
+    except (AttachmentError, InvalidPayload, TypeError, ValueError, KeyError) as exc:
+        return {"ok": False, "error": getattr(exc, "code", "invalid_payload")}
+    return dict(upload, ok=True)
+
+@socketio.on("attachment_status")
+@socket_authenticated
+def attachment_status(data):
+    # Retomada: de onde continuar um envio interrompido
+    try:
+        upload = attachments.status(str(data["id"]), session["user_id"])
+    except (AttachmentError, TypeError, KeyError) as exc:
+        return {"ok": False, "error": getattr(exc, "code", "invalid_payload")}
+    return dict(upload, ok=True)
@@ -0,0 +1,59 @@
+"""
+Tempo de subida por fase, para acompanhar o cold start (deploys, CI).
+
+`create_app` e os pontos de entrada (serve.py, run.py) medem cada fase com
+``timer.phase(nome)``; o relatório sai no stdout quando o servidor está pronto para
+aceitar conexões, conforme STARTUP_REPORT:
+
+- ``text``: uma linha por fase, com o total;
+- ``json``: uma linha ``{"event": "startup", "total_ms": ..., "phases": {...}}`` para o CI;
+- ``off``: nada.
+"""
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    def __init__(self, start=None):
+        # `start` = time.perf_counter() do início do processo (antes dos imports)
+        self.start = start if start is not None else time.perf_counter()
+        self.phases = []                # [(nome, segundos)] na ordem em que terminaram
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def mark(self, name, since):
+        """Registra uma fase que começou em `since` (perf_counter) e termina agora."""
+        self.phases.append((name, time.perf_counter() - since))
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def as_dict(self):
+        return {
+            "event": "startup",
+            "total_ms": round(self.total() * 1000, 1),
+            "phases": {name: round(seconds * 1000, 1) for name, seconds in self.phases},
+        }
+
+    def report(self, fmt="text", stream=None):
+        stream = stream or sys.stdout
+        if fmt == "off":
+            return
+        if fmt == "json":
+            print(json.dumps(self.as_dict()), file=stream, flush=True)
+            return
+
+        total = self.total()
+        width = max((len(name) for name, _ in self.phases), default=0)
+        print("Subida:", file=stream)
+        for name, seconds in self.phases:
+            print(f"  {name:<{width}}  {seconds * 1000:8.1f} ms", file=stream)
+        print(f"  {'total':<{width}}  {total * 1000:8.1f} ms", file=stream, flush=True)
@@ -0,0 +1,201 @@
+// static/js/attachments.js
+// ChatAttachments: arquivos cifrados em blocos (AES-GCM) e enviados pelo Socket.IO
+// Exports functions via window.ChatAttachments
+//
+// Cada arquivo tem uma chave AES-GCM própria. O bloco i é cifrado com
+// iv = prefixo aleatório (8 bytes) || i (4 bytes) e com o índice e a marca de último
+// bloco como dado autenticado: blocos trocados de ordem ou um arquivo truncado não
+// decifram. O servidor só guarda os blocos cifrados; a chave vai dentro da mensagem
+// do chat (a referência), cifrada como qualquer outra mensagem.
+
+(function () {
+  const TAG_SIZE = 16;
+  const MARKER = "whatschat-attachment";
+  const ACK_TIMEOUT_MS = 15000;
+
+  function chunkIv(prefix, index) {
+    const iv = new Uint8Array(12);
+    iv.set(prefix, 0);
+    new DataView(iv.buffer).setUint32(8, index);
+    return iv;
+  }
+
+  function chunkAad(index, last) {
+    const aad = new Uint8Array(5);
+    new DataView(aad.buffer).setUint32(0, index);
+    aad[4] = last ? 1 : 0;
+    return aad;
+  }
+
+  function waitForConnect(socket) {
+    if (socket.connected) return Promise.resolve();
+    return new Promise((resolve) => socket.once("connect", resolve));
+  }
+
+  async function call(socket, event, payload) {
+    await waitForConnect(socket);
+    return await socket.timeout(ACK_TIMEOUT_MS).emitWithAck(event, payload);
+  }
+
+  // target: { receiver } (conversa a dois) ou { group_id }
+  // binary: enviar os blocos como anexos binários (senão base64)
+  async function upload(socket, target, file, { binary = true, onProgress } = {}) {
+    const created = await call(socket, "create_attachment", Object.assign({ size: file.size }, target));
+    if (!created || !created.ok) {
+      throw new Error(created ? created.error : "sem resposta");
+    }
+
+    const key = await crypto.subtle.generateKey({ name: "AES-GCM", length: 256 }, true, ["encrypt", "decrypt"]);
+    const prefix = crypto.getRandomValues(new Uint8Array(8));
+    const plainChunk = created.chunk_size - TAG_SIZE;
+    const total = created.total_chunks;
+
+    let index = created.next;
+    while (index < total) {
+      // Só o bloco atual fica em memória
+      const last = index === total - 1;
+      const plain = await file.slice(index * plainChunk, (index + 1) * plainChunk).arrayBuffer();
+      const encrypted = await crypto.subtle.encrypt(
+        { name: "AES-GCM", iv: chunkIv(prefix, index), additionalData: chunkAad(index, last) },
+        key,
+        plain
+      );
+
+      let ack;
+      try {
+        ack = await call(socket, "upload_attachment_chunk", {
+          id: created.id,
+          index,
+          data: binary ? encrypted : ChatCrypto.abToBase64(encrypted)
+        });
+      } catch (err) {
+        // Sem ack (queda da conexão): pergunta ao servidor de onde continuar
+        const status = await call(socket, "attachment_status", { id: created.id }).catch(() => null);
+        if (status && !status.ok) throw new Error(status.error);
+        if (status) index = status.next;
+        continue;
+      }
+
+      if (ack && ack.ok) {
+        index = ack.next;
+      } else if (ack && ack.error === "rate_limited") {
+        await new Promise((resolve) => setTimeout(resolve, ack.retry_after_ms || 50));
+      } else {
+        throw new Error(ack ? ack.error : "sem resposta");
+      }
+      if (onProgress) onProgress(Math.min(index, total) / total);
+    }
+
+    return {
+      type: MARKER,
+      id: created.id,
+      name: file.name,
+      mime: file.type || "application/octet-stream",
+      size: file.size,
+      chunk_size: created.chunk_size,
+      key: ChatCrypto.abToBase64(await crypto.subtle.exportKey("raw", key)),
+      nonce: ChatCrypto.abToBase64(prefix.buffer)
+    };
+  }
+
+  // Baixa e decifra bloco a bloco, conforme os bytes chegam; devolve um Blob
+  async function download(ref) {
+    const response = await fetch(`/attachments/${encodeURIComponent(ref.id)}`);
+    if (!response.ok) {
+      throw new Error(`Falha ao baixar o anexo (${response.status})`);
+    }
+
+    const key = await crypto.subtle.importKey("raw", ChatCrypto.base64ToAb(ref.key), { name: "AES-GCM" }, false, ["decrypt"]);
+    const prefix = new Uint8Array(ChatCrypto.base64ToAb(ref.nonce));
+    const total = Math.max(1, Math.ceil(ref.size / (ref.chunk_size - TAG_SIZE)));
+    const parts = [];
+
+    let buffer = new Uint8Array(0);
+    let index = 0;
+    const decryptChunk = async (chunk) => {
+      const plain = await crypto.subtle.decrypt(
+        { name: "AES-GCM", iv: chunkIv(prefix, index), additionalData: chunkAad(index, index === total - 1) },
+        key,
+        chunk
+      );
+      parts.push(plain);
+      index++;
+    };
+
+    const reader = response.body.getReader();
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      const merged = new Uint8Array(buffer.length + value.length);
+      merged.set(buffer, 0);
+      merged.set(value, buffer.length);
+      buffer = merged;
+      // Mantém o último bloco completo no buffer: só no fim sabemos que é o último
+      while (buffer.length > ref.chunk_size) {
+        await decryptChunk(buffer.slice(0, ref.chunk_size));
+        buffer = buffer.slice(ref.chunk_size);
+      }
+    }
+    await decryptChunk(buffer);
+
+    if (index !== total) {
+      throw new Error("Anexo incompleto.");
+    }
+    return new Blob(parts, { type: ref.mime });
+  }
+
+  // Clique no anexo: baixa, decifra e entrega ao navegador como download
+  async function save(ref, button) {
+    const label = button ? button.textContent : "";
+    if (button) {
+      button.disabled = true;
+      button.textContent = "Baixando...";
+    }
+    try {
+      const url = URL.createObjectURL(await download(ref));
+      const link = document.createElement("a");
+      link.href = url;
+      link.download = ref.name || "anexo";
+      link.click();
+      setTimeout(() => URL.revokeObjectURL(url), 10000);
+    } catch (err) {
+      console.error("Erro ao baixar ou decifrar o anexo:", err);
+      alert("Não foi possível abrir o anexo.");
+    } finally {
+      if (button) {
+        button.disabled = false;
+        button.textContent = label;
+      }
+    }
+  }
+
+  // Referência <-> texto da mensagem do chat
+  function encodeReference(ref) {
+    return JSON.stringify(ref);
+  }
+
+  function parseReference(text) {
+    if (!text || text[0] !== "{") return null;
+    try {
+      const ref = JSON.parse(text);
+      return ref && ref.type === MARKER && ref.id && ref.key ? ref : null;
+    } catch (e) {
+      return null;
+    }
+  }
+
+  function formatSize(bytes) {
+    if (bytes < 1024) return `${bytes} B`;
+    if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+    return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+  }
+
+  window.ChatAttachments = {
+    upload,
+    download,
+    save,
+    encodeReference,
+    parseReference,
+    formatSize
+  };
+})();
@@ -2,7 +2,14 @@
 // Lógica: Socket.IO, handshake ECDH, criptografia AES-GCM + HMAC
 // Depende de window.ChatUI (UI) e window.ChatCrypto (criptografia)
 
-window.socket = io();
+// Pede os campos cifrados como anexos binários; o servidor confirma em "connected".
+// Servidores antigos não respondem o modo e seguimos em base64.
+window.socket = io({ transports: socketTransports(), auth: { encoding: "binary" } });
+let wireEncoding = "base64";
+
+socket.on("connected", (info) => {
+  wireEncoding = info && info.encoding === "binary" ? "binary" : "base64";
+});
 
 document.addEventListener("DOMContentLoaded", async () => {
   // =========================================================
@@ -27,9 +34,15 @@ document.addEventListener("DOMContentLoaded", async () => {
   // =========================================================
   // 2) Entrar na sala
   // =========================================================
+  // Cursor do histórico: última sequência já recebida nesta aba.
+  // Ao reconectar, o servidor só envia o que chegou depois dele.
+  const cursorKey = `history_cursor_${myId}_${otherUserId}`;
+  const savedCursor = Number(sessionStorage.getItem(cursorKey)) || 0;
+
   socket.emit("join", {
     user1_id: myId,
-    user2_id: Number(otherUserId)
+    user2_id: Number(otherUserId),
+    since_seq: savedCursor
   });
 
   // UI começa desabilitada em chat_style.js
@@ -41,6 +54,7 @@ document.addEventListener("DOMContentLoaded", async () => {
   console.log("Gerando par DH local...");
   const myDH = await ChatCrypto.generateDHKeyPair();
   const myPublicKeyB64 = await ChatCrypto.exportDHPublicKeyBase64(myDH.publicKey);
+  const myPublicKeyRaw = await ChatCrypto.exportDHPublicKeyRaw(myDH.publicKey);
 
   // Armazena estado E2EE na janela
   window.E2EE = {
@@ -48,16 +62,109 @@ document.addEventListener("DOMContentLoaded", async () => {
     otherUserId: Number(otherUserId),
     myDH,
     myPublicKeyB64,
+    myPublicKeyRaw,
     otherPublicKey: null,
     aesKey: null,
     hmacKey: null,
 
+    // "prekey": chaves derivadas do bundle publicado pelo outro usuário;
+    // "dh": troca de chaves ao vivo (outro lado sem bundle ou cliente antigo)
+    mode: null,
+
     // flags de controle
     myKeySent: false,
     theirKeyReceived: false,
-    keysDerived: false
+    keysDerived: false,
+
+    // histórico paginado
+    historyCursor: savedCursor,
+    pendingHistory: []
   };
 
+  // =========================================================
+  // 3b) Prekeys: publica o nosso bundle e busca o do outro usuário
+  // Com o bundle dele as chaves saem na hora, sem esperar resposta;
+  // sem bundle, seguimos com a troca ao vivo (send_dh_public_key).
+  // =========================================================
+  const prekeysLoaded = (async () => {
+    let prekeys;
+    try {
+      prekeys = await ChatCrypto.loadOrCreatePrekeys(myId);
+    } catch (err) {
+      console.warn("Prekeys indisponíveis, usando troca ao vivo:", err);
+      return null;
+    }
+
+    // Uma vez por sessão da aba; o servidor ignora um bundle igual ao que já tem
+    const publishedKey = `prekey_published_${myId}`;
+    if (sessionStorage.getItem(publishedKey) !== String(prekeys.prekeyId)) {
+      const exportBundle = wireEncoding === "binary" ? ChatCrypto.exportPrekeyBundleRaw : ChatCrypto.exportPrekeyBundle;
+      socket.emit("upload_prekey_bundle", await exportBundle(prekeys), (ack) => {
+        if (ack && ack.ok) sessionStorage.setItem(publishedKey, String(prekeys.prekeyId));
+      });
+    }
+    return prekeys;
+  })();
+
+  // Também chamada de novo quando o outro lado entra na sala (ver load_history)
+  async function derivePrekeyKeys() {
+    const prekeys = await prekeysLoaded;
+    if (!prekeys) return false;
+
+    const ack = await new Promise((resolve) => {
+      socket.emit("fetch_prekey_bundle", { user_id: Number(otherUserId) }, resolve);
+    });
+    if (!ack || !ack.ok) return false;
+
+    try {
+      const theirPrekey = await ChatCrypto.verifyPrekeyBundle(ack.bundle);
+      const { K_enc, K_mac } = await ChatCrypto.deriveSessionKeysFromPeer(prekeys.prekey.privateKey, theirPrekey);
+      // A troca ao vivo pode ter terminado primeiro
+      if (window.E2EE.keysDerived) return false;
+      window.E2EE.aesKey = K_enc;
+      window.E2EE.hmacKey = K_mac;
+    } catch (err) {
+      console.error("Bundle de prekey inválido:", err);
+      return false;
+    }
+
+    window.E2EE.mode = "prekey";
+    window.E2EE.keysDerived = true;
+    console.log("Chaves derivadas da prekey do interlocutor. Criptografia ponta a ponta habilitada.");
+    window.ChatUI.enableChatUI();
+    await renderPendingHistory();
+    return true;
+  }
+  const prekeyReady = derivePrekeyKeys();
+
+  function sendMyPublicKey() {
+    socket.emit("send_dh_public_key", {
+      sender: window.E2EE.myId,
+      receiver: window.E2EE.otherUserId,
+      dh_public_key: myPublicKeyForWire()
+    });
+    window.E2EE.myKeySent = true;
+  }
+
+  async function renderPendingHistory() {
+    const pending = window.E2EE.pendingHistory;
+    window.E2EE.pendingHistory = [];
+    for (const msg of pending) {
+      await renderEncryptedMessage(msg);
+    }
+  }
+
+  function myPublicKeyForWire() {
+    return wireEncoding === "binary" ? window.E2EE.myPublicKeyRaw : window.E2EE.myPublicKeyB64;
+  }
+
+  function advanceCursor(seq) {
+    if (typeof seq === "number" && seq > window.E2EE.historyCursor) {
+      window.E2EE.historyCursor = seq;
+      sessionStorage.setItem(cursorKey, String(seq));
+    }
+  }
+
   // =========================================================
   // Listener: receber DH público do interlocutor
   // (registra antes de enviar nossa chave)
@@ -65,13 +172,15 @@ document.addEventListener("DOMContentLoaded", async () => {
   socket.on("receive_dh_public_key", async (data) => {
     console.log("receive_dh_public_key evento:", data);
     const sender = data.sender;
-    const remoteKeyB64 = data.dh_public_key;
+    const remoteKeyData = data.dh_public_key;
 
     // Ignore echoes of our own send (server may retransmit)
     if (sender === window.E2EE.myId) return;
 
-    // If keys already derived, ignore subsequent DH public keys
-    if (window.E2EE.keysDerived) {
+    // If keys already derived, ignore subsequent DH public keys.
+    // Com chaves da prekey, uma chave DH significa que o outro lado não tem o nosso
+    // bundle (cliente antigo ou publicado depois): passamos para a troca ao vivo.
+    if (window.E2EE.keysDerived && window.E2EE.mode !== "prekey") {
       console.log("Chaves já derivadas — ignorando chave pública adicional.");
       window.E2EE.theirKeyReceived = true;
       return;
@@ -82,7 +191,7 @@ document.addEventListener("DOMContentLoaded", async () => {
     // Import remote public key
     let remoteKey;
     try {
-      remoteKey = await ChatCrypto.importDHPublicKeyBase64(remoteKeyB64);
+      remoteKey = await ChatCrypto.importDHPublicKeyBase64(remoteKeyData);
     } catch (err) {
       console.error("Erro ao importar chave pública remota:", err);
       return;
@@ -91,18 +200,15 @@ document.addEventListener("DOMContentLoaded", async () => {
     window.E2EE.otherPublicKey = remoteKey;
     window.E2EE.theirKeyReceived = true;
 
-    // If for some reason we never sent our key (shouldn't happen normally),
-    // send it once now to ensure both sides have each other's public.
-    if (!window.E2EE.myKeySent) {
-      console.log("Ainda não havia enviado minha chave — reenviando agora (uma vez).");
-      console.log("Emitindo send_dh_public_key ->", window.E2EE.myPublicKeyB64.slice(0, 40));
-      socket.emit("send_dh_public_key", {
-        sender: window.E2EE.myId,
-        receiver: window.E2EE.otherUserId,
-        dh_public_key: window.E2EE.myPublicKeyB64
-      });
-      window.E2EE.myKeySent = true;
-    }
+    // Responde com a nossa chave: se entramos primeiro (histórico persistente),
+    // ela foi para a sala vazia e o outro lado nunca a recebeu. Quem já derivou ignora.
+    console.log("Respondendo com minha chave pública ->", window.E2EE.myPublicKeyB64.slice(0, 40));
+    socket.emit("send_dh_public_key", {
+      sender: window.E2EE.myId,
+      receiver: window.E2EE.otherUserId,
+      dh_public_key: myPublicKeyForWire()
+    });
+    window.E2EE.myKeySent = true;
 
     // Derive session keys once
     try {
@@ -115,9 +221,13 @@ document.addEventListener("DOMContentLoaded", async () => {
       window.E2EE.aesKey = K_enc;
       window.E2EE.hmacKey = K_mac;
       window.E2EE.keysDerived = true;
+      window.E2EE.mode = "dh";
 
       console.log("Handshake concluído. Criptografia ponta a ponta habilitada.");
       window.ChatUI.enableChatUI();
+
+      // Mensagens do histórico que chegaram antes das chaves
+      await renderPendingHistory();
     } catch (err) {
       console.error("Erro ao derivar chaves de sessão:", err);
     }
@@ -126,17 +236,46 @@ document.addEventListener("DOMContentLoaded", async () => {
   // =========================================================
   // Listener: load_history — só após isso enviamos nossa DH pública
   // (load_history confirma que o servidor nos colocou na sala)
+  // Cada evento traz uma página: { messages, last_seq, has_more }
   // =========================================================
-  socket.on("load_history", (history) => {
+  socket.on("load_history", async (page) => {
     console.log("load_history recebido — entramos na sala, podemos enviar DH público.");
 
-    if (!window.E2EE.myKeySent) {
-      socket.emit("send_dh_public_key", {
-        sender: window.E2EE.myId,
-        receiver: window.E2EE.otherUserId,
-        dh_public_key: window.E2EE.myPublicKeyB64
+    // Com o bundle do outro lado não há troca ao vivo
+    const usingPrekey = await prekeyReady;
+    if (!usingPrekey && !window.E2EE.myKeySent) {
+      sendMyPublicKey();
+    } else if (!window.E2EE.keysDerived && page.joined === window.E2EE.otherUserId) {
+      // Entramos sozinhos (histórico persistente) e a nossa chave foi para a sala vazia.
+      // O outro lado acabou de entrar: se ele publicou um bundle, derivamos dele (é o
+      // que ele fez com o nosso); senão reenviamos a chave para a troca ao vivo
+      if (!(await derivePrekeyKeys())) sendMyPublicKey();
+    }
+
+    // O servidor recomeça do início quando o histórico da sala foi recriado
+    if (page.last_seq < window.E2EE.historyCursor) {
+      window.E2EE.historyCursor = 0;
+    }
+
+    const messages = page.messages || [];
+    for (const msg of messages) {
+      if (msg.seq <= window.E2EE.historyCursor) continue;
+      advanceCursor(msg.seq);
+
+      if (window.E2EE.keysDerived) {
+        await renderEncryptedMessage(msg);
+      } else {
+        window.E2EE.pendingHistory.push(msg);
+      }
+    }
+
+    // Pede a próxima página enquanto houver mensagens depois do cursor
+    if (window.E2EE.historyCursor < page.last_seq && (page.has_more || messages.length === 0)) {
+      socket.emit("load_history", {
+        user_id: window.E2EE.myId,
+        other_id: window.E2EE.otherUserId,
+        since_seq: window.E2EE.historyCursor
       });
-      window.E2EE.myKeySent = true;
     }
   });
 
@@ -152,30 +291,60 @@ document.addEventListener("DOMContentLoaded", async () => {
     const plaintext = window.ChatUI.getAndClearInput();
     if (!plaintext.trim()) return;
 
-    const encrypted = await ChatCrypto.encryptMessage(
+    await sendText(plaintext);
+  };
+
+  // Anexo: o arquivo sobe cifrado em blocos; a mensagem leva só a referência
+  window.sendAttachment = async function (file) {
+    if (!window.E2EE.aesKey || !window.E2EE.hmacKey) {
+      alert("Aguardando conclusão do handshake seguro...");
+      return;
+    }
+
+    let ref;
+    try {
+      ref = await ChatAttachments.upload(socket, { receiver: window.E2EE.otherUserId }, file, {
+        binary: wireEncoding === "binary"
+      });
+    } catch (err) {
+      alert(`Não foi possível enviar o arquivo (${err.message}).`);
+      return;
+    }
+    await sendText(ChatAttachments.encodeReference(ref));
+  };
+
+  async function sendText(plaintext) {
+    // Binário: ArrayBuffers vão como anexos, sem o custo do base64
+    const encrypt = wireEncoding === "binary" ? ChatCrypto.encryptMessageRaw : ChatCrypto.encryptMessage;
+    const encrypted = await encrypt(
       window.E2EE.aesKey,
       window.E2EE.hmacKey,
       plaintext
     );
 
-    socket.emit("send_message", {
+    emitMessage({
       sender: window.E2EE.myId,
       receiver: window.E2EE.otherUserId,
       ciphertext: encrypted.ciphertext,
       iv: encrypted.iv,
       mac: encrypted.mac
     });
-  };
+  }
+
+  // Se a sala estiver com a fila de saída cheia (ou o usuário acima do limite de
+  // envio), o servidor recusa a mensagem e informa em quanto tempo tentar de novo
+  function emitMessage(payload) {
+    socket.emit("send_message", payload, (ack) => {
+      if (ack && ack.ok === false && (ack.error === "backpressure" || ack.error === "rate_limited")) {
+        setTimeout(() => emitMessage(payload), ack.retry_after_ms || 50);
+      }
+    });
+  }
 
   // =========================================================
   // 5) Receber mensagem criptografada
   // =========================================================
-  socket.on("receive_message", async (data) => {
-    if (!window.E2EE.aesKey || !window.E2EE.hmacKey) {
-      console.warn("Mensagem recebida antes do handshake; ignorada.");
-      return;
-    }
-
+  async function renderEncryptedMessage(data) {
     let plaintext = "";
     try {
       plaintext = await ChatCrypto.decryptMessage(
@@ -190,12 +359,41 @@ document.addEventListener("DOMContentLoaded", async () => {
       return;
     }
 
+    const attachment = ChatAttachments.parseReference(plaintext);
+    if (attachment) {
+      window.ChatUI.appendAttachment({ sender: data.sender, attachment }, window.E2EE.myId, ChatAttachments.save);
+      return;
+    }
+
     window.ChatUI.appendMessage(
       { sender: data.sender, message: plaintext },
       window.E2EE.myId
     );
+  }
+
+  async function receiveEncryptedMessage(data) {
+    advanceCursor(data.seq);
+
+    if (!window.E2EE.aesKey || !window.E2EE.hmacKey) {
+      console.warn("Mensagem recebida antes do handshake; ignorada.");
+      return;
+    }
+
+    await renderEncryptedMessage(data);
+  }
+
+  socket.on("receive_message", receiveEncryptedMessage);
+
+  // Lote de mensagens da sala (fan-out em micro-lotes), já em ordem de seq
+  socket.on("receive_messages", async (batch) => {
+    for (const msg of batch.messages) {
+      await receiveEncryptedMessage(msg);
+    }
   });
 
+  // Heartbeat: mantém este usuário online no registro de presença
+  setInterval(() => socket.emit("heartbeat"), 20000);
+
   // =========================================================
   // 6) Evento leave
   // =========================================================
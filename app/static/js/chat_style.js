@@ -7,15 +7,29 @@
   let messagesList = null;
   let msgInput = null;
   let btnSend = null;
+  let btnAttach = null;
+  let fileInput = null;
 
   // Helpers internos
   function ensureElements() {
     if (!messagesList) messagesList = document.getElementById("messages");
     if (!msgInput) msgInput = document.getElementById("msgInput");
     if (!btnSend) btnSend = document.getElementById("btnSend");
+    if (!btnAttach) btnAttach = document.getElementById("btnAttach");
+    if (!fileInput) fileInput = document.getElementById("fileInput");
   }
 
-  // Render a single message object: { sender, message }
+  function senderLabel(data, myId) {
+    const headerInfo = document.querySelector(".chat-header small");
+    let displayName = "";
+    if (headerInfo) {
+      const rawText = headerInfo.innerText || "";
+      displayName = rawText.replace("Conectado com", "").trim();
+    }
+    return data.sender === myId ? "Você" : data.senderName || displayName || "Interlocutor";
+  }
+
+  // Render a single message object: { sender, message, senderName? (grupos) }
   function appendMessage(data, myId) {
     ensureElements();
 
@@ -29,13 +43,7 @@
     }
 
     // Monta o conteúdo visual
-    const headerInfo = document.querySelector(".chat-header small");
-    let displayName = "";
-    if (headerInfo) {
-      const rawText = headerInfo.innerText || "";
-      displayName = rawText.replace("Conectado com", "").trim();
-    }
-    const senderName = data.sender === myId ? "Você" : displayName || "Interlocutor";
+    const senderName = senderLabel(data, myId);
 
     // NOTE: 'data.message' is expected to be plaintext here.
     li.innerHTML = `
@@ -47,17 +55,41 @@
     messagesList.scrollTop = messagesList.scrollHeight;
   }
 
+  // Render an attachment: { sender, senderName?, attachment: {name, size, ...} }
+  // onOpen(attachment, button) baixa e decifra (chat.js / group.js)
+  function appendAttachment(data, myId, onOpen) {
+    ensureElements();
+
+    const li = document.createElement("li");
+    li.classList.add("message-bubble", data.sender === myId ? "my-message" : "other-message");
+
+    const sender = document.createElement("span");
+    sender.className = "message-sender";
+    sender.textContent = senderLabel(data, myId);
+
+    const button = document.createElement("button");
+    button.className = "message-attachment";
+    button.textContent = `📎 ${data.attachment.name} (${window.ChatAttachments.formatSize(data.attachment.size)})`;
+    button.addEventListener("click", () => onOpen(data.attachment, button));
+
+    li.append(sender, button);
+    messagesList.appendChild(li);
+    messagesList.scrollTop = messagesList.scrollHeight;
+  }
+
   // UI enable/disable helpers (used while handshake)
   function disableChatUI() {
     ensureElements();
     if (msgInput) msgInput.setAttribute("disabled", "disabled");
     if (btnSend) btnSend.setAttribute("disabled", "disabled");
+    if (btnAttach) btnAttach.setAttribute("disabled", "disabled");
   }
 
   function enableChatUI() {
     ensureElements();
     if (msgInput) msgInput.removeAttribute("disabled");
     if (btnSend) btnSend.removeAttribute("disabled");
+    if (btnAttach) btnAttach.removeAttribute("disabled");
     if (msgInput) msgInput.focus();
   }
 
@@ -99,6 +131,21 @@
       });
     }
 
+    // Anexo: o botão abre o seletor; o arquivo escolhido vai para window.sendAttachment
+    if (btnAttach && fileInput) {
+      btnAttach.addEventListener("click", () => fileInput.click());
+      fileInput.addEventListener("change", () => {
+        const file = fileInput.files[0];
+        fileInput.value = "";
+        if (!file) return;
+        if (typeof window.sendAttachment === "function") {
+          window.sendAttachment(file);
+        } else {
+          console.warn("sendAttachment not available yet.");
+        }
+      });
+    }
+
     if (msgInput) {
       msgInput.addEventListener("keypress", (e) => {
         if (e.key === "Enter") {
@@ -115,6 +162,7 @@
   // Expose a UI API that chat.js will use.
   window.ChatUI = {
     appendMessage,     // (data, myId) => void
+    appendAttachment,  // (data, myId, onOpen) => void
     disableChatUI,     // () => void
     enableChatUI,      // () => void
     getAndClearInput,  // () => string
@@ -25,6 +25,16 @@
     return bytes.buffer;
   }
 
+  // Campos que chegam do servidor: string base64 (modo antigo) ou binário (ArrayBuffer)
+  function toArrayBuffer(value) {
+    if (typeof value === "string") return base64ToAb(value);
+    if (value instanceof ArrayBuffer) return value;
+    if (ArrayBuffer.isView(value)) {
+      return value.buffer.slice(value.byteOffset, value.byteOffset + value.byteLength);
+    }
+    throw new Error("Campo binário em formato desconhecido");
+  }
+
   // ---------- Key export/import (ECDH public key raw format) ----------
   async function exportPublicKeyRawBase64(publicKey) {
     // For ECDH P-256 we export as "raw" (X||Y)
@@ -33,7 +43,7 @@
   }
 
   async function importPublicKeyRawBase64(base64) {
-    const ab = base64ToAb(base64);
+    const ab = toArrayBuffer(base64);
     return await crypto.subtle.importKey(
       "raw",
       ab,
@@ -147,7 +157,8 @@
   }
 
   // ---------- AES-GCM encryption + HMAC creation ----------
-  async function encryptMessage(K_enc, K_mac, plaintext) {
+  // Versão binária: devolve ArrayBuffers, enviados como anexos binários do Socket.IO
+  async function encryptMessageRaw(K_enc, K_mac, plaintext) {
     // plaintext: string
     const iv = crypto.getRandomValues(new Uint8Array(12)); // 96-bit recommended
     const ptBuf = enc.encode(plaintext);
@@ -170,19 +181,30 @@
       concat.buffer
     ); // ArrayBuffer
 
+    return {
+      ciphertext: ciphertextBuf,
+      iv: iv.buffer,
+      mac: macBuf
+    };
+  }
+
+  async function encryptMessage(K_enc, K_mac, plaintext) {
+    const raw = await encryptMessageRaw(K_enc, K_mac, plaintext);
+
     // Return base64-encoded fields
     return {
-      ciphertext: abToBase64(ciphertextBuf),
-      iv: abToBase64(iv.buffer),
-      mac: abToBase64(macBuf)
+      ciphertext: abToBase64(raw.ciphertext),
+      iv: abToBase64(raw.iv),
+      mac: abToBase64(raw.mac)
     };
   }
 
   // ---------- Verify HMAC + AES-GCM decrypt ----------
+  // Aceita os campos em base64 ou binários
   async function decryptMessage(K_enc, K_mac, ciphertext_b64, iv_b64, mac_b64) {
-    const ciphertextBuf = base64ToAb(ciphertext_b64);
-    const ivBuf = base64ToAb(iv_b64);
-    const macBuf = base64ToAb(mac_b64);
+    const ciphertextBuf = toArrayBuffer(ciphertext_b64);
+    const ivBuf = toArrayBuffer(iv_b64);
+    const macBuf = toArrayBuffer(mac_b64);
 
     // Recompute HMAC over ciphertext||iv
     const concat = new Uint8Array(ciphertextBuf.byteLength + ivBuf.byteLength);
@@ -210,6 +232,98 @@
     return dec.decode(plaintextBuf);
   }
 
+  // ---------- Sender keys (grupos) ----------
+  // Cada membro cifra as suas mensagens do grupo uma única vez com a própria sender key
+  // (AES-GCM 256) e as assina (ECDSA P-256); a sender key vai para os outros membros
+  // pelos canais par a par (encryptMessageRaw), só quando é criada ou trocada.
+  // Formato do ciphertext: keyId (4 bytes, big-endian) || AES-GCM; o keyId também
+  // entra como dado autenticado do AES-GCM. O "mac" é a assinatura de ciphertext||iv.
+  async function generateSenderKey() {
+    const id = crypto.getRandomValues(new Uint32Array(1))[0];
+    const key = await crypto.subtle.generateKey({ name: "AES-GCM", length: 256 }, true, ["encrypt", "decrypt"]);
+    const signing = await generateSigningKeyPair();
+    return { id, key, signing };
+  }
+
+  // Serializa a parte pública (chave AES + chave de verificação) para enviar aos membros
+  async function exportSenderKey(senderKey) {
+    const key = await crypto.subtle.exportKey("raw", senderKey.key);
+    const verify = await crypto.subtle.exportKey("raw", senderKey.signing.publicKey);
+    return JSON.stringify({ id: senderKey.id, key: abToBase64(key), verify: abToBase64(verify) });
+  }
+
+  async function importSenderKey(serialized) {
+    const data = JSON.parse(serialized);
+    const key = await crypto.subtle.importKey("raw", base64ToAb(data.key), { name: "AES-GCM" }, false, ["decrypt"]);
+    const verifyKey = await crypto.subtle.importKey(
+      "raw",
+      base64ToAb(data.verify),
+      { name: "ECDSA", namedCurve: "P-256" },
+      false,
+      ["verify"]
+    );
+    return { id: data.id >>> 0, key, verifyKey };
+  }
+
+  function senderKeyId(ciphertext) {
+    const buf = toArrayBuffer(ciphertext);
+    if (buf.byteLength < 4) return null;
+    return new DataView(buf).getUint32(0);
+  }
+
+  async function encryptGroupMessageRaw(senderKey, plaintext) {
+    const iv = crypto.getRandomValues(new Uint8Array(12));
+    const header = new Uint8Array(4);
+    new DataView(header.buffer).setUint32(0, senderKey.id);
+
+    const body = await crypto.subtle.encrypt(
+      { name: "AES-GCM", iv: iv, additionalData: header },
+      senderKey.key,
+      enc.encode(plaintext)
+    );
+
+    const ciphertext = new Uint8Array(4 + body.byteLength);
+    ciphertext.set(header, 0);
+    ciphertext.set(new Uint8Array(body), 4);
+
+    const signed = new Uint8Array(ciphertext.byteLength + iv.byteLength);
+    signed.set(ciphertext, 0);
+    signed.set(iv, ciphertext.byteLength);
+    const mac = await signDataECDSA(senderKey.signing.privateKey, signed);
+
+    return { ciphertext: ciphertext.buffer, iv: iv.buffer, mac };
+  }
+
+  async function encryptGroupMessage(senderKey, plaintext) {
+    const raw = await encryptGroupMessageRaw(senderKey, plaintext);
+    return {
+      ciphertext: abToBase64(raw.ciphertext),
+      iv: abToBase64(raw.iv),
+      mac: abToBase64(raw.mac)
+    };
+  }
+
+  // receivedKey: resultado de importSenderKey; campos em base64 ou binários
+  async function decryptGroupMessage(receivedKey, ciphertext_b64, iv_b64, mac_b64) {
+    const ciphertextBuf = toArrayBuffer(ciphertext_b64);
+    const ivBuf = toArrayBuffer(iv_b64);
+    const macBuf = toArrayBuffer(mac_b64);
+
+    const signed = new Uint8Array(ciphertextBuf.byteLength + ivBuf.byteLength);
+    signed.set(new Uint8Array(ciphertextBuf), 0);
+    signed.set(new Uint8Array(ivBuf), ciphertextBuf.byteLength);
+    if (!(await verifySignatureECDSA(receivedKey.verifyKey, macBuf, signed))) {
+      throw new Error("Assinatura inválida — integrity check failed.");
+    }
+
+    const plaintextBuf = await crypto.subtle.decrypt(
+      { name: "AES-GCM", iv: new Uint8Array(ivBuf), additionalData: new Uint8Array(ciphertextBuf, 0, 4) },
+      receivedKey.key,
+      new Uint8Array(ciphertextBuf, 4)
+    );
+    return dec.decode(plaintextBuf);
+  }
+
   // ---------- Convenience: export/import session public key (raw base64) ----------
   async function exportDHPublicKeyBase64(publicKey) {
     return await exportPublicKeyRawBase64(publicKey);
@@ -219,6 +333,10 @@
     return await importPublicKeyRawBase64(base64);
   }
 
+  async function exportDHPublicKeyRaw(publicKey) {
+    return await crypto.subtle.exportKey("raw", publicKey);
+  }
+
   // ---------- Persistence helpers (very small, with notes) ----------
   // NOTE: Best practice is to keep private keys non-exportable and rely on browser's storage
   // (IndexedDB) to persist CryptoKey objects. For portability and simplicity in this project,
@@ -308,6 +426,76 @@
     return kp;
   }
 
+  // ---------- Prekeys: sessão sem o outro lado online ----------
+  // Cada usuário mantém no IndexedDB um par ECDH de longa duração (signed prekey) e um
+  // par ECDSA de identidade que assina a parte pública. O bundle público vai uma vez
+  // para o servidor; quem abre a conversa busca o bundle do outro e deriva as mesmas
+  // chaves que ele derivará com o nosso (ECDH prekey x prekey), sem esperar resposta.
+  async function loadOrCreatePrekeys(userId) {
+    const storageKey = `prekeys_${userId}`;
+    try {
+      const saved = await loadCryptoKeyFromIDB(storageKey);
+      if (saved && saved.identity && saved.prekey) return saved;
+    } catch (e) {
+      // IndexedDB indisponível: segue com chaves novas
+    }
+
+    const identity = await crypto.subtle.generateKey(
+      { name: "ECDSA", namedCurve: "P-256" },
+      false,
+      ["sign", "verify"]
+    );
+    const prekey = await generateDHKeyPair();
+    const prekeyId = crypto.getRandomValues(new Uint32Array(1))[0] & 0x7fffffff;
+    const record = { identity, prekey, prekeyId };
+    try {
+      await saveCryptoKeyToIDB(storageKey, record);
+    } catch (e) {
+      console.warn("Persisting prekeys to IndexedDB failed:", e);
+    }
+    return record;
+  }
+
+  // Partes públicas para o upload_prekey_bundle (ArrayBuffers)
+  async function exportPrekeyBundleRaw(record) {
+    const identityKey = await crypto.subtle.exportKey("raw", record.identity.publicKey);
+    const signedPrekey = await crypto.subtle.exportKey("raw", record.prekey.publicKey);
+    const signature = await signDataECDSA(record.identity.privateKey, signedPrekey);
+    return {
+      identity_key: identityKey,
+      signed_prekey: signedPrekey,
+      signature,
+      prekey_id: record.prekeyId
+    };
+  }
+
+  async function exportPrekeyBundle(record) {
+    const raw = await exportPrekeyBundleRaw(record);
+    return {
+      identity_key: abToBase64(raw.identity_key),
+      signed_prekey: abToBase64(raw.signed_prekey),
+      signature: abToBase64(raw.signature),
+      prekey_id: raw.prekey_id
+    };
+  }
+
+  // Confere a assinatura do bundle recebido e devolve a prekey do outro lado (CryptoKey ECDH)
+  async function verifyPrekeyBundle(bundle) {
+    const identityKey = await crypto.subtle.importKey(
+      "raw",
+      toArrayBuffer(bundle.identity_key),
+      { name: "ECDSA", namedCurve: "P-256" },
+      false,
+      ["verify"]
+    );
+    const signedPrekey = toArrayBuffer(bundle.signed_prekey);
+    const valid = await verifySignatureECDSA(identityKey, toArrayBuffer(bundle.signature), signedPrekey);
+    if (!valid) {
+      throw new Error("Assinatura da prekey inválida.");
+    }
+    return await importPublicKeyRawBase64(signedPrekey);
+  }
+
   // ---------- Export public signing key (SPKI PEM) - convenience ----------
   async function exportPublicSigningKeyPEMFromCryptoKey(publicKey) {
     const spki = await crypto.subtle.exportKey("spki", publicKey);
@@ -320,20 +508,38 @@
     // helpers
     abToBase64,
     base64ToAb,
+    toArrayBuffer,
 
     // ECDH (DH) key generation / export / import
     generateDHKeyPair,
     exportDHPublicKeyBase64,
+    exportDHPublicKeyRaw,
     importDHPublicKeyBase64,
     initLocalDHOrLoad,
 
     // derive session keys
     deriveSessionKeysFromPeer,
 
+    // prekeys
+    loadOrCreatePrekeys,
+    exportPrekeyBundle,
+    exportPrekeyBundleRaw,
+    verifyPrekeyBundle,
+
     // encrypt / decrypt
     encryptMessage,
+    encryptMessageRaw,
     decryptMessage,
 
+    // sender keys (grupos)
+    generateSenderKey,
+    exportSenderKey,
+    importSenderKey,
+    senderKeyId,
+    encryptGroupMessage,
+    encryptGroupMessageRaw,
+    decryptGroupMessage,
+
     // signing (optional)
     generateSigningKeyPair,
     signDataECDSA,
@@ -0,0 +1,335 @@
+// static/js/group.js
+// Lógica dos grupos: sender keys, distribuição par a par e mensagens do grupo
+// Depende de window.ChatUI (UI) e window.ChatCrypto (criptografia)
+//
+// Cada aba cria a sua sender key e a envia, cifrada par a par (ECDH, como no chat a
+// dois), para cada membro com o grupo aberto. As mensagens saem uma única vez,
+// cifradas com a sender key, e o servidor as repassa para a sala inteira.
+// A sender key é trocada sempre que entra ou sai alguém do grupo.
+
+window.socket = io({ transports: socketTransports(), auth: { encoding: "binary" } });
+let wireEncoding = "base64";
+
+socket.on("connected", (info) => {
+  wireEncoding = info && info.encoding === "binary" ? "binary" : "base64";
+});
+
+document.addEventListener("DOMContentLoaded", async () => {
+  // =========================================================
+  // 1) Obter IDs
+  // =========================================================
+  const urlParams = new URLSearchParams(window.location.search);
+  const groupId = Number(urlParams.get("id"));
+
+  if (!groupId) {
+    alert("Erro: ID do grupo não encontrado.");
+    return;
+  }
+
+  const response = await fetch("/users/me");
+  if (!response.ok) {
+    alert("Erro ao obter informações do usuário logado.");
+    return;
+  }
+  const me = await response.json();
+  const myId = me.id;
+  const room = `group_${groupId}`;
+
+  // Nomes dos membros (renderizados no template; quem entrar depois vem do /users/batch)
+  const wrapper = document.querySelector(".chat-wrapper");
+  const names = new Map(JSON.parse(wrapper.dataset.members || "[]").map((m) => [m.id, m.username]));
+
+  // =========================================================
+  // 2) Chaves locais: par ECDH (canais par a par) e sender key
+  // =========================================================
+  const myDH = await ChatCrypto.generateDHKeyPair();
+  const myPublicKeyB64 = await ChatCrypto.exportDHPublicKeyBase64(myDH.publicKey);
+  const myPublicKeyRaw = await ChatCrypto.exportDHPublicKeyRaw(myDH.publicKey);
+
+  const cursorKey = `group_cursor_${myId}_${groupId}`;
+
+  window.GroupE2EE = {
+    myId,
+    groupId,
+    myDH,
+    senderKey: await ChatCrypto.generateSenderKey(),
+    myKeys: new Map(),        // keyId -> sender key própria (inclui as já trocadas)
+    peers: new Map(),         // user_id -> { K_enc, K_mac } do canal par a par
+    received: new Map(),      // "sender:keyId" -> sender key recebida
+    pending: [],              // mensagens esperando a sender key do remetente
+    removed: new Set(),       // removidos do grupo desde que a página abriu
+    joined: false,
+    historyCursor: Number(sessionStorage.getItem(cursorKey)) || 0
+  };
+  const state = window.GroupE2EE;
+  state.myKeys.set(state.senderKey.id, state.senderKey);
+
+  function myPublicKeyForWire() {
+    return wireEncoding === "binary" ? myPublicKeyRaw : myPublicKeyB64;
+  }
+
+  function advanceCursor(seq) {
+    if (typeof seq === "number" && seq > state.historyCursor) {
+      state.historyCursor = seq;
+      sessionStorage.setItem(cursorKey, String(seq));
+    }
+  }
+
+  // =========================================================
+  // 3) Entrar no grupo e anunciar a chave pública
+  // =========================================================
+  // O servidor manda o histórico (load_history) antes de confirmar a entrada
+  socket.emit("join_group", { group_id: groupId, since_seq: state.historyCursor }, (ack) => {
+    if (!ack || !ack.ok) {
+      alert(`Não foi possível abrir o grupo (${ack ? ack.error : "sem resposta"}).`);
+      return;
+    }
+    state.joined = true;
+    socket.emit("send_group_public_key", { group_id: groupId, dh_public_key: myPublicKeyForWire() });
+    window.ChatUI.enableChatUI();
+  });
+
+  // =========================================================
+  // 4) Distribuição das sender keys
+  // =========================================================
+  async function wrapSenderKey(to) {
+    const peer = state.peers.get(to);
+    const serialized = await ChatCrypto.exportSenderKey(state.senderKey);
+    const encrypt = wireEncoding === "binary" ? ChatCrypto.encryptMessageRaw : ChatCrypto.encryptMessage;
+    const wrapped = await encrypt(peer.K_enc, peer.K_mac, serialized);
+    return { to, ciphertext: wrapped.ciphertext, iv: wrapped.iv, mac: wrapped.mac };
+  }
+
+  // Uma entrega por destinatário; a mensagem do grupo em si nunca é recifrada
+  async function sendSenderKey(userIds) {
+    const keys = [];
+    for (const uid of userIds) {
+      if (state.peers.has(uid)) keys.push(await wrapSenderKey(uid));
+    }
+    if (keys.length) {
+      socket.emit("send_sender_key", { group_id: groupId, keys });
+    }
+  }
+
+  // Chave ECDH de outro membro: ao entrar (broadcast) ou em resposta à nossa
+  socket.on("receive_group_public_key", async (data) => {
+    if (data.group_id !== groupId || data.sender === myId) return;
+    // Removido em outro worker ainda pode estar na sala: não abrimos canal com ele
+    if (state.removed.has(data.sender)) return;
+
+    let remoteKey;
+    try {
+      remoteKey = await ChatCrypto.importDHPublicKeyBase64(data.dh_public_key);
+      state.peers.set(data.sender, await ChatCrypto.deriveSessionKeysFromPeer(myDH.privateKey, remoteKey));
+    } catch (err) {
+      console.error("Erro ao derivar canal com membro do grupo:", err);
+      return;
+    }
+
+    // Quem acabou de entrar não conhece a nossa chave: respondemos só para ele
+    if (!data.reply) {
+      socket.emit("send_group_public_key", {
+        group_id: groupId,
+        to: data.sender,
+        dh_public_key: myPublicKeyForWire()
+      });
+    }
+    await sendSenderKey([data.sender]);
+  });
+
+  socket.on("receive_sender_key", async (data) => {
+    if (data.group_id !== groupId || state.removed.has(data.sender)) return;
+    const peer = state.peers.get(data.sender);
+    if (!peer) return;
+
+    let senderKey;
+    try {
+      const serialized = await ChatCrypto.decryptMessage(peer.K_enc, peer.K_mac, data.ciphertext, data.iv, data.mac);
+      senderKey = await ChatCrypto.importSenderKey(serialized);
+    } catch (err) {
+      // Cifrada para outra aba do mesmo usuário
+      return;
+    }
+    state.received.set(`${data.sender}:${senderKey.id}`, senderKey);
+
+    // Mensagens que chegaram antes desta chave
+    const pending = state.pending;
+    state.pending = [];
+    for (const msg of pending) {
+      await renderGroupMessage(msg);
+    }
+  });
+
+  // Entrou ou saiu alguém: troca a sender key e redistribui para quem ficou
+  async function rotateSenderKey() {
+    state.senderKey = await ChatCrypto.generateSenderKey();
+    state.myKeys.set(state.senderKey.id, state.senderKey);
+    await sendSenderKey([...state.peers.keys()]);
+  }
+
+  // Nomes de quem entrou depois de a página abrir: uma chamada para todos
+  async function resolveNames(userIds) {
+    const unknown = userIds.filter((uid) => !names.has(uid));
+    if (!unknown.length) return;
+    try {
+      const resp = await fetch(`/users/batch?ids=${unknown.join(",")}`);
+      if (!resp.ok) return;
+      const data = await resp.json();
+      for (const user of data.users) names.set(user.id, user.username);
+    } catch (err) {
+      console.warn("Erro ao buscar nomes dos membros:", err);
+    }
+  }
+
+  socket.on("group_members_changed", async (data) => {
+    if (data.group_id !== groupId) return;
+    if (data.removed.includes(myId)) return;
+    resolveNames(data.added);
+    for (const uid of data.added) {
+      state.removed.delete(uid);
+    }
+    for (const uid of data.removed) {
+      state.removed.add(uid);
+      state.peers.delete(uid);
+    }
+    await rotateSenderKey();
+  });
+
+  socket.on("group_removed", (data) => {
+    if (data.group_id !== groupId) return;
+    state.joined = false;
+    window.ChatUI.disableChatUI();
+    alert("Você não faz mais parte deste grupo.");
+  });
+
+  // =========================================================
+  // 5) Histórico e mensagens recebidas
+  // =========================================================
+  function keyFor(msg) {
+    const keyId = ChatCrypto.senderKeyId(msg.ciphertext);
+    if (keyId === null) return null;
+    if (msg.sender === myId) return state.myKeys.get(keyId);
+    return state.received.get(`${msg.sender}:${keyId}`);
+  }
+
+  async function renderGroupMessage(msg) {
+    const key = keyFor(msg);
+    if (!key) {
+      // Sem a sender key (ainda): fica pendente até receive_sender_key
+      state.pending.push(msg);
+      return;
+    }
+
+    let plaintext = "";
+    try {
+      plaintext = await ChatCrypto.decryptGroupMessage(key, msg.ciphertext, msg.iv, msg.mac);
+    } catch (err) {
+      console.error("Erro ao verificar assinatura ou descriptografar:", err);
+      return;
+    }
+
+    const senderName = names.get(msg.sender) || `Usuário ${msg.sender}`;
+    const attachment = ChatAttachments.parseReference(plaintext);
+    if (attachment) {
+      window.ChatUI.appendAttachment({ sender: msg.sender, senderName, attachment }, myId, ChatAttachments.save);
+      return;
+    }
+
+    window.ChatUI.appendMessage({ sender: msg.sender, senderName, message: plaintext }, myId);
+  }
+
+  socket.on("load_history", async (page) => {
+    if (page.last_seq < state.historyCursor) {
+      state.historyCursor = 0;
+    }
+
+    const messages = page.messages || [];
+    for (const msg of messages) {
+      if (msg.seq <= state.historyCursor) continue;
+      advanceCursor(msg.seq);
+      await renderGroupMessage(msg);
+    }
+
+    if (state.historyCursor < page.last_seq && (page.has_more || messages.length === 0)) {
+      socket.emit("load_history", { group_id: groupId, since_seq: state.historyCursor });
+    }
+  });
+
+  socket.on("receive_messages", async (batch) => {
+    if (batch.room !== room) return;
+    for (const msg of batch.messages) {
+      advanceCursor(msg.seq);
+      await renderGroupMessage(msg);
+    }
+  });
+
+  // =========================================================
+  // 6) Enviar mensagem: uma cifragem para o grupo inteiro
+  // =========================================================
+  window.sendMessage = async function () {
+    if (!state.joined) {
+      alert("Aguardando a entrada no grupo...");
+      return;
+    }
+
+    const plaintext = window.ChatUI.getAndClearInput();
+    if (!plaintext.trim()) return;
+
+    await sendText(plaintext);
+  };
+
+  // Anexo: sobe uma vez, cifrado em blocos; a referência vai com a sender key como texto
+  window.sendAttachment = async function (file) {
+    if (!state.joined) {
+      alert("Aguardando a entrada no grupo...");
+      return;
+    }
+
+    let ref;
+    try {
+      ref = await ChatAttachments.upload(socket, { group_id: groupId }, file, { binary: wireEncoding === "binary" });
+    } catch (err) {
+      alert(`Não foi possível enviar o arquivo (${err.message}).`);
+      return;
+    }
+    await sendText(ChatAttachments.encodeReference(ref));
+  };
+
+  async function sendText(plaintext) {
+    const encrypt = wireEncoding === "binary" ? ChatCrypto.encryptGroupMessageRaw : ChatCrypto.encryptGroupMessage;
+    const encrypted = await encrypt(state.senderKey, plaintext);
+
+    emitMessage({
+      group_id: groupId,
+      ciphertext: encrypted.ciphertext,
+      iv: encrypted.iv,
+      mac: encrypted.mac
+    });
+  }
+
+  function emitMessage(payload) {
+    socket.emit("send_group_message", payload, (ack) => {
+      if (ack && ack.ok === false && (ack.error === "backpressure" || ack.error === "rate_limited")) {
+        setTimeout(() => emitMessage(payload), ack.retry_after_ms || 50);
+      }
+    });
+  }
+
+  // Sair do grupo (deixa de ser membro); "Voltar" só fecha a aba do grupo
+  const btnLeave = document.getElementById("btnLeaveGroup");
+  if (btnLeave) {
+    btnLeave.addEventListener("click", () => {
+      if (!confirm("Sair deste grupo?")) return;
+      socket.emit("remove_group_member", { group_id: groupId }, () => {
+        window.location.href = "/users/home";
+      });
+    });
+  }
+
+  // Heartbeat: mantém este usuário online no registro de presença
+  setInterval(() => socket.emit("heartbeat"), 20000);
+
+  window.addEventListener("beforeunload", () => {
+    socket.emit("leave_group", { group_id: groupId });
+  });
+});
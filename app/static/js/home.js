@@ -14,8 +14,10 @@ document.addEventListener('DOMContentLoaded', function() {
     }); 
     
     // --- Lógica da Lista de Usuários --- 
-    let allUsers = []; // Guarda todos os usuários na memória 
+    // O servidor pagina (cursor) e filtra (prefixo); aqui só pedimos a página exibida 
     let currentPage = 1; 
+    let pageCursors = [null]; // cursor usado para buscar cada página (índice = página - 1) 
+    let nextCursor = null; 
     const itemsPerPage = 8; // Quantos cards por página 
 
     const userGrid = document.getElementById('userGrid'); 
@@ -24,41 +26,31 @@ document.addEventListener('DOMContentLoaded', function() {
     const btnNext = document.getElementById('btnNext'); 
     const pageIndicator = document.getElementById('pageIndicator'); 
     
-    // 1. Busca os dados iniciais 
+    // 1. Busca a página atual (sempre revalidada: o servidor responde 304 pelo ETag se nada mudou) 
     async function fetchUsers() { 
+        const params = new URLSearchParams({ limit: itemsPerPage }); 
+        const term = searchInput.value.trim(); 
+        if (term) params.set('q', term); 
+        const cursor = pageCursors[currentPage - 1]; 
+        if (cursor) params.set('cursor', cursor); 
+
         try { 
-            const response = await fetch('/users/allusers'); 
+            const response = await fetch(`/users/allusers?${params}`, { cache: 'no-cache' }); 
             if (!response.ok) throw new Error("Falha ao buscar usuários"); 
             
             const data = await response.json(); 
-            allUsers = data; // Armazena 
-            renderUsers(); // Renderiza a primeira vez 
+            nextCursor = data.next_cursor; 
+            renderUsers(data.users); 
         } catch (error) { 
             userGrid.innerHTML = `<p class="error-message" style="display:block">Erro ao carregar usuários: ${error.message}</p>`; 
         } 
     } 
     
-    // 2. Função de Renderização (Filtra + Pagina + Cria HTML) 
-    function renderUsers() { 
+    // 2. Função de Renderização (Cria HTML da página recebida) 
+    function renderUsers(pageItems) { 
         userGrid.innerHTML = ''; 
         
-        // A. Filtragem (Pesquisa) 
-        const term = searchInput.value.toLowerCase(); 
-        const filteredUsers = allUsers.filter(user => 
-            user.username.toLowerCase().includes(term) 
-        ); 
-        
-        // B. Paginação 
-        const totalPages = Math.ceil(filteredUsers.length / itemsPerPage) || 1; 
-        
-        // Garante que a página atual não estoure o limite após uma pesquisa 
-        if (currentPage > totalPages) currentPage = 1; 
-        
-        const start = (currentPage - 1) * itemsPerPage; 
-        const end = start + itemsPerPage; 
-        const pageItems = filteredUsers.slice(start, end); 
-        
-        // C. Geração do HTML 
+        // Geração do HTML 
         if (pageItems.length === 0) { 
             userGrid.innerHTML = '<p style="grid-column: 1/-1; text-align: center; color: #888;">Nenhum usuário encontrado.</p>'; 
         } else { 
@@ -71,6 +63,7 @@ document.addEventListener('DOMContentLoaded', function() {
                         <span>${user.username.charAt(0).toUpperCase()}</span> 
                     </div> 
                     <div class="user-name">${user.username}</div> 
+                    <label class="user-select"><input type="checkbox" data-user-id="${user.id}" ${selectedUsers.has(user.id) ? 'checked' : ''}> grupo</label> 
                     <button class="btn-chat" onclick="startChat(${user.id}, '${user.username}')"> 
                         <svg width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"><path d="M21 15a2 2 0 0 1-2 2H7l-4 4V5a2 2 0 0 1 2-2h14a2 2 0 0 1 2 2z"></path></svg> 
                         Conversar 
@@ -81,40 +74,107 @@ document.addEventListener('DOMContentLoaded', function() {
         }
          
             
-        // D. Atualiza Controles de Paginação 
-        pageIndicator.innerText = `Página ${currentPage} de ${totalPages}`;
+        // Atualiza Controles de Paginação 
+        pageIndicator.innerText = `Página ${currentPage}`;
         btnPrev.disabled = (currentPage === 1);
-        btnNext.disabled = currentPage === totalPages; 
+        btnNext.disabled = !nextCursor; 
     } 
         
+    // --- Grupos --- 
+    // Usuários marcados nos cards entram no próximo grupo criado 
+    const selectedUsers = new Set(); 
+    const groupList = document.getElementById('groupList'); 
+    const groupName = document.getElementById('groupName'); 
+    const btnCreateGroup = document.getElementById('btnCreateGroup'); 
+
+    userGrid.addEventListener('change', (e) => { 
+        const id = Number(e.target.dataset.userId); 
+        if (!id) return; 
+        if (e.target.checked) selectedUsers.add(id); 
+        else selectedUsers.delete(id); 
+    }); 
+
+    function fetchGroups() { 
+        socket.emit('my_groups', (ack) => { 
+            if (!ack || !ack.ok) return; 
+            groupList.innerHTML = ''; 
+            if (ack.groups.length === 0) { 
+                groupList.innerHTML = '<li style="color: #888;">Nenhum grupo ainda.</li>'; 
+                return; 
+            } 
+            ack.groups.forEach(group => { 
+                const li = document.createElement('li'); 
+                const link = document.createElement('a'); 
+                link.href = `/users/group?id=${group.id}`; 
+                link.textContent = group.name; 
+                li.appendChild(link); 
+                if (group.role === 'admin') li.append(' (admin)'); 
+                groupList.appendChild(li); 
+            }); 
+        }); 
+    } 
+
+    btnCreateGroup.addEventListener('click', () => { 
+        const name = groupName.value.trim(); 
+        if (!name) return; 
+        socket.emit('create_group', { name, members: [...selectedUsers] }, (ack) => { 
+            if (!ack || !ack.ok) { 
+                alert(`Não foi possível criar o grupo (${ack ? ack.error : 'sem resposta'}).`); 
+                return; 
+            } 
+            window.location.href = `/users/group?id=${ack.group_id}`; 
+        }); 
+    }); 
+
     // --- Event Listeners --- 
         
-    // Pesquisa (reseta para página 1 ao digitar) 
+    // Pesquisa (reseta para página 1; espera o usuário parar de digitar) 
+    let searchTimer = null; 
     searchInput.addEventListener('input', () => { 
-        currentPage = 1; 
-        renderUsers(); 
+        clearTimeout(searchTimer); 
+        searchTimer = setTimeout(() => { 
+            currentPage = 1; 
+            pageCursors = [null]; 
+            fetchUsers(); 
+        }, 250); 
     }); 
         
     // Botões de Paginação 
     btnPrev.addEventListener('click', () => { 
         if (currentPage > 1) { 
             currentPage--; 
-            renderUsers(); 
+            fetchUsers(); 
         } 
     }); 
         
     btnNext.addEventListener('click', () => { 
-        // Recalcula totalPages para saber se pode avançar 
-        const term = searchInput.value.toLowerCase(); 
-        const filteredLength = allUsers.filter(u => u.username.toLowerCase().includes(term)).length; 
-        const totalPages = Math.ceil(filteredLength / itemsPerPage); 
-            
-        if (currentPage < totalPages) { 
+        if (nextCursor) { 
+            pageCursors[currentPage] = nextCursor; 
             currentPage++; 
-            renderUsers(); 
+            fetchUsers(); 
         } 
     }); 
         
+    // --- Presença em tempo real --- 
+    // Quando alguém entra/sai, o servidor avisa (presence_diff) e recarregamos só a página atual 
+    const socket = io({ transports: socketTransports() }); 
+
+    socket.on('connect', () => { 
+        socket.emit('subscribe_presence'); 
+        fetchGroups(); 
+    }); 
+
+    // Fomos adicionados a um grupo (ou removidos de um) 
+    socket.on('group_added', fetchGroups); 
+    socket.on('group_removed', fetchGroups); 
+
+    socket.on('presence_diff', () => { 
+        fetchUsers(); 
+    }); 
+
+    // Heartbeat: mantém a conexão marcada como viva no registro de presença 
+    setInterval(() => socket.emit('heartbeat'), 20000); 
+        
     // Função Placeholder para futuro chat 
     window.startChat = (userId, username) => { 
         window.location.href = `/users/chat?user=${userId}`;
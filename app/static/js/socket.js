@@ -0,0 +1,9 @@
+// static/js/socket.js
+// Transportes do Socket.IO definidos pelo servidor (meta tag "socketio-transports" do base.html):
+// só "websocket" conecta direto, sem a fase de long-polling e o upgrade.
+
+function socketTransports() {
+  const meta = document.querySelector('meta[name="socketio-transports"]');
+  const value = meta && meta.content ? meta.content : "polling,websocket";
+  return value.split(",");
+}
@@ -0,0 +1,152 @@
+"""
+TLS do servidor de produção (serve.py), com mTLS opcional.
+
+- o SSLContext é montado uma vez por processo e reaproveitado por todas as conexões:
+  as chaves dos session tickets e o cache de sessões vivem no contexto, então um
+  contexto novo a cada conexão impediria qualquer retomada de sessão;
+- session tickets (TLS_SESSION_TICKETS, TLS_NUM_TICKETS): o cliente que reconecta
+  retoma a sessão sem a assinatura com a chave privada do servidor e sem verificar de
+  novo o certificado do cliente, que são a parte cara do handshake. As chaves dos
+  tickets são de cada processo: com vários workers, só retoma quem cai no mesmo;
+- certificados RSA ou ECDSA P-256 (``scripts/gen_certs.py --key-type``); a assinatura
+  ECDSA custa uma fração da RSA-2048 no handshake completo;
+- a cada TLS_RELOAD_INTERVAL segundos o certificado e a chave são relidos se os
+  arquivos mudaram, no mesmo contexto: conexões novas usam o certificado novo e os
+  tickets já emitidos continuam valendo. Trocar a CA ou o tipo da chave exige reiniciar.
+"""
+import logging
+import os
+import ssl
+
+logger = logging.getLogger(__name__)
+
+CLIENT_AUTH = {
+    "none": ssl.CERT_NONE,
+    "optional": ssl.CERT_OPTIONAL,
+    "required": ssl.CERT_REQUIRED,
+}
+
+
+def server_context(certfile, keyfile, cafile=None, client_auth="none", session_tickets=True, num_tickets=2):
+    """Contexto do servidor; com `cafile` e `client_auth` != "none", exige/aceita certificado do cliente."""
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(certfile=certfile, keyfile=keyfile)
+
+    if client_auth not in CLIENT_AUTH:
+        raise ValueError(f"TLS_CLIENT_AUTH inválido: {client_auth} (use {', '.join(CLIENT_AUTH)})")
+    if client_auth != "none":
+        if not cafile:
+            raise ValueError("TLS_CLIENT_AUTH requer TLS_CA_FILE")
+        context.load_verify_locations(cafile=cafile)
+        context.verify_mode = CLIENT_AUTH[client_auth]
+
+    if session_tickets:
+        # TLS 1.3: tickets enviados depois do handshake (um por conexão paralela do navegador)
+        context.num_tickets = num_tickets
+    else:
+        context.options |= ssl.OP_NO_TICKET
+        context.num_tickets = 0
+    return context
+
+
+def client_context(cafile, certfile=None, keyfile=None):
+    """Contexto de cliente (scripts e testes); com `certfile`, apresenta certificado (mTLS)."""
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=cafile)
+    if certfile:
+        context.load_cert_chain(certfile=certfile, keyfile=keyfile)
+    return context
+
+
+def key_type(keyfile):
+    """"RSA", "EC"... lido do cabeçalho PEM da chave (PKCS#8 genérico = None)."""
+    with open(keyfile, "rb") as f:
+        for line in f:
+            if line.startswith(b"-----BEGIN "):
+                name = line[len(b"-----BEGIN "):].split(b"PRIVATE KEY")[0].strip()
+                return name.decode() or None
+    return None
+
+
+class ServerTLS:
+    """Contexto TLS do processo, com recarga dos certificados."""
+
+    def __init__(self):
+        self.enabled = False
+        self.context = None
+        self.reload_interval = 60
+        self.reloads = 0
+        self._certfile = None
+        self._keyfile = None
+        self._key_type = None
+        self._mtimes = None
+        self._task = None
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get("TLS_ENABLED", self.enabled)
+        self.reload_interval = config.get("TLS_RELOAD_INTERVAL", self.reload_interval)
+        if not self.enabled:
+            return
+
+        self._certfile = config["TLS_CERT_FILE"]
+        self._keyfile = config["TLS_KEY_FILE"]
+        self.context = server_context(
+            self._certfile,
+            self._keyfile,
+            cafile=config.get("TLS_CA_FILE"),
+            client_auth=config.get("TLS_CLIENT_AUTH", "none"),
+            session_tickets=config.get("TLS_SESSION_TICKETS", True),
+            num_tickets=config.get("TLS_NUM_TICKETS", 2),
+        )
+        self._key_type = key_type(self._keyfile)
+        self._mtimes = self._stat()
+
+    def watch(self, socketio):
+        """Inicia a verificação periódica dos arquivos (chamar ao subir o servidor)."""
+        if self.enabled and self.reload_interval > 0 and self._task is None:
+            self._task = socketio.start_background_task(self._run, socketio)
+
+    def _run(self, socketio):
+        while True:
+            socketio.sleep(self.reload_interval)
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("erro ao recarregar o certificado TLS")
+
+    def _stat(self):
+        return tuple(os.stat(path).st_mtime_ns for path in (self._certfile, self._keyfile))
+
+    def reload(self, force=False):
+        """Relê certificado e chave se mudaram; devolve True se recarregou."""
+        try:
+            mtimes = self._stat()
+        except OSError:
+            # Arquivo sendo trocado: tenta de novo na próxima volta
+            return False
+        if mtimes == self._mtimes and not force:
+            return False
+
+        new_type = key_type(self._keyfile)
+        if new_type != self._key_type:
+            # Um contexto guarda um certificado por tipo de chave: o antigo continuaria em uso
+            logger.warning("tipo da chave TLS mudou; reinicie o servidor",
+                           extra={"before": self._key_type, "after": new_type})
+            self._mtimes = mtimes
+            return False
+
+        # Valida o par num contexto descartável antes: um load_cert_chain que falha no meio
+        # deixaria o contexto em uso com o certificado novo e a chave antiga. Cert e chave
+        # trocados em momentos diferentes mantêm o atual até a próxima volta.
+        try:
+            ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER).load_cert_chain(certfile=self._certfile, keyfile=self._keyfile)
+            self.context.load_cert_chain(certfile=self._certfile, keyfile=self._keyfile)
+        except (OSError, ssl.SSLError) as exc:
+            logger.warning("falha ao recarregar o certificado TLS", extra={"error": str(exc)})
+            return False
+
+        self._mtimes = mtimes
+        self.reloads += 1
+        logger.info("certificado TLS recarregado", extra={"certfile": self._certfile})
+        return True
@@ -0,0 +1,94 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenCache:
+    """
+    Cache LRU/TTL de payloads de JWT já verificados.
+
+    A chave é o SHA-256 do token (o token em si não fica em memória). Cada entrada
+    vale até o menor entre o `exp` do token e `ttl` segundos. Tokens revogados no
+    logout ficam no estado compartilhado (app/shared_state.py) até expirarem, para que
+    não voltem a ser aceitos em nenhum worker. O cache local não consulta o estado
+    compartilhado a cada requisição: a entrada guarda quando foi conferida e só volta a
+    perguntar depois de `revocation_check` segundos. Logout neste worker vale na hora;
+    em outro, em até `revocation_check` segundos.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300, revocation_check=5):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.revocation_check = revocation_check
+        self.hits = 0
+        self.misses = 0
+        self.revoked = 0                # revogações feitas neste worker
+        self._entries = OrderedDict()   # digest -> [payload, válido até, revogação conferida até]
+        self._lock = threading.Lock()
+        self._state = None
+
+    def init_app(self, app, shared_state):
+        self.max_entries = app.config.get("TOKEN_CACHE_SIZE", self.max_entries)
+        self.ttl = app.config.get("TOKEN_CACHE_TTL", self.ttl)
+        self.revocation_check = app.config.get("TOKEN_REVOCATION_CHECK", self.revocation_check)
+        self._state = shared_state
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        """Payload em cache; None se não há entrada válida ou se o token foi revogado."""
+        key = self.digest(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry[2] > now:
+                self.hits += 1
+                return entry[0]
+
+        # Conferida há mais de revocation_check segundos: pergunta ao estado compartilhado
+        if self._state.is_token_revoked(key):
+            with self._lock:
+                self._entries.pop(key, None)
+                self.misses += 1
+            return None
+        with self._lock:
+            entry[2] = now + self.revocation_check
+            self.hits += 1
+        return entry[0]
+
+    def put(self, token, payload):
+        key = self.digest(token)
+        now = time.time()
+        valid_until = min(payload.get("exp", now + self.ttl), now + self.ttl)
+        with self._lock:
+            self._entries[key] = [payload, valid_until, now + self.revocation_check]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def is_revoked(self, token):
+        return self._state.is_token_revoked(self.digest(token))
+
+    def revoke(self, token, exp):
+        key = self.digest(token)
+        with self._lock:
+            self._entries.pop(key, None)
+            self.revoked += 1
+        self._state.revoke_token(key, exp)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "revoked": self.revoked,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
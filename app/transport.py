@@ -0,0 +1,119 @@
+"""
+Perfil de transporte: opções do Engine.IO, compressão dos frames WebSocket e das
+respostas HTTP, tudo a partir de app/config.py.
+
+- ``SOCKETIO_WEBSOCKET_ONLY``: conecta direto por WebSocket, sem a fase de long-polling
+  e o upgrade (menos requisições no connect). O navegador recebe a lista de transportes
+  pela meta tag ``socketio-transports`` (base.html);
+- ``SOCKETIO_PING_INTERVAL``/``SOCKETIO_PING_TIMEOUT``: detecção de conexões mortas;
+- ``SOCKETIO_MAX_HTTP_BUFFER_SIZE``: maior mensagem aceita de um cliente;
+- ``WS_DEFLATE``: permessage-deflate quando o navegador oferece. Com o eventlet, os
+  anexos binários (ciphertext, que não comprime) saem como estão, a menos que
+  ``WS_DEFLATE_BINARY`` esteja ligado, e frames de texto menores que
+  ``WS_DEFLATE_MIN_SIZE`` também. Com o contexto do deflate mantido entre mensagens,
+  até frames de texto pequenos (o JSON repetido dos eventos) comprimem bem, daí o
+  padrão 0;
+- ``HTTP_COMPRESS_MIN_SIZE``: respostas JSON/HTML a partir desse tamanho saem em gzip
+  (0 desliga). Os assets já saem pré-comprimidos (app/assets.py).
+"""
+import gzip
+
+from flask import request
+
+COMPRESSIBLE_TYPES = ("application/json", "text/html")
+
+
+def socketio_transport_options(app):
+    """Argumentos do Engine.IO para SocketIO.init_app."""
+    config = app.config
+    return {
+        "transports": ["websocket"] if config["SOCKETIO_WEBSOCKET_ONLY"] else ["polling", "websocket"],
+        "ping_interval": config["SOCKETIO_PING_INTERVAL"],
+        "ping_timeout": config["SOCKETIO_PING_TIMEOUT"],
+        "max_http_buffer_size": config["SOCKETIO_MAX_HTTP_BUFFER_SIZE"],
+        # Respostas do long-polling (só usadas sem SOCKETIO_WEBSOCKET_ONLY)
+        "http_compression": config["HTTP_COMPRESS_MIN_SIZE"] > 0,
+        "compression_threshold": config["HTTP_COMPRESS_MIN_SIZE"],
+    }
+
+
+def install_transport(app, socketio):
+    """Compressão e meta tag dos transportes; chamar depois de `socketio.init_app`."""
+    config = app.config
+
+    if not config["WS_DEFLATE"]:
+        app.wsgi_app = _without_ws_extensions(app.wsgi_app)
+    elif socketio.server.eio.async_mode == "eventlet" and (
+        not config["WS_DEFLATE_BINARY"] or config["WS_DEFLATE_MIN_SIZE"] > 0
+    ):
+        _install_eventlet_deflate_filter(config["WS_DEFLATE_MIN_SIZE"], config["WS_DEFLATE_BINARY"])
+
+    if config["HTTP_COMPRESS_MIN_SIZE"] > 0:
+        app.after_request(_compressor(config["HTTP_COMPRESS_MIN_SIZE"], config["HTTP_COMPRESS_LEVEL"]))
+
+    transports = ",".join(socketio_transport_options(app)["transports"])
+    app.context_processor(lambda: {"socketio_transports": transports})
+
+
+def _without_ws_extensions(wsgi_app):
+    # Sem o cabeçalho o servidor não negocia permessage-deflate
+    def middleware(environ, start_response):
+        environ.pop("HTTP_SEC_WEBSOCKET_EXTENSIONS", None)
+        return wsgi_app(environ, start_response)
+    return middleware
+
+
+def _install_eventlet_deflate_filter(min_size, binary):
+    from eventlet import websocket
+
+    base = websocket.RFC6455WebSocket
+    if getattr(base, "deflate_min_size", None) is not None:
+        base.deflate_min_size, base.deflate_binary = min_size, binary
+        return
+
+    class SelectiveDeflateWebSocket(base):
+        """Escolhe por frame se comprime; a RFC 7692 permite mensagens sem compressão."""
+
+        deflate_min_size = min_size
+        deflate_binary = binary
+
+        def _pack_message(self, message, *args, **kwargs):
+            if isinstance(message, bytes):
+                self._skip_deflate = not self.deflate_binary
+            else:
+                self._skip_deflate = len(message) < self.deflate_min_size
+            try:
+                return super()._pack_message(message, *args, **kwargs)
+            finally:
+                self._skip_deflate = False
+
+        def _get_permessage_deflate_enc(self):
+            if getattr(self, "_skip_deflate", False):
+                return None
+            return super()._get_permessage_deflate_enc()
+
+    websocket.RFC6455WebSocket = SelectiveDeflateWebSocket
+
+
+def _compressor(min_size, level):
+    def compress_response(response):
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES
+            or "gzip" not in request.accept_encodings
+        ):
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        response.set_data(gzip.compress(data, level))
+        response.headers["Content-Encoding"] = "gzip"
+        response.vary.add("Accept-Encoding")
+        return response
+    return compress_response
@@ -0,0 +1,83 @@
+"""
+Diretório de usuários: id -> username, com cache LRU/TTL na frente do banco.
+
+As páginas (chat, grupo, /users/me) e o /users/batch resolvem os usuários por aqui;
+as faltas de um pedido saem numa única consulta ``WHERE id IN (...)`` pela chave
+primária. Cadastros, alterações e remoções de User (eventos do mapper) invalidam a
+entrada neste processo; em outros workers a mudança vale depois de USER_CACHE_TTL.
+Ids inexistentes não ficam no cache: um cadastro feito em outro worker aparece na hora.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+
+
+class UserDirectory:
+    def __init__(self, max_entries=50000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # user_id -> ({id, username}, válido até)
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def init_app(self, app):
+        self.max_entries = app.config.get("USER_CACHE_SIZE", self.max_entries)
+        self.ttl = app.config.get("USER_CACHE_TTL", self.ttl)
+
+        if not self._listening:
+            from app.models.user import User
+
+            for name in ("after_insert", "after_update", "after_delete"):
+                event.listen(User, name, self._on_user_changed)
+            self._listening = True
+
+    def get(self, user_id):
+        """{id, username} do usuário, ou None se não existe."""
+        return self.get_many([user_id]).get(user_id)
+
+    def get_many(self, user_ids):
+        """{user_id: {id, username}} dos ids que existem; uma consulta para as faltas."""
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for user_id in dict.fromkeys(user_ids):
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = entry[0]
+                else:
+                    missing.append(user_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            loaded = self._load(missing)
+            with self._lock:
+                for user_id, record in loaded.items():
+                    self._entries[user_id] = (record, now + self.ttl)
+                    self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            found.update(loaded)
+        return found
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        return {"cached": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _on_user_changed(self, mapper, connection, target):
+        self.invalidate(target.id)
+
+    def _load(self, user_ids):
+        from app import db
+        from app.models.user import User
+
+        rows = db.session.query(User.id, User.username).filter(User.id.in_(user_ids))
+        return {user_id: {"id": user_id, "username": username} for user_id, username in rows}
@@ -0,0 +1,65 @@
+"""
+Codificação dos campos binários das mensagens (ciphertext, iv, mac, chaves públicas) no fio.
+
+Dentro do servidor esses campos são sempre `bytes` (histórico, fan-out, filas). Cada
+conexão negocia no connect como quer recebê-los:
+
+- ``binary``: anexos binários do Socket.IO (ArrayBuffer no navegador), sem base64;
+- ``base64``: strings base64 em JSON, o formato original (padrão para clientes antigos).
+
+O cliente pede o modo em `auth` (``io({auth: {encoding: "binary"}})``) e o servidor
+confirma no evento `connected`. As entregas para uma sala saem uma vez por modo, para
+as sub-salas de `delivery_room`.
+"""
+import base64
+import binascii
+
+BINARY = "binary"
+BASE64 = "base64"
+ENCODINGS = (BINARY, BASE64)
+
+BINARY_FIELDS = ("ciphertext", "iv", "mac", "dh_public_key", "identity_key", "signed_prekey", "signature")
+
+
+class InvalidPayload(ValueError):
+    """Campo que deveria ser binário não é bytes nem base64 válido."""
+
+
+def negotiate(auth):
+    """Modo pedido no `auth` do connect; base64 se ausente ou desconhecido."""
+    requested = auth.get("encoding") if isinstance(auth, dict) else None
+    return requested if requested in ENCODINGS else BASE64
+
+
+def delivery_room(room, encoding):
+    return f"{room}#{encoding}"
+
+
+def to_bytes(value):
+    """Aceita os dois formatos de entrada e devolve bytes sem copiar quando já é binário."""
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    if isinstance(value, str):
+        try:
+            return base64.b64decode(value, validate=True)
+        except binascii.Error:
+            raise InvalidPayload(value[:16])
+    raise InvalidPayload(type(value).__name__)
+
+
+def encode(message, encoding):
+    """Cópia de `message` com os campos binários no formato da conexão."""
+    if encoding == BINARY:
+        return message
+    return {
+        key: base64.b64encode(value).decode("ascii") if key in BINARY_FIELDS and isinstance(value, bytes) else value
+        for key, value in message.items()
+    }
+
+
+def encode_page(page, encoding):
+    if encoding == BINARY or not page.get("messages"):
+        return page
+    return dict(page, messages=[encode(m, encoding) for m in page["messages"]])
@@ -11,7 +11,10 @@ config = context.config
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-fileConfig(config.config_file_name)
+# Dentro do app (setup-db, DB_AUTO_CREATE) o logging já está configurado (app/log.py):
+# o alembic.ini trocaria os handlers do root e desligaria os loggers do app.
+if config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 logger = logging.getLogger('alembic.env')
 
 
@@ -0,0 +1,41 @@
+"""add messages table
+
+Revision ID: 8f2c1d7a4e90
+Revises: 3b44a9765365
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2c1d7a4e90'
+down_revision = '3b44a9765365'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('room', sa.String(length=64), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('sender', sa.Integer(), nullable=False),
+        sa.Column('ciphertext', sa.Text(), nullable=False),
+        sa.Column('iv', sa.String(length=64), nullable=False),
+        sa.Column('mac', sa.String(length=128), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['sender'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.create_index('ix_messages_room_seq', ['room', 'seq'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_messages_room_seq')
+
+    op.drop_table('messages')
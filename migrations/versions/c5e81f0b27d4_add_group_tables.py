@@ -0,0 +1,47 @@
+"""add group tables
+
+Revision ID: c5e81f0b27d4
+Revises: 8f2c1d7a4e90
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e81f0b27d4'
+down_revision = '8f2c1d7a4e90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'groups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=80), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'group_members',
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(length=16), nullable=False),
+        sa.Column('joined_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('group_id', 'user_id')
+    )
+    with op.batch_alter_table('group_members', schema=None) as batch_op:
+        batch_op.create_index('ix_group_members_user_id', ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('group_members', schema=None) as batch_op:
+        batch_op.drop_index('ix_group_members_user_id')
+    op.drop_table('group_members')
+    op.drop_table('groups')
@@ -0,0 +1,34 @@
+"""add prekey bundles
+
+Revision ID: d9a4b7e31c02
+Revises: c5e81f0b27d4
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a4b7e31c02'
+down_revision = 'c5e81f0b27d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'prekey_bundles',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('identity_key', sa.LargeBinary(), nullable=False),
+        sa.Column('signed_prekey', sa.LargeBinary(), nullable=False),
+        sa.Column('signature', sa.LargeBinary(), nullable=False),
+        sa.Column('prekey_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('prekey_bundles')
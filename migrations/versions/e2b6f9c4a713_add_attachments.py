@@ -0,0 +1,39 @@
+"""add attachments
+
+Revision ID: e2b6f9c4a713
+Revises: d9a4b7e31c02
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b6f9c4a713'
+down_revision = 'd9a4b7e31c02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'attachments',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('room', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('chunk_size', sa.Integer(), nullable=False),
+        sa.Column('complete', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('attachments', schema=None) as batch_op:
+        batch_op.create_index('ix_attachments_complete_created_at', ['complete', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('attachments', schema=None) as batch_op:
+        batch_op.drop_index('ix_attachments_complete_created_at')
+    op.drop_table('attachments')
@@ -1,24 +1,50 @@
-from app import create_app, db, socketio
-from pyngrok import ngrok, conf, exception
+import time
 
-app = create_app()
+STARTED = time.perf_counter()
+
+import os  # noqa: E402
+import socket  # noqa: E402
+import threading  # noqa: E402
+
+# Servidor de desenvolvimento do Werkzeug: sempre threading. eventlet/gevent precisam do
+# monkey patching antes de qualquer import, que só o serve.py faz
+os.environ["ASYNC_MODE"] = "threading"
+
+from app import create_app, db, rate_limiter, socketio  # noqa: E402
+from app.database import check_schema  # noqa: E402
+from app.startup import StartupTimer  # noqa: E402
+
+timer = StartupTimer(STARTED)
+timer.mark("imports", STARTED)
+app = create_app(timer=timer)
+if app.config["NGROK_ENABLED"]:
+    # Também no processo filho do reloader, que é quem atende as requisições do túnel
+    rate_limiter.behind_tunnel(app)
 
 # SSL opcional para desenvolvimento
 ssl_context = ('assets/certs_example/server.crt', 'assets/certs_example/server.key')
 
-if __name__ == "__main__":
-    with app.app_context():
-        db.create_all()
 
-    # Porta local do Flask
-    port = 5000
+def has_network(host="connect.ngrok-agent.com", port=443, timeout=2):
+    try:
+        socket.create_connection((host, port), timeout=timeout).close()
+        return True
+    except OSError:
+        return False
+
+
+def open_tunnel(port, region):
+    """Cria ou reaproveita o túnel ngrok, em segundo plano: o servidor sobe sem esperar a rede."""
+    if not has_network():
+        print(f"Sem rede: seguindo sem ngrok, acesse http://localhost:{port}")
+        return
 
-    public_url = None
+    # pyngrok só é importado aqui, fora do caminho da subida
+    from pyngrok import conf, exception, ngrok
 
-    # Tenta criar ou usar um túnel ngrok
     try:
         # Configurar ngrok
-        conf.get_default().region = "us"  # ou "ap" para Ásia, "eu" para Europa, etc.
+        conf.get_default().region = region  # ou "ap" para Ásia, "eu" para Europa, etc.
 
         # Verifica túneis existentes
         tunnels = ngrok.get_tunnels()
@@ -33,8 +59,24 @@ if __name__ == "__main__":
         print(f"Erro ao iniciar ngrok: {e}")
         print("Você pode abrir manualmente com: ngrok http 5000")
 
+
+if __name__ == "__main__":
+    config = app.config
+
+    with timer.phase("schema"):
+        check_schema(app, db)
+
+    # Porta local do Flask
+    port = 5000
+
+    # O reloader roda este arquivo de novo num processo filho (WERKZEUG_RUN_MAIN); o túnel
+    # fica no processo principal, que sobrevive aos recarregamentos, e a URL não muda
+    if config["NGROK_ENABLED"] and os.environ.get("WERKZEUG_RUN_MAIN") != "true":
+        threading.Thread(target=open_tunnel, args=(port, config["NGROK_REGION"]), daemon=True).start()
+
+    timer.report(config["STARTUP_REPORT"])
+
     # Executa o Flask + SocketIO
     socketio.run(app, debug=True, host='0.0.0.0', port=port)
     # execução em localhost (ignorando ngrok)
     #socketio.run(app, debug=True, host='0.0.0.0', port=port, ssl_context=ssl_context)
-
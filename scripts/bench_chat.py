@@ -0,0 +1,393 @@
+"""
+Benchmark de ponta a ponta do protocolo do chat, com usuários simulados.
+
+Sobe `serve.py` (ou usa `--url` de um servidor já rodando) e leva `--users` usuários,
+em pares, pelo mesmo fluxo do navegador:
+
+    /auth/register -> /auth/login -> connect -> join -> send_dh_public_key (ECDH P-256)
+    -> derivação HKDF -> send_message (AES-GCM + HMAC) a `--rate` mensagens/s por usuário
+
+Mede o tempo de cadastro/login, de conexão (connect + join), do handshake (join até as
+chaves derivadas nos dois lados), a vazão de mensagens, a latência de ponta a ponta
+(p50/p95/p99, do envio até a mensagem decifrada no destinatário) e o pico de RSS do
+servidor. O resultado vai para um JSON (`--output`), que pode ser comparado com o de
+outro commit:
+
+    $ python scripts/bench_chat.py --users 200 --rate 5 --duration 20
+    $ python scripts/bench_chat.py --users 200 --rate 5 --duration 20 --compare bench-results/anterior.json
+
+Requer o cliente assíncrono do python-socketio: pip install "python-socketio[asyncio_client]"
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import aiohttp
+import socketio
+from cryptography.hazmat.primitives import hashes, hmac, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import ROOT_DIR, raise_fd_limit, server_rss_mb, start_server, token_user_id, wait_for_port  # noqa: E402
+
+
+def b64(data):
+    return base64.b64encode(data).decode()
+
+
+def from_wire(value):
+    # Conexões em modo binário recebem bytes; as em base64, strings
+    return value if isinstance(value, bytes) else base64.b64decode(value)
+
+
+def hkdf(secret, info):
+    # Mesmos parâmetros do crypto.js (HKDF-SHA256, salt vazio)
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=info).derive(secret)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 0.50),
+        "p95_ms": percentile(values, 0.95),
+        "p99_ms": percentile(values, 0.99),
+        "mean_ms": statistics.fmean(values) if values else 0.0,
+    }
+
+
+class SimUser:
+    """Um usuário simulado: a mesma sequência de eventos de static/js/chat.js."""
+
+    def __init__(self, url, username, stats, encoding="base64"):
+        self.url = url
+        self.encoding = encoding
+        self.username = username
+        self.stats = stats
+        self.user_id = None
+        self.token = None
+        self.other_id = None
+        self.client = socketio.AsyncClient(reconnection=False)
+        self.handshake_done = asyncio.Event()
+
+        self._dh = ec.generate_private_key(ec.SECP256R1())
+        # Formato "raw" do WebCrypto: ponto não comprimido (0x04 || X || Y)
+        self._public_raw = self._dh.public_key().public_bytes(
+            serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint)
+        self._key_sent = False
+        self._aes = None
+        self._mac_key = None
+        self._join_started = 0.0
+
+        self.client.on("load_history", self._on_load_history)
+        self.client.on("receive_dh_public_key", self._on_dh_public_key)
+        self.client.on("receive_message", self._on_message)
+        self.client.on("receive_messages", self._on_messages)
+
+    async def register_and_login(self, http):
+        credentials = {"username": self.username, "password": "bench"}
+        start = time.perf_counter()
+        async with http.post(f"{self.url}/auth/register", json=credentials) as resp:
+            resp.raise_for_status()
+        async with http.post(f"{self.url}/auth/login", json=credentials) as resp:
+            resp.raise_for_status()
+            self.token = resp.cookies["token"].value
+        self.user_id = token_user_id(self.token)
+        self.stats["auth_ms"].append((time.perf_counter() - start) * 1000)
+
+    async def connect(self, other_id, timeout):
+        self.other_id = other_id
+        start = time.perf_counter()
+        await self.client.connect(self.url, headers={"Cookie": f"token={self.token}"},
+                                  transports=["websocket"], wait_timeout=timeout,
+                                  auth={"encoding": self.encoding})
+        self._join_started = time.perf_counter()
+        await self.client.call("join", {"user1_id": self.user_id, "user2_id": other_id, "since_seq": 0},
+                               timeout=timeout)
+        self.stats["connect_ms"].append((time.perf_counter() - start) * 1000)
+
+    async def _send_key(self):
+        self._key_sent = True
+        await self.client.emit("send_dh_public_key", {
+            "sender": self.user_id, "receiver": self.other_id, "dh_public_key": self._to_wire(self._public_raw),
+        })
+
+    async def _on_load_history(self, page):
+        # Como no navegador: o load_history confirma a entrada na sala
+        if not self._key_sent:
+            await self._send_key()
+
+    async def _on_dh_public_key(self, data):
+        if data["sender"] == self.user_id or self._aes is not None:
+            return
+        peer = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), from_wire(data["dh_public_key"]))
+        # Como o chat.js: responde sempre, a primeira chave pode ter ido para a sala vazia
+        await self._send_key()
+
+        shared = self._dh.exchange(ec.ECDH(), peer)
+        self._aes = AESGCM(hkdf(shared, b"whatschat enc"))
+        self._mac_key = hkdf(shared, b"whatschat mac")
+        self.stats["handshake_ms"].append((time.perf_counter() - self._join_started) * 1000)
+        self.handshake_done.set()
+
+    def _to_wire(self, data):
+        return data if self.encoding == "binary" else b64(data)
+
+    def _encrypt(self, plaintext):
+        iv = os.urandom(12)
+        ciphertext = self._aes.encrypt(iv, plaintext, None)
+        mac = hmac.HMAC(self._mac_key, hashes.SHA256())
+        mac.update(ciphertext + iv)
+        return {"ciphertext": self._to_wire(ciphertext), "iv": self._to_wire(iv), "mac": self._to_wire(mac.finalize())}
+
+    def _decrypt(self, data):
+        ciphertext = from_wire(data["ciphertext"])
+        iv = from_wire(data["iv"])
+        mac = hmac.HMAC(self._mac_key, hashes.SHA256())
+        mac.update(ciphertext + iv)
+        mac.verify(from_wire(data["mac"]))
+        return self._aes.decrypt(iv, ciphertext, None)
+
+    async def _on_message(self, data):
+        if data["sender"] == self.user_id or self._aes is None:
+            return
+        try:
+            sent_at = json.loads(self._decrypt(data))["t"]
+        except Exception:
+            self.stats["decrypt_errors"] += 1
+            return
+        self.stats["latency_ms"].append((time.time() - sent_at) * 1000)
+        self.stats["last_delivery"] = time.perf_counter()
+
+    async def _on_messages(self, batch):
+        for data in batch["messages"]:
+            await self._on_message(data)
+
+    async def stream(self, rate, duration, padding):
+        """Envia `rate` mensagens/s durante `duration` segundos (sem esperar o ack)."""
+        interval = 1 / rate
+        deadline = time.perf_counter() + duration
+        next_send = time.perf_counter()
+        n = 0
+        while time.perf_counter() < deadline and self.client.connected:
+            plaintext = json.dumps({"t": time.time(), "n": n, "pad": padding}).encode()
+            payload = dict(self._encrypt(plaintext), sender=self.user_id, receiver=self.other_id)
+            await self.client.emit("send_message", payload)
+            self.stats["sent"] += 1
+            n += 1
+            next_send += interval
+            await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+
+    async def close(self):
+        if self.client.connected:
+            await self.client.disconnect()
+
+
+async def sample_rss(pid, peak, stop):
+    while not stop.is_set():
+        peak[0] = max(peak[0], server_rss_mb(pid))
+        await asyncio.sleep(0.5)
+
+
+async def run_benchmark(url, args, server_pid=None):
+    stats = {"auth_ms": [], "connect_ms": [], "handshake_ms": [], "latency_ms": [],
+             "sent": 0, "decrypt_errors": 0, "last_delivery": 0.0}
+    prefix = f"bench_{uuid.uuid4().hex[:6]}"
+    users = [SimUser(url, f"{prefix}_{i}", stats, args.encoding) for i in range(args.users - args.users % 2)]
+
+    peak_rss = [0.0]
+    stop_rss = asyncio.Event()
+    rss_task = asyncio.ensure_future(sample_rss(server_pid, peak_rss, stop_rss)) if server_pid else None
+
+    failures = {"auth": 0, "connect": 0, "handshake": 0}
+    try:
+        # 1) Cadastro e login (em degraus de `step`)
+        connector = aiohttp.TCPConnector(limit=args.step)
+        async with aiohttp.ClientSession(connector=connector) as http:
+            for base in range(0, len(users), args.step):
+                results = await asyncio.gather(*(u.register_and_login(http) for u in users[base:base + args.step]),
+                                               return_exceptions=True)
+                failures["auth"] += sum(isinstance(r, Exception) for r in results)
+
+        # 2) Conexão e join, por par (o segundo do par entra depois do primeiro)
+        pairs = [(users[i], users[i + 1]) for i in range(0, len(users), 2)
+                 if users[i].user_id is not None and users[i + 1].user_id is not None]
+
+        async def connect_pair(a, b):
+            await a.connect(b.user_id, args.timeout)
+            await b.connect(a.user_id, args.timeout)
+
+        connected = []
+        for base in range(0, len(pairs), max(1, args.step // 2)):
+            batch = pairs[base:base + max(1, args.step // 2)]
+            results = await asyncio.gather(*(connect_pair(a, b) for a, b in batch), return_exceptions=True)
+            for pair, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    failures["connect"] += 1
+                else:
+                    connected.append(pair)
+
+        # 3) Handshake ECDH
+        async def wait_handshake(a, b):
+            await asyncio.wait_for(asyncio.gather(a.handshake_done.wait(), b.handshake_done.wait()), args.timeout)
+
+        results = await asyncio.gather(*(wait_handshake(a, b) for a, b in connected), return_exceptions=True)
+        ready = [p for p, r in zip(connected, results) if not isinstance(r, Exception)]
+        failures["handshake"] = len(connected) - len(ready)
+
+        # 4) Troca de mensagens
+        padding = "x" * args.message_size
+        start = time.perf_counter()
+        await asyncio.gather(*(u.stream(args.rate, args.duration, padding) for pair in ready for u in pair))
+        await asyncio.sleep(args.settle)
+        # Vazão até a última entrega (a espera final não conta)
+        elapsed = max(stats["last_delivery"] - start, 0.0)
+    finally:
+        await asyncio.gather(*(u.close() for u in users), return_exceptions=True)
+        if rss_task is not None:
+            stop_rss.set()
+            await rss_task
+
+    delivered = len(stats["latency_ms"])
+    return {
+        "users": len(users),
+        "pairs_ready": len(ready),
+        "failures": failures,
+        "auth": summarize(stats["auth_ms"]),
+        "connect": summarize(stats["connect_ms"]),
+        "handshake": summarize(stats["handshake_ms"]),
+        "messages": {
+            "sent": stats["sent"],
+            "delivered": delivered,
+            "decrypt_errors": stats["decrypt_errors"],
+            "throughput_per_sec": delivered / elapsed if elapsed else 0.0,
+            "latency": summarize(stats["latency_ms"]),
+        },
+        "server_peak_rss_mb": peak_rss[0] if server_pid else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    print(f"usuários: {result['users']}  pares prontos: {result['pairs_ready']}  falhas: {result['failures']}")
+    print(f"{'etapa':<12}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name in ("auth", "connect", "handshake"):
+        s = result[name]
+        print(f"{name:<12}{s['count']:>7}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}")
+    m = result["messages"]
+    s = m["latency"]
+    print(f"{'mensagens':<12}{s['count']:>7}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}")
+    print(f"enviadas {m['sent']}, entregues {m['delivered']} ({m['throughput_per_sec']:.0f} msg/s), "
+          f"erros de decifragem {m['decrypt_errors']}")
+    if result["server_peak_rss_mb"] is not None:
+        print(f"RSS máximo do servidor: {result['server_peak_rss_mb']:.1f} MB")
+
+
+def print_comparison(current, baseline):
+    """Diferença percentual das métricas principais em relação a outro resultado."""
+    def pick(result):
+        r = result["result"]
+        return {
+            "connect p99 ms": r["connect"]["p99_ms"],
+            "handshake p99 ms": r["handshake"]["p99_ms"],
+            "latência p50 ms": r["messages"]["latency"]["p50_ms"],
+            "latência p99 ms": r["messages"]["latency"]["p99_ms"],
+            "msg/s": r["messages"]["throughput_per_sec"],
+            "RSS MB": r["server_peak_rss_mb"] or 0.0,
+        }
+
+    print(f"\nComparação com {baseline.get('commit')} ({baseline.get('started_at')}):")
+    old, new = pick(baseline), pick(current)
+    for key in new:
+        delta = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(f"  {key:<18}{old[key]:>10.1f} -> {new[key]:>10.1f}  ({delta:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="número de usuários (em pares)")
+    parser.add_argument("--rate", type=float, default=2.0, help="mensagens/s por usuário")
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos de troca de mensagens")
+    parser.add_argument("--message-size", type=int, default=64, help="bytes extras no texto de cada mensagem")
+    parser.add_argument("--encoding", choices=("binary", "base64"), default="binary",
+                        help="formato dos campos cifrados no Socket.IO (app/wire.py)")
+    parser.add_argument("--step", type=int, default=50, help="operações concorrentes no cadastro/conexão")
+    parser.add_argument("--settle", type=float, default=2.0, help="espera pelas últimas entregas")
+    parser.add_argument("--timeout", type=float, default=15.0)
+    parser.add_argument("--mode", default="eventlet", help="ASYNC_MODE do servidor iniciado")
+    parser.add_argument("--port", type=int, default=5058)
+    parser.add_argument("--url", help="usa um servidor já rodando em vez de subir o serve.py")
+    parser.add_argument("--env", action="append", default=[], metavar="NOME=VALOR",
+                        help="variável extra para o servidor (pode repetir)")
+    parser.add_argument("--output", help="arquivo JSON (padrão: bench-results/<commit>-<data>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    if args.url:
+        result = asyncio.run(run_benchmark(args.url.rstrip("/"), args))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            server = start_server(args.mode, args.port, args.users * 2, os.path.join(tmp, "bench.db"), extra_env)
+            try:
+                if not wait_for_port("127.0.0.1", args.port):
+                    raise SystemExit("servidor não subiu")
+                result = asyncio.run(run_benchmark(f"http://127.0.0.1:{args.port}", args, server.pid))
+            finally:
+                server.terminate()
+                try:
+                    server.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+
+    report = {
+        "commit": git_commit(),
+        "started_at": started_at,
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "result": result,
+    }
+
+    print_report(result)
+
+    output = args.output or os.path.join(ROOT_DIR, "bench-results",
+                                         f"{report['commit'] or 'sem-git'}-{started_at.replace(':', '')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultado salvo em {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark do envio de mensagens: um emit por mensagem x micro-lotes (app/fanout.py).
+
+Para cada configuração sobe `serve.py` (FANOUT_ENABLED=0 e depois 1), abre `--rooms`
+pares de clientes e cada remetente dispara `--messages` mensagens em rajada. O instante
+do envio vai dentro do `ciphertext`, e o destinatário mede a latência de entrega.
+
+    $ python scripts/bench_fanout.py --rooms 50 --messages 200 --mode eventlet
+
+Requer o cliente assíncrono do python-socketio: pip install "python-socketio[asyncio_client]"
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import socketio
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import create_users, raise_fd_limit, server_rss_mb, start_server, wait_for_port  # noqa: E402
+
+
+async def open_pair_client(url, user_id, other_id, token, latencies, done, expected):
+    client = socketio.AsyncClient(reconnection=False)
+    received = 0
+
+    def on_message(data):
+        nonlocal received
+        if data["sender"] == user_id:
+            return
+        latencies.append((time.time() - float(data["ciphertext"])) * 1000)
+        received += 1
+        if received >= expected:
+            done.set()
+
+    @client.on("receive_message")
+    async def receive_message(data):
+        on_message(data)
+
+    @client.on("receive_messages")
+    async def receive_messages(batch):
+        for data in batch["messages"]:
+            on_message(data)
+
+    await client.connect(url, headers={"Cookie": f"token={token}"}, transports=["websocket"],
+                         auth={"encoding": "binary"})
+    await client.call("join", {"user1_id": user_id, "user2_id": other_id})
+    return client
+
+
+async def send_burst(client, sender, receiver, count):
+    """Dispara `count` mensagens sem esperar ack; reenvia as recusadas por backpressure."""
+    rejected = 0
+    pending = []
+
+    for _ in range(count):
+        payload = {"sender": sender, "receiver": receiver, "ciphertext": repr(time.time()).encode(), "iv": b"iv", "mac": b"mac"}
+        pending.append(asyncio.ensure_future(client.call("send_message", payload)))
+
+    for ack in await asyncio.gather(*pending):
+        while ack and ack.get("ok") is False:
+            rejected += 1
+            await asyncio.sleep(ack.get("retry_after_ms", 50) / 1000)
+            payload = {"sender": sender, "receiver": receiver, "ciphertext": repr(time.time()).encode(), "iv": b"iv", "mac": b"mac"}
+            ack = await client.call("send_message", payload)
+    return rejected
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run_config(fanout_enabled, args):
+    port = args.port
+    url = f"http://127.0.0.1:{port}"
+    os.environ["FANOUT_ENABLED"] = "1" if fanout_enabled else "0"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(args.mode, port, args.rooms * 4, os.path.join(tmp, "bench.db"))
+        try:
+            if not wait_for_port("127.0.0.1", port):
+                return {"fanout": fanout_enabled, "error": "servidor não subiu"}
+
+            users = await create_users(url, args.rooms * 2)
+            latencies = []
+            pairs = []
+            for i in range(0, len(users), 2):
+                (a_id, a_token), (b_id, b_token) = users[i], users[i + 1]
+                done = asyncio.Event()
+                sender = await open_pair_client(url, a_id, b_id, a_token, [], asyncio.Event(), 0)
+                receiver = await open_pair_client(url, b_id, a_id, b_token, latencies, done, args.messages)
+                pairs.append((sender, receiver, a_id, b_id, done))
+
+            start = time.perf_counter()
+            rejected = await asyncio.gather(*(send_burst(s, a, b, args.messages) for s, _, a, b, _ in pairs))
+            try:
+                await asyncio.wait_for(asyncio.gather(*(p[4].wait() for p in pairs)), args.timeout)
+            except asyncio.TimeoutError:
+                pass
+            elapsed = time.perf_counter() - start
+            rss = server_rss_mb(server.pid)
+
+            await asyncio.gather(*(c.disconnect() for p in pairs for c in p[:2]), return_exceptions=True)
+
+            latencies.sort()
+            return {
+                "fanout": fanout_enabled,
+                "sent": args.rooms * args.messages,
+                "delivered": len(latencies),
+                "rejected": sum(rejected),
+                "msgs_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(latencies, 0.50),
+                "p99_ms": percentile(latencies, 0.99),
+                "rss_mb": rss,
+            }
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+
+def print_report(results):
+    header = f"{'fan-out':<10}{'enviadas':>10}{'entregues':>11}{'recusadas':>11}" \
+             f"{'msg/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        label = "lotes" if r["fanout"] else "direto"
+        if "error" in r:
+            print(f"{label:<10} erro: {r['error']}")
+            continue
+        print(f"{label:<10}{r['sent']:>10}{r['delivered']:>11}{r['rejected']:>11}"
+              f"{r['msgs_per_sec']:>10.0f}{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['rss_mb']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", default="eventlet")
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=200, help="mensagens por remetente")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=5056)
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    results = []
+    for enabled in (False, True):
+        print(f"Testando fan-out {'em lotes' if enabled else 'direto'}...")
+        results.append(asyncio.run(run_config(enabled, args)))
+
+    print()
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Tempo do connect até as chaves da sessão prontas (primeira mensagem pode sair), com a
+troca DH ao vivo e com o bundle de prekey (app/prekeys.py).
+
+Sobe `serve.py` atrás do proxy com latência de scripts/bench_transport.py (`--rtt-ms`)
+e, para cada um de `--pairs` pares, mede no lado que abre a conversa:
+
+- ao vivo: connect -> join -> load_history -> send_dh_public_key -> espera a chave do
+  outro lado (que precisa estar online) -> HKDF;
+- prekey: connect -> fetch_prekey_bundle -> confere a assinatura -> HKDF, com o outro
+  lado offline (publicou o bundle antes).
+
+    $ python scripts/bench_handshake.py --pairs 20 --rtt-ms 100
+
+Requer o cliente assíncrono do python-socketio: pip install "python-socketio[asyncio_client]"
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import socketio
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_transport import CountingProxy  # noqa: E402
+from load_test import create_users, start_server, wait_for_port  # noqa: E402
+
+
+def raw_public(private_key):
+    # Formato "raw" do WebCrypto: ponto não comprimido (0x04 || X || Y)
+    return private_key.public_key().public_bytes(serialization.Encoding.X962,
+                                                 serialization.PublicFormat.UncompressedPoint)
+
+
+def session_keys(private_key, peer_raw):
+    # Mesmos parâmetros do crypto.js (ECDH P-256 -> HKDF-SHA256, salt vazio)
+    peer = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), peer_raw)
+    secret = private_key.exchange(ec.ECDH(), peer)
+    return [HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=info).derive(secret)
+            for info in (b"whatschat enc", b"whatschat mac")]
+
+
+def make_bundle():
+    identity = ec.generate_private_key(ec.SECP256R1())
+    prekey = ec.generate_private_key(ec.SECP256R1())
+    # WebCrypto assina no formato r||s, não DER
+    r, s = decode_dss_signature(identity.sign(raw_public(prekey), ec.ECDSA(hashes.SHA256())))
+    bundle = {
+        "identity_key": raw_public(identity),
+        "signed_prekey": raw_public(prekey),
+        "signature": r.to_bytes(32, "big") + s.to_bytes(32, "big"),
+        "prekey_id": 1,
+    }
+    return prekey, bundle
+
+
+def verify_bundle(bundle):
+    identity = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), bundle["identity_key"])
+    sig = bundle["signature"]
+    identity.verify(encode_dss_signature(int.from_bytes(sig[:32], "big"), int.from_bytes(sig[32:], "big")),
+                    bundle["signed_prekey"], ec.ECDSA(hashes.SHA256()))
+    return bundle["signed_prekey"]
+
+
+async def connect(url, token):
+    client = socketio.AsyncClient(reconnection=False)
+    await client.connect(url, headers={"Cookie": f"token={token}"}, transports=["websocket"],
+                         auth={"encoding": "binary"})
+    return client
+
+
+async def live_handshake(url, initiator, peer, timeout):
+    """Outro lado já na sala; devolve ms do connect até as chaves derivadas."""
+    (a_id, a_token), (b_id, b_token) = initiator, peer
+    b_dh = ec.generate_private_key(ec.SECP256R1())
+    b = await connect(url, b_token)
+
+    @b.on("receive_dh_public_key")
+    async def answer(data):
+        await b.emit("send_dh_public_key", {"receiver": a_id, "dh_public_key": raw_public(b_dh)})
+
+    await b.call("join", {"user2_id": a_id})
+
+    a_dh = ec.generate_private_key(ec.SECP256R1())
+    ready = asyncio.Event()
+    start = time.perf_counter()
+    a = socketio.AsyncClient(reconnection=False)
+
+    @a.on("load_history")
+    async def send_key(page):
+        await a.emit("send_dh_public_key", {"receiver": b_id, "dh_public_key": raw_public(a_dh)})
+
+    @a.on("receive_dh_public_key")
+    async def derive(data):
+        session_keys(a_dh, data["dh_public_key"])
+        ready.set()
+
+    await a.connect(url, headers={"Cookie": f"token={a_token}"}, transports=["websocket"],
+                    auth={"encoding": "binary"})
+    await a.emit("join", {"user2_id": b_id})
+    await asyncio.wait_for(ready.wait(), timeout)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    await asyncio.gather(a.disconnect(), b.disconnect())
+    return elapsed
+
+
+async def prekey_handshake(url, initiator, peer, timeout):
+    """Outro lado offline (só publicou o bundle); devolve ms do connect até as chaves."""
+    (_, a_token), (b_id, b_token) = initiator, peer
+    _, bundle = make_bundle()
+    b = await connect(url, b_token)
+    await b.call("upload_prekey_bundle", bundle)
+    await b.disconnect()
+
+    a_prekey, _ = make_bundle()
+    start = time.perf_counter()
+    a = await connect(url, a_token)
+    ack = await a.call("fetch_prekey_bundle", {"user_id": b_id}, timeout=timeout)
+    if not ack.get("ok"):
+        raise RuntimeError(ack)
+    session_keys(a_prekey, verify_bundle(ack["bundle"]))
+    elapsed = (time.perf_counter() - start) * 1000
+
+    await a.disconnect()
+    return elapsed
+
+
+async def run(args):
+    proxy = CountingProxy(args.port, args.rtt_ms)
+    await proxy.start(args.port + 1)
+    url = f"http://127.0.0.1:{args.port + 1}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(args.mode, args.port, args.pairs * 4, os.path.join(tmp, "bench.db"))
+        try:
+            if not wait_for_port("127.0.0.1", args.port):
+                raise SystemExit("servidor não subiu")
+            users = await create_users(url, args.pairs * 2)
+            results = {"ao vivo": [], "prekey": []}
+            for i in range(args.pairs):
+                pair = users[2 * i], users[2 * i + 1]
+                results["ao vivo"].append(await live_handshake(url, *pair, args.timeout))
+                results["prekey"].append(await prekey_handshake(url, *pair, args.timeout))
+            # Deixa o proxy repassar os fechamentos antes de encerrar o loop
+            await asyncio.sleep(args.rtt_ms / 1000 + 0.2)
+            return results
+        finally:
+            proxy.server.close()
+            server.terminate()
+            try:
+                server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+
+def print_report(results, rtt_ms):
+    print(f"Connect até as chaves prontas (RTT {rtt_ms:g} ms)")
+    header = f"{'modo':<10}{'p50':>10}{'p95':>10}{'outro lado':>14}"
+    print(header)
+    print("-" * len(header))
+    for name, values in results.items():
+        values.sort()
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        peer = "online" if name == "ao vivo" else "offline"
+        print(f"{name:<10}{statistics.median(values):>7.0f} ms{p95:>7.0f} ms{peer:>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=20)
+    parser.add_argument("--rtt-ms", type=float, default=100, help="latência simulada (ida e volta)")
+    parser.add_argument("--mode", default="eventlet", help="ASYNC_MODE do servidor")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--port", type=int, default=5071)
+    args = parser.parse_args()
+
+    print_report(asyncio.run(run(args)), args.rtt_ms)
+
+
+if __name__ == "__main__":
+    main()
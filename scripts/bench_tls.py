@@ -0,0 +1,167 @@
+"""
+Handshakes TLS por segundo no serve.py: completo x retomado (session ticket) e
+certificado RSA-2048 x ECDSA P-256.
+
+Para cada tipo de chave gera uma CA e os certificados (scripts/gen_certs.py) numa
+pasta temporária, sobe `serve.py` com TLS_ENABLED=1 e abre conexões em `--concurrency`
+threads por `--duration` segundos. Cada conexão faz o handshake e um GET / (que só
+redireciona). No modo "retomado" cada thread reaproveita a sessão da conexão anterior.
+Além da taxa, mostra o tempo de CPU do servidor por handshake (/proc/<pid>/stat).
+
+    $ python scripts/bench_tls.py --duration 5 --concurrency 8
+    $ python scripts/bench_tls.py --mtls        # com certificado de cliente (TLS_CLIENT_AUTH=required)
+"""
+import argparse
+import contextlib
+import io
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gen_certs  # noqa: E402
+from load_test import start_server, wait_for_port  # noqa: E402
+
+from app.tls import client_context  # noqa: E402
+
+REQUEST = b"GET / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+
+
+def server_cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime e stime (campos 14 e 15), em ticks
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def handshake(context, port, session=None):
+    with socket.create_connection(("127.0.0.1", port)) as raw:
+        with context.wrap_socket(raw, server_hostname="localhost", session=session) as conn:
+            conn.sendall(REQUEST)
+            # Ler a resposta processa também os tickets que o servidor manda após o handshake
+            while conn.recv(4096):
+                pass
+            return conn.session, conn.session_reused
+
+
+def run_clients(context, port, resume, duration, concurrency):
+    counts, reused, errors = [0] * concurrency, [0] * concurrency, [0] * concurrency
+    deadline = time.monotonic() + duration
+
+    def worker(i):
+        session = None
+        while time.monotonic() < deadline:
+            try:
+                new_session, was_reused = handshake(context, port, session if resume else None)
+            except (OSError, ValueError):
+                errors[i] += 1
+                session = None
+                continue
+            counts[i] += 1
+            reused[i] += was_reused
+            if resume:
+                session = new_session
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts), sum(reused), sum(errors), time.monotonic() - start
+
+
+def bench_key_type(key_type, args):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        certs = os.path.join(tmp, "certs")
+        with contextlib.redirect_stdout(io.StringIO()):
+            gen_certs.generate_all(key_type, certs)
+
+        env = {
+            "TLS_ENABLED": "1",
+            "TLS_CERT_FILE": os.path.join(certs, "server-cert.pem"),
+            "TLS_KEY_FILE": os.path.join(certs, "server-key.pem"),
+            "TLS_CA_FILE": os.path.join(certs, "ca-cert.pem"),
+            "TLS_CLIENT_AUTH": "required" if args.mtls else "none",
+            "METRICS_ENABLED": "0",
+        }
+        server = start_server(args.mode, args.port, 1000, os.path.join(tmp, "bench.db"), env)
+        try:
+            if not wait_for_port("127.0.0.1", args.port):
+                return [{"key_type": key_type, "error": "servidor não subiu"}]
+
+            context = client_context(
+                os.path.join(certs, "ca-cert.pem"),
+                os.path.join(certs, "client-cert.pem") if args.mtls else None,
+                os.path.join(certs, "client-key.pem") if args.mtls else None,
+            )
+            # Aquecimento: imports preguiçosos e primeira requisição do Flask
+            handshake(context, args.port)
+
+            for mode in ("completo", "retomado"):
+                cpu_before = server_cpu_seconds(server.pid)
+                count, reused, errors, elapsed = run_clients(
+                    context, args.port, mode == "retomado", args.duration, args.concurrency)
+                cpu = server_cpu_seconds(server.pid) - cpu_before
+                results.append({
+                    "key_type": key_type,
+                    "mode": mode,
+                    "handshakes_per_s": count / elapsed,
+                    "reused": reused,
+                    "count": count,
+                    "errors": errors,
+                    "server_cpu_ms": cpu * 1000 / count if count else 0.0,
+                })
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+    return results
+
+
+def print_report(results):
+    header = f"{'chave':<8}{'handshake':<11}{'por s':>9}{'retomados':>11}{'erros':>7}{'CPU servidor':>15}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if "error" in r:
+            print(f"{r['key_type']:<8} erro: {r['error']}")
+            continue
+        print(f"{r['key_type']:<8}{r['mode']:<11}{r['handshakes_per_s']:>9.0f}"
+              f"{r['reused'] / r['count'] * 100 if r['count'] else 0:>10.0f}%{r['errors']:>7}"
+              f"{r['server_cpu_ms']:>12.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--key-types", default="rsa,ecdsa")
+    parser.add_argument("--mode", default="eventlet", help="ASYNC_MODE do servidor")
+    parser.add_argument("--duration", type=float, default=5, help="segundos por medição")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mtls", action="store_true", help="exige certificado do cliente")
+    parser.add_argument("--port", type=int, default=5061)
+    args = parser.parse_args()
+
+    results = []
+    for key_type in args.key_types.split(","):
+        key_type = key_type.strip()
+        if key_type not in gen_certs.KEY_TYPES:
+            raise SystemExit(f"Tipo de chave desconhecido: {key_type} (use {', '.join(gen_certs.KEY_TYPES)})")
+        print(f"Testando {key_type}...")
+        results.extend(bench_key_type(key_type, args))
+
+    print()
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
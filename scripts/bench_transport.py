@@ -0,0 +1,229 @@
+"""
+Bytes trafegados e latência do connect com o perfil de transporte antigo e o atual
+(app/transport.py).
+
+Para cada perfil sobe `serve.py` e coloca um proxy TCP entre os clientes e o servidor,
+que conta os bytes em cada sentido e simula a latência de uma rede móvel (`--rtt-ms`;
+0 para medir só o loopback). Mede, separadamente:
+
+1. páginas e JSON: GET /auth/login, /users/home e /users/allusers (com `--users` online);
+2. Socket.IO: connect + join de `--users` clientes (latência do connect) e `--messages`
+   mensagens por cliente, com o tamanho de ciphertext de uma mensagem curta.
+
+Os clientes oferecem permessage-deflate, como os navegadores. O perfil "antes" usa os
+valores padrão do Engine.IO (long-polling + upgrade, ping 25/20 s, buffer de 1 MB,
+deflate em todos os frames) e não comprime as respostas HTTP.
+
+    $ python scripts/bench_transport.py --users 50 --messages 20 --rtt-ms 100
+
+Requer o cliente assíncrono do python-socketio: pip install "python-socketio[asyncio_client]"
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import socketio
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import create_users, raise_fd_limit, start_server, wait_for_port  # noqa: E402
+
+PROFILES = {
+    "antes": {
+        "env": {
+            "SOCKETIO_WEBSOCKET_ONLY": "0",
+            "SOCKETIO_PING_INTERVAL": "25",
+            "SOCKETIO_PING_TIMEOUT": "20",
+            "SOCKETIO_MAX_HTTP_BUFFER_SIZE": "1000000",
+            "WS_DEFLATE_MIN_SIZE": "0",
+            "WS_DEFLATE_BINARY": "1",
+            "HTTP_COMPRESS_MIN_SIZE": "0",
+        },
+        "transports": ["polling", "websocket"],
+    },
+    "atual": {"env": {}, "transports": ["websocket"]},
+}
+
+
+class CountingProxy:
+    """Proxy TCP que soma os bytes enviados (cliente -> servidor) e recebidos e atrasa
+    cada sentido em `rtt_ms / 2`, simulando a latência de uma rede real."""
+
+    def __init__(self, target_port, rtt_ms=0):
+        self.target_port = target_port
+        self.delay = rtt_ms / 2000
+        self.up = 0
+        self.down = 0
+        self.server = None
+
+    async def start(self, port):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", port)
+
+    def reset(self):
+        self.up = self.down = 0
+
+    async def _handle(self, client_reader, client_writer):
+        try:
+            server_reader, server_writer = await asyncio.open_connection("127.0.0.1", self.target_port)
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(
+            self._pipe(client_reader, server_writer, "up"),
+            self._pipe(server_reader, client_writer, "down"),
+        )
+
+    async def _pipe(self, reader, writer, direction):
+        # Leitura e escrita separadas: o atraso não limita a vazão
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        sender = asyncio.create_task(self._send(queue, writer))
+        try:
+            while data := await reader.read(65536):
+                setattr(self, direction, getattr(self, direction) + len(data))
+                queue.put_nowait((loop.time() + self.delay, data))
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            queue.put_nowait((loop.time() + self.delay, None))
+            await sender
+
+    async def _send(self, queue, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                due, data = await queue.get()
+                if due > loop.time():
+                    await asyncio.sleep(due - loop.time())
+                if data is None:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def measure_http(url, token, proxy):
+    proxy.reset()
+    async with aiohttp.ClientSession(cookies={"token": token}) as http:
+        for path in ("/auth/login", "/users/home", "/users/allusers?limit=100"):
+            async with http.get(url + path) as resp:
+                await resp.read()
+    return {"up": proxy.up, "down": proxy.down}
+
+
+async def measure_socketio(url, users, transports, messages, proxy):
+    proxy.reset()
+    clients, connect_ms = [], []
+
+    for user_id, token in users:
+        client = socketio.AsyncClient(reconnection=False, websocket_extra_options={"compress": 15})
+        start = time.perf_counter()
+        await client.connect(url, headers={"Cookie": f"token={token}"}, transports=transports,
+                             auth={"encoding": "binary"})
+        connect_ms.append((time.perf_counter() - start) * 1000)
+        clients.append((client, user_id))
+
+    # Pares (0, 1), (2, 3)...
+    for i, (client, user_id) in enumerate(clients):
+        other_id = clients[i ^ 1][1] if (i ^ 1) < len(clients) else user_id
+        await client.call("join", {"user2_id": other_id})
+
+    for i, (client, user_id) in enumerate(clients):
+        other_id = clients[i ^ 1][1] if (i ^ 1) < len(clients) else user_id
+        for _ in range(messages):
+            # Mensagem curta: ~40 bytes de texto cifrado + tag do GCM, IV de 12 e HMAC de 32
+            await client.call("send_message", {"receiver": other_id, "ciphertext": os.urandom(56),
+                                               "iv": os.urandom(12), "mac": os.urandom(32)})
+
+    await asyncio.sleep(0.5)
+    await asyncio.gather(*(c.disconnect() for c, _ in clients), return_exceptions=True)
+
+    connect_ms.sort()
+    return {
+        "up": proxy.up,
+        "down": proxy.down,
+        "connect_p50_ms": statistics.median(connect_ms),
+        "connect_p95_ms": connect_ms[min(len(connect_ms) - 1, int(len(connect_ms) * 0.95))],
+    }
+
+
+async def run_profile(name, args):
+    profile = PROFILES[name]
+    proxy = CountingProxy(args.port, args.rtt_ms)
+    await proxy.start(args.port + 1)
+    url = f"http://127.0.0.1:{args.port + 1}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(args.mode, args.port, args.users * 4, os.path.join(tmp, "bench.db"), profile["env"])
+        try:
+            if not wait_for_port("127.0.0.1", args.port):
+                return {"profile": name, "error": "servidor não subiu"}
+
+            users = await create_users(url, args.users)
+            # Todos online para que /users/allusers tenha uma página cheia
+            socket = await measure_socketio(url, users, profile["transports"], args.messages, proxy)
+            holders = []
+            for user_id, token in users:
+                client = socketio.AsyncClient(reconnection=False)
+                await client.connect(url, headers={"Cookie": f"token={token}"}, transports=["websocket"])
+                holders.append(client)
+            http = await measure_http(url, users[0][1], proxy)
+            await asyncio.gather(*(c.disconnect() for c in holders), return_exceptions=True)
+            return {"profile": name, "http": http, "socketio": socket}
+        finally:
+            proxy.server.close()
+            server.terminate()
+            try:
+                server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+
+def print_report(results):
+    header = f"{'perfil':<8}{'HTTP ↑ KB':>11}{'HTTP ↓ KB':>11}{'WS ↑ KB':>10}{'WS ↓ KB':>10}" \
+             f"{'connect p50':>13}{'connect p95':>13}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if "error" in r:
+            print(f"{r['profile']:<8} erro: {r['error']}")
+            continue
+        h, s = r["http"], r["socketio"]
+        print(f"{r['profile']:<8}{h['up'] / 1024:>11.1f}{h['down'] / 1024:>11.1f}{s['up'] / 1024:>10.1f}"
+              f"{s['down'] / 1024:>10.1f}{s['connect_p50_ms']:>11.1f}ms{s['connect_p95_ms']:>11.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="antes,atual")
+    parser.add_argument("--mode", default="eventlet")
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--messages", type=int, default=20, help="mensagens enviadas por cliente")
+    parser.add_argument("--rtt-ms", type=float, default=100, help="latência simulada pelo proxy (ida e volta)")
+    parser.add_argument("--port", type=int, default=5059, help="porta do servidor (o proxy usa a seguinte)")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    results = []
+    for name in args.profiles.split(","):
+        name = name.strip()
+        if name not in PROFILES:
+            raise SystemExit(f"Perfil desconhecido: {name} (use {', '.join(PROFILES)})")
+        print(f"Testando {name}...")
+        results.append(asyncio.run(run_profile(name, args)))
+
+    print()
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,38 @@
-import ssl
+"""
+Contextos TLS com os certificados de certs/ (scripts/gen_certs.py).
+
+Os contextos são montados na primeira chamada e reaproveitados: é no contexto que
+ficam os session tickets (servidor) e as sessões para retomar (cliente). O servidor
+de produção usa app/tls.py diretamente (TLS_ENABLED=1 python serve.py).
+"""
+import functools
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.tls import client_context, server_context  # noqa: E402
 
 CERTS_DIR = "certs"
 
+
+@functools.lru_cache(maxsize=None)
 def get_server_ssl_context():
     """Configura o contexto para o Servidor (exige certificado do cliente)"""
-    # Contexto para o servidor autenticar o cliente
-    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-    
-    # Certificado do servidor e sua chave privada
-    context.load_cert_chain(
-        certfile=os.path.join(CERTS_DIR, "server-cert.pem"), 
-        keyfile=os.path.join(CERTS_DIR, "server-key.pem")
+    return server_context(
+        certfile=os.path.join(CERTS_DIR, "server-cert.pem"),
+        keyfile=os.path.join(CERTS_DIR, "server-key.pem"),
+        # mTLS: a CA verifica os certificados dos clientes
+        cafile=os.path.join(CERTS_DIR, "ca-cert.pem"),
+        client_auth="required",
     )
-    
-    # Carrega a CA para verificar os certificados dos clientes
-    context.load_verify_locations(cafile=os.path.join(CERTS_DIR, "ca-cert.pem"))
-    
-    # mTLS 
-    context.verify_mode = ssl.CERT_REQUIRED
-    
-    return context
 
+
+@functools.lru_cache(maxsize=None)
 def get_client_ssl_context():
     """Configura o contexto para o Cliente (apresenta certificado ao servidor)"""
-    # Contexto para o cliente verificar o servidor
-    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
-    
-    # Certificado do cliente e sua chave privada
-    context.load_cert_chain(
-        certfile=os.path.join(CERTS_DIR, "client-cert.pem"), 
-        keyfile=os.path.join(CERTS_DIR, "client-key.pem")
+    return client_context(
+        cafile=os.path.join(CERTS_DIR, "ca-cert.pem"),
+        certfile=os.path.join(CERTS_DIR, "client-cert.pem"),
+        keyfile=os.path.join(CERTS_DIR, "client-key.pem"),
     )
-    
-    # CA para validar o servidor
-    context.load_verify_locations(cafile=os.path.join(CERTS_DIR, "ca-cert.pem"))
-    
-    return context
\ No newline at end of file
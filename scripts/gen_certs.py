@@ -1,3 +1,4 @@
+import argparse
 import os
 import ipaddress
 import platform
@@ -5,15 +6,25 @@ from datetime import datetime, timedelta, timezone
 from cryptography import x509
 from cryptography.x509.oid import NameOID
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.serialization import pkcs12
 
 # configurações
 certs_dir = "certs"
-key_size = 2048
+key_size = 2048           # rsa
 validity_days = 365
 
+# ecdsa p-256: handshake completo bem mais barato para o servidor que rsa-2048
+KEY_TYPES = ("ecdsa", "rsa")
+
+def generate_key(key_type="ecdsa"):
+    if key_type == "ecdsa":
+        return ec.generate_private_key(ec.SECP256R1())
+    if key_type == "rsa":
+        return rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+    raise ValueError(f"tipo de chave inválido: {key_type} (use {', '.join(KEY_TYPES)})")
+
 def save_key(key, filename):
     path = os.path.join(certs_dir, filename)
     with open(path, "wb") as f:
@@ -30,10 +41,10 @@ def save_cert(cert, filename):
         f.write(cert.public_bytes(serialization.Encoding.PEM))
     print(f"[ok] certificado salvo: {path}")
 
-def generate_ca():
+def generate_ca(key_type="ecdsa"):
     """gera a autoridade certificadora (ca) raiz"""
     print("--- gerando autoridade certificadora (ca) ---")
-    key = rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+    key = generate_key(key_type)
     
     subject = issuer = x509.Name([
         x509.NameAttribute(NameOID.COUNTRY_NAME, u"br"),
@@ -61,10 +72,10 @@ def generate_ca():
     save_cert(cert, "ca-cert.pem")
     return key, cert
 
-def generate_client_cert(ca_key, ca_cert):
+def generate_client_cert(ca_key, ca_cert, key_type="ecdsa"):
     """gera o certificado do cliente assinado pela ca"""
     print("\n--- gerando certificado do cliente ---")
-    key = rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+    key = generate_key(key_type)
 
     subject = x509.Name([
         x509.NameAttribute(NameOID.COUNTRY_NAME, u"br"),
@@ -98,10 +109,10 @@ def generate_client_cert(ca_key, ca_cert):
     save_cert(cert, "client-cert.pem")
     return key, cert
 
-def generate_server_cert(ca_key, ca_cert):
+def generate_server_cert(ca_key, ca_cert, key_type="ecdsa"):
     """gera o certificado do servidor assinado pela ca"""
     print("\n--- gerando certificado do servidor (localhost) ---")
-    key = rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+    key = generate_key(key_type)
     
     subject = x509.Name([
         x509.NameAttribute(NameOID.COUNTRY_NAME, u"br"),
@@ -153,24 +164,38 @@ def generate_pkcs12(client_key, client_cert, ca_cert):
     print(f"[ok] arquivo PKCS#12 salvo: {path}")
     print("    Senha: password")
 
-if __name__ == "__main__":
+def generate_all(key_type="ecdsa", out_dir=None):
+    """ca, servidor e cliente em `out_dir` (padrão: certs/); devolve (chave, cert) do cliente"""
+    global certs_dir
+    if out_dir is not None:
+        certs_dir = out_dir
     if not os.path.exists(certs_dir):
         os.makedirs(certs_dir)
-    
+
     # 1. gera a ca
-    ca_key, ca_cert = generate_ca()
-    
+    ca_key, ca_cert = generate_ca(key_type)
+
     # 2. gera o certificado do servidor usando a ca
-    generate_server_cert(ca_key, ca_cert)
-    
+    generate_server_cert(ca_key, ca_cert, key_type)
+
     # 3. gera o certificado do cliente usando a ca
-    client_key, client_cert = generate_client_cert(ca_key, ca_cert)
+    client_key, client_cert = generate_client_cert(ca_key, ca_cert, key_type)
+    return ca_cert, client_key, client_cert
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="gera ca, certificado do servidor e do cliente (mTLS)")
+    parser.add_argument("--key-type", choices=KEY_TYPES, default="ecdsa",
+                        help="ecdsa (p-256, padrão) ou rsa (2048 bits, para clientes antigos)")
+    parser.add_argument("--out", default=certs_dir, help="pasta de saída")
+    args = parser.parse_args()
+
+    ca_cert, client_key, client_cert = generate_all(args.key_type, args.out)
     
     # 4. gera o arquivo .p12 para Windows (apenas no Windows)
     if platform.system() == "Windows":
         generate_pkcs12(client_key, client_cert, ca_cert)
     
-    print("\n✓ Certificados gerados na pasta \"certs/\"!")
+    print(f"\n✓ Certificados {args.key_type} gerados na pasta \"{certs_dir}/\"!")
     print("  - CA: ca-cert.pem, ca-key.pem")
     print("  - Servidor: server-cert.pem, server-key.pem")
     print("  - Cliente: client-cert.pem, client-key.pem")
@@ -0,0 +1,227 @@
+"""
+Teste de carga: quantas conexões de chat simultâneas um processo aguenta em cada async mode.
+
+Para cada modo, sobe `serve.py` num subprocesso e abre conexões Socket.IO (websocket)
+em degraus; cada par de clientes entra numa sala e troca uma mensagem no final.
+
+    $ python scripts/load_test.py --modes eventlet,gevent,threading --connections 2000 --step 250
+
+Requer o cliente assíncrono do python-socketio: pip install "python-socketio[asyncio_client]"
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import socketio
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def server_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def wait_for_port(host, port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def start_server(mode, port, max_connections, db_path, extra_env=None):
+    env = dict(os.environ)
+    env.update({
+        "ASYNC_MODE": mode,
+        "HOST": "127.0.0.1",
+        "PORT": str(port),
+        "MAX_CONNECTIONS": str(max_connections),
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "BCRYPT_ROUNDS": "4",   # cadastro/login baratos: o alvo aqui são as conexões
+        "RATE_LIMIT_ENABLED": "0",   # todos os clientes vêm do mesmo IP
+        "DB_AUTO_CREATE": "1",       # banco novo a cada execução
+        "STARTUP_REPORT": "off",
+    })
+    env.update(extra_env or {})
+    return subprocess.Popen(
+        [sys.executable, "serve.py"],
+        cwd=ROOT_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def token_user_id(token):
+    payload = token.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))["user_id"]
+
+
+async def create_users(url, count):
+    """Cadastra e loga `count` usuários; devolve [(user_id, token), ...]."""
+    users = []
+    async with aiohttp.ClientSession() as http:
+        for i in range(count):
+            credentials = {"username": f"load_{i}", "password": "load"}
+            async with http.post(f"{url}/auth/register", json=credentials) as resp:
+                resp.raise_for_status()
+            async with http.post(f"{url}/auth/login", json=credentials) as resp:
+                resp.raise_for_status()
+                token = resp.cookies["token"].value
+            users.append((token_user_id(token), token))
+    return users
+
+
+async def open_client(url, user_id, other_id, token, timeout):
+    client = socketio.AsyncClient(reconnection=False)
+    received = asyncio.Event()
+
+    @client.on("receive_message")
+    async def on_message(data):
+        if data["sender"] != user_id:
+            received.set()
+
+    start = time.perf_counter()
+    await client.connect(url, headers={"Cookie": f"token={token}"}, transports=["websocket"],
+                         wait_timeout=timeout)
+    await client.emit("join", {"user1_id": user_id, "user2_id": other_id})
+    return client, received, (time.perf_counter() - start) * 1000
+
+
+async def run_mode(mode, args):
+    port = args.port
+    url = f"http://127.0.0.1:{port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(mode, port, args.connections * 2, os.path.join(tmp, "load.db"))
+        try:
+            if not wait_for_port("127.0.0.1", port):
+                return {"mode": mode, "error": "servidor não subiu"}
+
+            users = await create_users(url, args.connections)
+
+            clients = {}   # índice do usuário -> (cliente, evento de recebimento, latência)
+            latencies = []
+            failed = 0
+
+            # Abre as conexões em degraus de `step`
+            for base in range(0, args.connections, args.step):
+                batch = range(base, min(base + args.step, args.connections))
+                results = await asyncio.gather(
+                    *(open_client(url, users[i][0], users[min(i ^ 1, len(users) - 1)][0], users[i][1], args.timeout)
+                      for i in batch),
+                    return_exceptions=True,
+                )
+                for i, result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        failed += 1
+                    else:
+                        clients[i] = result
+                        latencies.append(result[2])
+
+            await asyncio.sleep(args.hold)
+
+            # O primeiro cliente de cada par manda uma mensagem; o segundo deve recebê-la
+            for idx, (client, _, _) in clients.items():
+                if idx % 2 == 0 and idx + 1 < len(users) and client.connected:
+                    await client.emit("send_message", {
+                        "sender": users[idx][0],
+                        "receiver": users[idx + 1][0],
+                        "ciphertext": base64.b64encode(b"x" * 48).decode(),
+                        "iv": base64.b64encode(b"i" * 12).decode(),
+                        "mac": base64.b64encode(b"m" * 32).decode(),
+                    })
+
+            await asyncio.sleep(args.settle)
+            alive = sum(1 for c in clients.values() if c[0].connected)
+            delivered = sum(1 for i, c in clients.items() if i % 2 == 1 and c[1].is_set())
+            rss = server_rss_mb(server.pid)
+
+            await asyncio.gather(*(c[0].disconnect() for c in clients.values()), return_exceptions=True)
+
+            latencies.sort()
+            return {
+                "mode": mode,
+                "target": args.connections,
+                "connected": len(clients),
+                "alive": alive,
+                "failed": failed,
+                "delivered_pairs": delivered,
+                "connect_p50_ms": statistics.median(latencies) if latencies else 0.0,
+                "connect_p99_ms": latencies[int(len(latencies) * 0.99) - 1] if latencies else 0.0,
+                "rss_mb": rss,
+            }
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+
+def print_report(results):
+    header = f"{'modo':<10}{'alvo':>7}{'conect.':>9}{'vivas':>8}{'falhas':>8}{'pares ok':>10}" \
+             f"{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if "error" in r:
+            print(f"{r['mode']:<10} erro: {r['error']}")
+            continue
+        print(f"{r['mode']:<10}{r['target']:>7}{r['connected']:>9}{r['alive']:>8}{r['failed']:>8}"
+              f"{r['delivered_pairs']:>10}{r['connect_p50_ms']:>9.1f}{r['connect_p99_ms']:>9.1f}"
+              f"{r['rss_mb']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="eventlet,gevent,threading")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--step", type=int, default=250)
+    parser.add_argument("--hold", type=float, default=5.0, help="segundos com todas as conexões abertas")
+    parser.add_argument("--settle", type=float, default=2.0, help="espera pela entrega das mensagens")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    limit = raise_fd_limit()
+    if limit < args.connections * 2 + 100:
+        print(f"Aviso: limite de arquivos abertos ({limit}) pode limitar o teste.")
+
+    results = []
+    for mode in args.modes.split(","):
+        print(f"Testando {mode}...")
+        results.append(asyncio.run(run_mode(mode.strip(), args)))
+
+    print()
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Broker local de estado + fila de mensagens para rodar vários workers sem Redis.
+
+    $ export STATE_BROKER_AUTHKEY=$(python -c "import secrets; print(secrets.token_hex(32))")
+    $ python scripts/state_broker.py                       # escuta em 127.0.0.1:6500
+    $ STATE_BACKEND_URL=manager://127.0.0.1:6500 SOCKETIO_MESSAGE_QUEUE=manager://127.0.0.1:6500 \
+        PORT=5001 python serve.py
+    $ STATE_BACKEND_URL=manager://127.0.0.1:6500 SOCKETIO_MESSAGE_QUEUE=manager://127.0.0.1:6500 \
+        PORT=5002 python serve.py
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config  # noqa: E402
+from app.shared_state import broker_authkey, serve_broker  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Broker local de estado do WhatsChat")
+    parser.add_argument("--url", default="manager://127.0.0.1:6500")
+    args = parser.parse_args()
+
+    try:
+        authkey = broker_authkey({"STATE_BROKER_AUTHKEY": Config.STATE_BROKER_AUTHKEY})
+    except ValueError as exc:
+        sys.exit(str(exc))
+
+    print(f"Broker de estado em {args.url}")
+    serve_broker(
+        args.url,
+        authkey,
+        room_capacity=Config.MESSAGE_STORE_ROOM_CAPACITY,
+        max_bytes=Config.MESSAGE_STORE_MAX_BYTES,
+    )
+
+
+if __name__ == "__main__":
+    main()
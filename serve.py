@@ -0,0 +1,111 @@
+"""
+Ponto de entrada de produção (sem debug e sem reloader).
+
+O modo assíncrono vem da variável ASYNC_MODE (ver app/config.py):
+
+    $ ASYNC_MODE=eventlet python serve.py
+    $ ASYNC_MODE=gevent MAX_CONNECTIONS=20000 python serve.py
+    $ TLS_ENABLED=1 python serve.py        # HTTPS com os certificados de certs/ (app/tls.py)
+
+O monkey patching precisa acontecer antes de qualquer outro import,
+por isso o modo é lido direto do ambiente aqui no topo.
+
+O schema não é criado aqui: rode `flask setup-db` no deploy, antes de subir
+(ou DB_AUTO_CREATE=1). O tempo de cada fase da subida sai no stdout (STARTUP_REPORT).
+"""
+import time
+
+STARTED = time.perf_counter()
+
+import os  # noqa: E402
+
+ASYNC_MODE = os.environ.get("ASYNC_MODE") or "eventlet"
+os.environ["ASYNC_MODE"] = ASYNC_MODE
+
+if ASYNC_MODE == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
+from app import create_app, db, socketio, tls  # noqa: E402
+from app.database import check_schema  # noqa: E402
+from app.startup import StartupTimer  # noqa: E402
+
+timer = StartupTimer(STARTED)
+timer.mark("imports", STARTED)
+app = create_app(timer=timer)
+
+
+def serve_eventlet(config, host, port, ssl_context):
+    import eventlet.wsgi
+
+    listener = eventlet.listen((host, port), backlog=config["SERVER_BACKLOG"])
+    if ssl_context is not None:
+        # Handshake na primeira leitura, no greenlet da conexão (não trava o accept)
+        listener = ssl_context.wrap_socket(listener, server_side=True, do_handshake_on_connect=False)
+    # max_size: número máximo de greenlets atendendo conexões ao mesmo tempo
+    eventlet.wsgi.server(listener, app, max_size=config["SERVER_MAX_CONNECTIONS"], log_output=False)
+
+
+def serve_gevent(config, host, port, ssl_context):
+    from gevent.pool import Pool
+
+    tls_args = {"ssl_context": ssl_context} if ssl_context is not None else {}
+
+    socketio.run(
+        app,
+        host=host,
+        port=port,
+        debug=False,
+        use_reloader=False,
+        log_output=False,
+        spawn=Pool(config["SERVER_MAX_CONNECTIONS"]),
+        backlog=config["SERVER_BACKLOG"],
+        **tls_args,
+    )
+
+
+def serve_threading(config, host, port, ssl_context):
+    # Servidor do Werkzeug: só para ambientes sem eventlet/gevent
+    socketio.run(
+        app,
+        host=host,
+        port=port,
+        debug=False,
+        use_reloader=False,
+        log_output=False,
+        allow_unsafe_werkzeug=True,
+        ssl_context=ssl_context,
+    )
+
+
+SERVERS = {
+    "eventlet": serve_eventlet,
+    "gevent": serve_gevent,
+    "threading": serve_threading,
+}
+
+
+def main():
+    config = app.config
+    host = config["SERVER_HOST"]
+    port = config["SERVER_PORT"]
+
+    if ASYNC_MODE not in SERVERS:
+        raise SystemExit(f"ASYNC_MODE inválido: {ASYNC_MODE} (use {', '.join(SERVERS)})")
+
+    with timer.phase("schema"):
+        check_schema(app, db)
+
+    tls.watch(socketio)
+    timer.report(config["STARTUP_REPORT"])
+    print(f"Servidor em {'https' if tls.enabled else 'http'}://{host}:{port} "
+          f"(async_mode={socketio.server.async_mode}, max_connections={config['SERVER_MAX_CONNECTIONS']})")
+
+    SERVERS[ASYNC_MODE](config, host, port, tls.context)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+# Antes de importar o app: sem eventlet/gevent e sem o build dos bundles
+os.environ.setdefault("ASYNC_MODE", "threading")
+os.environ.setdefault("ASSETS_ENABLED", "0")
+
+from app import create_app, db  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.database import check_schema  # noqa: E402
+
+
+class TestConfig(Config):
+    TESTING = True
+    DB_AUTO_CREATE = True
+    # Cadastros de vários testes saem do mesmo IP; test_rate_limit.py liga o limite
+    RATE_LIMIT_ENABLED = False
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    # Um app por sessão: os eventos do Socket.IO são registrados no primeiro create_app
+    tmp = tmp_path_factory.mktemp("app")
+    TestConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp / 'test.db'}"
+    TestConfig.ATTACHMENT_DIR = str(tmp / "attachments")
+    app = create_app(TestConfig)
+    # Mesma sequência da subida do run.py/serve.py
+    check_schema(app, db)
+    return app
+
+
+@pytest.fixture
+def login(app):
+    """Cadastra e loga um usuário; devolve (test_client do Flask, user_id)."""
+    def factory(username, password="senha123"):
+        client = app.test_client()
+        client.post("/auth/register", json={"username": username, "password": password})
+        resp = client.post("/auth/login", json={"username": username, "password": password})
+        assert resp.status_code == 200, resp.get_json()
+        return client, client.get("/users/me").get_json()["id"]
+
+    return factory
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta, timezone
+
+from app import attachments, db, socketio
+from app.models.attachment import Attachment
+
+
+def test_pending_uploads_are_capped_and_purged(app, login):
+    client, user_id = login("carla")
+    _, other_id = login("davi")
+    sock = socketio.test_client(app, flask_test_client=client)
+
+    def create():
+        return sock.emit("create_attachment", {"receiver": other_id, "size": 10}, callback=True)
+
+    acks = [create() for _ in range(attachments.max_pending + 1)]
+    assert all(ack["ok"] for ack in acks[:-1])
+    assert acks[-1] == {"ok": False, "error": "too_many_pending"}
+    # A limpeza periódica sobe junto com o primeiro envio
+    assert attachments._task is not None
+
+    # Envios abandonados: depois do TTL a limpeza libera a cota
+    with app.app_context():
+        old = datetime.now(timezone.utc) - timedelta(seconds=attachments.incomplete_ttl + 1)
+        Attachment.query.filter_by(owner_id=user_id).update({"created_at": old})
+        db.session.commit()
+        assert attachments.purge_incomplete() == attachments.max_pending
+
+    assert create()["ok"]
+    sock.disconnect()
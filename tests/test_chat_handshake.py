@@ -0,0 +1,48 @@
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+
+from app import message_log, socketio
+
+
+def bundle():
+    identity, prekey = ec.generate_private_key(ec.SECP256R1()), ec.generate_private_key(ec.SECP256R1())
+    raw = prekey.public_key().public_bytes(serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint)
+    r, s = decode_dss_signature(identity.sign(raw, ec.ECDSA(hashes.SHA256())))
+    return {
+        "identity_key": identity.public_key().public_bytes(serialization.Encoding.X962,
+                                                           serialization.PublicFormat.UncompressedPoint),
+        "signed_prekey": raw,
+        "signature": r.to_bytes(32, "big") + s.to_bytes(32, "big"),
+        "prekey_id": 1,
+    }
+
+
+def history(sock):
+    return [e["args"][0] for e in sock.get_received() if e["name"] == "load_history"]
+
+
+def test_first_in_room_learns_when_peer_joins(app, login, monkeypatch):
+    """B entra sozinho (log persistente), A sem bundle ainda; A publica e entra depois."""
+    monkeypatch.setattr(message_log, "enabled", True)
+    client_a, a_id = login("alice_hs")
+    client_b, b_id = login("bruno_hs")
+    auth = {"encoding": "binary"}
+    b = socketio.test_client(app, flask_test_client=client_b, auth=auth)
+
+    # B não acha o bundle de A: troca ao vivo, com a chave indo para a sala vazia
+    assert b.emit("fetch_prekey_bundle", {"user_id": a_id}, callback=True)["ok"] is False
+    b.emit("join", {"user2_id": a_id})
+    assert history(b)
+    b.emit("send_dh_public_key", {"receiver": a_id, "dh_public_key": b"\x04" + b"\x01" * 64})
+
+    a = socketio.test_client(app, flask_test_client=client_a, auth=auth)
+    assert a.emit("upload_prekey_bundle", bundle(), callback=True)["ok"]
+    a.emit("join", {"user2_id": b_id})
+
+    # B fica sabendo que A entrou (cabeçalho) e agora encontra o bundle dele
+    headers = history(b)
+    assert [h.get("joined") for h in headers] == [a_id]
+    assert b.emit("fetch_prekey_bundle", {"user_id": a_id}, callback=True)["ok"] is True
+    a.disconnect()
+    b.disconnect()
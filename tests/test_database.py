@@ -0,0 +1,17 @@
+import logging
+
+from app import db
+from app.database import schema_status
+from app.log import DroppingQueueHandler
+
+
+def test_auto_create_keeps_app_logging(app):
+    # O fixture `app` sobe com DB_AUTO_CREATE: create_all + stamp dentro do processo
+    root = logging.getLogger()
+
+    assert schema_status(app, db) == "current"
+    assert any(isinstance(h, DroppingQueueHandler) for h in root.handlers)
+    assert not any(type(h) is logging.StreamHandler for h in root.handlers)
+    assert root.level == logging.getLevelName(app.config["LOG_LEVEL"].upper())
+    assert not logging.getLogger("app.socket_events").disabled
+    assert not logging.getLogger("app.database").disabled
@@ -0,0 +1,43 @@
+import threading
+from types import SimpleNamespace
+
+import engineio
+from engineio.socket import Socket
+
+from app.fanout import FanoutPipeline
+
+
+def test_reservations_never_exceed_max_pending():
+    pipeline = FanoutPipeline(max_pending=50)
+    accepted = []
+    start = threading.Barrier(8)
+
+    def sender():
+        start.wait()
+        accepted.extend(ok for ok in (pipeline.reserve("room") for _ in range(20)) if ok)
+
+    threads = [threading.Thread(target=sender) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(accepted) == 50 and pipeline.rejected == 8 * 20 - 50
+
+    # Vaga devolvida (falha antes do publish) volta a valer
+    pipeline.release("room")
+    assert pipeline.reserve("room") and not pipeline.reserve("room")
+
+
+def test_connection_with_full_queue_is_dropped():
+    eio = engineio.Server(async_mode="threading")
+    pipeline = FanoutPipeline(max_conn_queue=3)
+    pipeline._socketio = SimpleNamespace(server=SimpleNamespace(eio=eio))
+    slow, fast = Socket(eio, "lento"), Socket(eio, "rapido")
+    eio.sockets.update(lento=slow, rapido=fast)
+    for _ in range(5):
+        slow.queue.put("pacote")
+    fast.queue.put("pacote")
+
+    pipeline.drop_laggards()
+    assert set(eio.sockets) == {"rapido"} and slow.closed
+    assert pipeline.dropped_connections == 1
@@ -0,0 +1,30 @@
+from app import db, groups, socketio
+from app.models.group import GroupMember
+
+
+def test_member_removed_elsewhere_gets_no_keys(app, login):
+    """Remoção feita por outro worker (só no banco): o cache daqui ainda lista o membro."""
+    client_a, a_id = login("ana_grp")
+    client_c, c_id = login("caio_grp")
+    auth = {"encoding": "binary"}
+    a = socketio.test_client(app, flask_test_client=client_a, auth=auth)
+    c = socketio.test_client(app, flask_test_client=client_c, auth=auth)
+
+    group_id = a.emit("create_group", {"name": "grp", "members": [c_id]}, callback=True)["group_id"]
+    assert a.emit("join_group", {"group_id": group_id}, callback=True)["ok"]
+    assert c.emit("join_group", {"group_id": group_id}, callback=True)["ok"]
+
+    with app.app_context():
+        GroupMember.query.filter_by(group_id=group_id, user_id=c_id).delete()
+        db.session.commit()
+    assert c_id in groups.members(group_id)
+
+    key = {"group_id": group_id, "dh_public_key": b"\x04" + b"\x01" * 64}
+    assert c.emit("send_group_public_key", key, callback=True) == {"ok": False, "error": "forbidden"}
+    a.get_received()
+    sent = a.emit("send_sender_key", {"group_id": group_id, "keys": [
+        {"to": c_id, "ciphertext": b"x", "iv": b"y", "mac": b"z"},
+    ]}, callback=True)
+    assert sent == {"ok": True, "delivered": 0}
+    a.disconnect()
+    c.disconnect()
@@ -0,0 +1,54 @@
+from app.message_store import MessageStore
+from app.shared_state import MemoryStateBackend
+
+
+def test_budget_counts_buffers_of_seeded_rooms():
+    store = MessageStore(room_capacity=500, max_bytes=10_000)
+    for i in range(1000):
+        store.seed(f"room_{i}", 41)
+
+    assert store.total_bytes <= store.max_bytes
+    assert store.evicted_rooms > 0
+    assert store.last_seq("room_999") == 41
+    assert store.append("room_999", 1, "c", "i", "m").seq == 42
+
+
+def test_ring_wraps_after_lazy_growth():
+    store = MessageStore(room_capacity=3)
+    for n in range(1, 8):
+        store.append("room", 1, f"c{n}", "i", "m")
+
+    page = store.page("room", 0, 10)
+    assert [m["ciphertext"] for m in page["messages"]] == ["c5", "c6", "c7"]
+    assert store.total_bytes == store.room_bytes("room")
+
+    store.drop("room")
+    assert store.total_bytes == 0
+
+
+def test_budget_keeps_rooms_with_members():
+    state = MemoryStateBackend(MessageStore(room_capacity=50, max_bytes=4000))
+    store = state.message_store
+    state.add_member("room_ativa", 1, "w1", 60)
+    for n in range(5):
+        state.append_message("room_ativa", 1, f"a{n}", "i", "m")
+
+    # Salas ociosas mais recentes enchem o orçamento: sai a ociosa, não a ativa
+    for n in range(30):
+        state.append_message(f"room_{n % 3}", 2, f"o{n}", "i", "m")
+    assert "room_ativa" in store and store.evicted_rooms > 0
+    assert store.total_bytes <= store.max_bytes
+
+
+def test_budget_trims_oldest_messages_when_every_room_is_active():
+    state = MemoryStateBackend(MessageStore(room_capacity=50, max_bytes=3000))
+    store = state.message_store
+    for room in ("room_a", "room_b"):
+        state.add_member(room, 1, "w1", 60)
+    for n in range(40):
+        state.append_message("room_a" if n % 2 else "room_b", 1, f"c{n}", "i", "m")
+
+    assert store.evicted_rooms == 0 and store.trimmed_messages > 0
+    assert "room_a" in store and "room_b" in store
+    assert store.total_bytes <= store.max_bytes
+    assert state.last_seq("room_b") == 20
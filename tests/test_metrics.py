@@ -0,0 +1,21 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+
+def test_metrics_not_exposed_without_token(app):
+    assert app.config["METRICS_TOKEN"] is None
+    client = app.test_client()
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics/profile").status_code == 404
+
+
+def test_failed_query_does_not_leak_timer(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM tabela_que_nao_existe"))
+            conn.execute(text("SELECT 1"))
+            assert conn.info.get("metrics_start") == []
@@ -0,0 +1,31 @@
+from app import presence, socketio
+
+
+def connect(app, client):
+    return socketio.test_client(app, flask_test_client=client)
+
+
+def test_heartbeat_after_sweep_restores_presence(app, login, monkeypatch):
+    client, user_id = login("ana")
+    sock = connect(app, client)
+    assert presence.is_online(user_id)
+
+    # Aba em segundo plano: o heartbeat atrasou mais que o timeout
+    monkeypatch.setattr(presence, "heartbeat_timeout", -1)
+    presence.sweep()
+    assert not presence.is_online(user_id)
+
+    sock.emit("heartbeat")
+    assert presence.is_online(user_id)
+    sock.disconnect()
+
+
+def test_logout_disconnects_sockets(app, login):
+    client, user_id = login("bia")
+    sock = connect(app, client)
+    assert sock.is_connected()
+
+    client.get("/auth/logout")
+
+    assert not presence.is_online(user_id)
+    assert not sock.is_connected()
@@ -0,0 +1,37 @@
+from app import rate_limiter
+from app.rate_limit import MemoryRateLimitBackend
+
+
+def login(client, ip, remote_addr="127.0.0.1"):
+    return client.post("/auth/login", json={"username": "ninguem", "password": "x"},
+                       headers={"X-Forwarded-For": ip}, environ_base={"REMOTE_ADDR": remote_addr})
+
+
+def test_login_limit_is_per_client_behind_ngrok(app, monkeypatch):
+    # Padrão do run.py com o túnel: todas as requisições chegam do mesmo IP (o ngrok)
+    assert app.config["NGROK_ENABLED"] and app.config["RATE_LIMIT_PROXY_HOPS"] is None
+    monkeypatch.setattr(rate_limiter, "enabled", True)
+    monkeypatch.setattr(rate_limiter, "backend", MemoryRateLimitBackend())
+    monkeypatch.setattr(rate_limiter, "proxy_hops", rate_limiter.proxy_hops)
+    monkeypatch.setattr(rate_limiter, "loopback_proxy", rate_limiter.loopback_proxy)
+    rate_limiter.behind_tunnel(app)
+
+    client = app.test_client()
+    statuses = [login(client, "203.0.113.7").status_code for _ in range(11)]
+    assert statuses[-1] == 429 and 429 not in statuses[:-1]
+
+    # Outro cliente pelo mesmo túnel não herda o bloqueio
+    assert login(client, "198.51.100.2").status_code == 404
+
+
+def test_forwarded_for_ignored_outside_the_tunnel(app, monkeypatch):
+    # Acesso direto à porta (0.0.0.0:5000): trocar o X-Forwarded-For não renova o balde
+    monkeypatch.setattr(rate_limiter, "enabled", True)
+    monkeypatch.setattr(rate_limiter, "backend", MemoryRateLimitBackend())
+    monkeypatch.setattr(rate_limiter, "proxy_hops", rate_limiter.proxy_hops)
+    monkeypatch.setattr(rate_limiter, "loopback_proxy", rate_limiter.loopback_proxy)
+    rate_limiter.behind_tunnel(app)
+
+    client = app.test_client()
+    statuses = [login(client, f"203.0.113.{i}", "192.0.2.50").status_code for i in range(11)]
+    assert statuses[-1] == 429
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+from flask import Flask
+
+from app.shared_state import MemoryStateBackend, PubSubBroker, SharedState, socketio_queue_options
+
+
+def test_member_stays_while_another_worker_has_tabs():
+    state = MemoryStateBackend()
+    state.add_member("room_1_2", 1, "w1", 60)
+    state.add_member("room_1_2", 1, "w2", 60)
+
+    # Última aba do usuário no w1 fechou; a do w2 continua
+    assert state.remove_member("room_1_2", 1, "w1") == {1}
+    assert state.remove_member("room_1_2", 1, "w2") == set()
+
+
+def test_entries_of_a_dead_worker_expire(monkeypatch):
+    state = MemoryStateBackend()
+    state.add_member("room_1_2", 1, "vivo", 60)
+    state.add_member("room_1_2", 2, "caiu", 60)
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 45)
+    state.refresh_members("vivo", {"room_1_2": [1]}, 60)
+
+    monkeypatch.setattr(time, "time", lambda: now + 90)
+    assert state.members("room_1_2") == {1}
+
+
+def test_manager_backend_requires_authkey():
+    app = Flask(__name__)
+    app.config.update(STATE_BACKEND_URL="manager://127.0.0.1:1", SOCKETIO_MESSAGE_QUEUE="manager://127.0.0.1:1",
+                      STATE_BROKER_AUTHKEY="", STATE_MEMBER_TTL=120)
+    with pytest.raises(ValueError, match="STATE_BROKER_AUTHKEY"):
+        SharedState().init_app(app)
+    with pytest.raises(ValueError, match="STATE_BROKER_AUTHKEY"):
+        socketio_queue_options(app)
+
+
+def test_slow_subscriber_loses_oldest_not_subscription():
+    broker = PubSubBroker(max_pending=2)
+    slow, fast = broker.subscribe(), broker.subscribe()
+    for i in range(3):
+        broker.publish(i)
+        assert fast.get_nowait() == i
+
+    # O lento perdeu só a mais antiga e continua recebendo
+    assert broker.dropped == 1
+    broker.publish(3)
+    assert [slow.get_nowait() for _ in range(2)] == [2, 3] and fast.get_nowait() == 3
+
+    slow.close()
+    broker.publish(4)
+    assert slow.empty() and fast.get_nowait() == 4
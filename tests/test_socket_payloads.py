@@ -0,0 +1,28 @@
+import itertools
+
+import pytest
+
+from app import room_registry, socketio
+
+usernames = (f"davi_payload{n}" for n in itertools.count())
+
+
+@pytest.mark.parametrize("event, payload", [
+    ("join", {"user2_id": 2, "since_seq": "x"}),
+    ("join", {"since_seq": 0}),
+    ("join", "user2_id"),
+    ("load_history", {"other_id": "abc"}),
+    ("load_history", None),
+    ("leave", {}),
+    ("send_message", {"receiver": None}),
+    ("join_group", {"group_id": 1, "since_seq": [1]}),
+    ("leave_group", {"group_id": "g"}),
+])
+def test_invalid_payload_is_refused_without_side_effects(app, login, event, payload):
+    client, user_id = login(next(usernames))
+    sock = socketio.test_client(app, flask_test_client=client, auth={"encoding": "binary"})
+
+    assert sock.emit(event, payload, callback=True) == {"ok": False, "error": "invalid_payload"}
+    assert not any(user_id in users for users in room_registry.memberships().values())
+    assert sock.is_connected()
+    sock.disconnect()
@@ -0,0 +1,62 @@
+import time
+
+from app.shared_state import MemoryStateBackend
+from app.token_cache import TokenCache
+
+
+class App:
+    config = {}
+
+
+def worker(state):
+    cache = TokenCache()
+    cache.init_app(App(), state)
+    return cache
+
+
+def test_logout_on_one_worker_revokes_everywhere():
+    state = MemoryStateBackend()
+    w1, w2 = worker(state), worker(state)
+    exp = time.time() + 3600
+    w2.put("tok", {"user_id": 1, "exp": exp})
+
+    w1.revoke("tok", exp)
+
+    assert w2.is_revoked("tok")
+
+
+def test_expired_revocations_are_pruned(monkeypatch):
+    state = MemoryStateBackend()
+    cache = worker(state)
+    now = time.time()
+    for i in range(100):
+        cache.revoke(f"tok{i}", now + 10)
+
+    monkeypatch.setattr(time, "time", lambda: now + 20)
+    cache.revoke("novo", now + 3600)
+
+    assert len(state._revoked) == 1
+    assert cache.is_revoked("novo") and not cache.is_revoked("tok0")
+
+
+def test_revocation_is_checked_once_per_window(monkeypatch):
+    lookups = []
+
+    class CountingState(MemoryStateBackend):
+        def is_token_revoked(self, digest):
+            lookups.append(digest)
+            return super().is_token_revoked(digest)
+
+    state = CountingState()
+    w1, w2 = worker(state), worker(state)
+    now = time.time()
+    exp = now + 3600
+    w2.put("tok", {"user_id": 1, "exp": exp})
+
+    # Dentro da janela o cache responde sem ir ao estado compartilhado
+    assert all(w2.get("tok") for _ in range(100)) and lookups == []
+
+    # Logout no outro worker: vale no w2 na próxima conferência
+    w1.revoke("tok", exp)
+    monkeypatch.setattr(time, "time", lambda: now + w2.revocation_check + 1)
+    assert w2.get("tok") is None and len(lookups) == 1
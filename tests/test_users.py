@@ -0,0 +1,10 @@
+def test_allusers_always_revalidates(app, login):
+    client, _ = login("bia_users")
+    resp = client.get("/users/allusers")
+    assert resp.status_code == 200
+    assert resp.cache_control.no_cache and resp.cache_control.private
+    assert resp.cache_control.max_age is None
+
+    # Nada mudou na presença: a revalidação não remonta a página
+    again = client.get("/users/allusers", headers={"If-None-Match": resp.headers["ETag"]})
+    assert again.status_code == 304